@@ -0,0 +1,1272 @@
+#!/usr/bin/env python
+
+import contextlib
+import io
+import itertools
+import sys
+import time
+
+import numpy as np
+
+from src.environment import LANDMARKS
+from src.robot import Robot
+from src.camera import Camera
+from src.agent import Agent
+from src.planner import DWAwoObstacle, DWAwithObstacle, EXHAUSTIVE, COARSE_TO_FINE
+from src.filters import EKF, UKF, ParticleFilter, FleetEKF
+from src.spatial import DistanceField
+from src.profiler import Profiler
+from src.publisher import Publisher
+from src import utils, timer, telemetry
+
+DELTA = 0.2
+UPDATE_TOLERANCE = 1e3 * np.finfo(float).eps
+
+
+class BenchmarkAgent(Agent):
+
+    def get_ideal(self, current, t):
+        """
+        Parameters:
+        ----------
+        current: np.array(x, y, theta)
+            current pose (is not used in this agent)
+        t: float
+            elapsed time (is not used in this agent)
+
+        Returns:
+        ----------
+        np.array(x, y, theta)
+            ideal pose (always the origin)
+        """
+
+        return np.zeros(3)
+
+    def get_ideal_many(self, times, current=None):
+        """
+        Parameters:
+        ----------
+        times: np.array().size(T)
+            elapsed times
+        current: np.array(x, y, theta)
+            current pose (is not used in this agent)
+
+        Returns:
+        ----------
+        np.array().size(T, 3)
+            ideal pose of each time (always the origin)
+        """
+
+        return np.zeros((len(times), 3))
+
+
+def _measure(func, repeat):
+    """
+    Parameters:
+    ----------
+    func: callable
+        function to measure
+    repeat: int
+        number of executions
+
+    Returns:
+    ----------
+    tuple(float, object)
+        average elapsed seconds of one execution and the last return value
+    """
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = func()
+    return (time.perf_counter() - start) / repeat, result
+
+
+def legacy_get_input(agent, current, destination, current_input, delta):
+    """
+    Notes:
+    ----------
+    the per-candidate loop which DWAwoObstacle.get_input used before it was vectorized.
+    this is kept only as the baseline of the benchmark and the reference of the equivalence check
+    """
+
+    v_range, omega_range = DWAwoObstacle._get_window(agent.get_max_accelarations(current),
+                                                     agent.get_linear_velocities(current),
+                                                     agent.get_angular_velocities(current),
+                                                     current_input, delta)
+
+    input_list = np.array([[]]).reshape(0, 2)
+    heading_list = np.array([])
+    velocity_list = np.array([])
+    distance_list = np.array([])
+    theta_list = np.array([])
+
+    for v, omega in itertools.product(v_range, omega_range):
+        input = np.array((v, omega))
+        next = Robot.move(current, input, delta)
+        input_list = np.append(input_list, [input], axis=0)
+        heading_list = np.append(heading_list, DWAwoObstacle._eval_heading(next, destination))
+        velocity_list = np.append(velocity_list, DWAwoObstacle._eval_velocity(input))
+        distance_list = np.append(distance_list, DWAwoObstacle._eval_distance(next, destination))
+        theta_list = np.append(theta_list, DWAwoObstacle._eval_theta(next, destination))
+
+    gains = DWAwoObstacle._get_gains(current, destination)
+    candidate_list = gains[0] * utils.normalize_min_max(heading_list) + \
+        gains[1] * utils.normalize_min_max(velocity_list) + \
+        gains[2] * utils.normalize_min_max(distance_list) + \
+        gains[3] * utils.normalize_min_max(theta_list)
+
+    return input_list[np.argmin(candidate_list)]
+
+
+def legacy_circular_ideal(t):
+    """
+    Notes:
+    ----------
+    the ideal pose of t which CircularAgent.get_ideal calculated before get_ideal_many was added.
+    this is kept only as the reference of the equivalence check
+    """
+
+    from circular_agent import INPUT_OMEGA
+
+    ideal = np.array((0, 0, np.pi/2.0)) + np.array((np.cos(INPUT_OMEGA * t),
+                                                    np.sin(INPUT_OMEGA * t),
+                                                    INPUT_OMEGA * t))
+    ideal[2] = utils.normalize_angle(ideal[2])
+    return ideal
+
+
+def legacy_square_ideal(t):
+    """
+    Notes:
+    ----------
+    the per-segment if/elif chain which SquareAgent.get_ideal used before its path was described by SEGMENTS.
+    this is kept only as the reference of the equivalence check
+    """
+
+    from square_agent import INPUT_V, INPUT_OMEGA
+
+    d0 = 0.0
+    d1 = d0 + 1.0 / INPUT_V
+    d2 = d1 + np.pi / 2.0 / INPUT_OMEGA
+    d3 = d2 + 2.0 / INPUT_V
+    d4 = d3 + np.pi / 2.0 / INPUT_OMEGA
+    d5 = d4 + 2.0 / INPUT_V
+    d6 = d5 + np.pi / 2.0 / INPUT_OMEGA
+    d7 = d6 + 2.0 / INPUT_V
+    d8 = d7 + np.pi / 2.0 / INPUT_OMEGA
+    d9 = d8 + 1.0 / INPUT_V
+
+    delta = t % d9
+
+    if d0 <= delta < d1:
+        ideal = np.array((1.0, 0 + INPUT_V * delta, np.pi / 2.0))
+    elif d1 <= delta < d2:
+        ideal = np.array((1.0, 1.0, np.pi / 2.0 + INPUT_OMEGA * (delta - d1)))
+    elif d2 <= delta < d3:
+        ideal = np.array((1.0 - INPUT_V * (delta - d2), 1.0, np.pi))
+    elif d3 <= delta < d4:
+        ideal = np.array((-1.0, 1.0, np.pi + INPUT_OMEGA * (delta - d3)))
+    elif d4 <= delta < d5:
+        ideal = np.array((-1.0, 1.0 - INPUT_V * (delta - d4), np.pi * 3.0 / 2.0))
+    elif d5 <= delta < d6:
+        ideal = np.array((-1.0, -1.0, np.pi * 3.0 / 2.0 + INPUT_OMEGA * (delta - d5)))
+    elif d6 <= delta < d7:
+        ideal = np.array((-1.0 + INPUT_V * (delta - d6), -1.0, 0.0))
+    elif d7 <= delta < d8:
+        ideal = np.array((1.0, -1.0, INPUT_OMEGA * (delta - d7)))
+    elif d8 <= delta < d9:
+        ideal = np.array((1.0, -1.0 + INPUT_V * (delta - d8), np.pi / 2.0))
+    else:
+        raise NotImplementedError
+    ideal[2] = utils.normalize_angle(ideal[2])
+    return ideal
+
+
+def bench_planner():
+    """
+    Notes:
+    ----------
+    compare DWAwoObstacle.get_input with the legacy per-candidate loop at 0.01 and 0.001 window resolutions.
+    the legacy loop is quadratic in the number of candidates, so at 0.001 it is compared on a narrower window
+    (a tenth of the tick) and the full window is measured only by the vectorized engine
+    """
+
+    agent = BenchmarkAgent(LANDMARKS)
+    rng = np.random.default_rng(0)
+
+    for resolution, delta, repeat in [(0.01, DELTA, 20), (0.001, DELTA / 10.0, 3), (0.001, DELTA, 3)]:
+        DWAwoObstacle.V_RESOLUTION = resolution
+        DWAwoObstacle.OMEGA_RESOLUTION = resolution
+
+        if resolution == 0.001 and delta == DELTA:
+            current, destination, current_input = np.zeros(3), np.ones(3), np.array((0.25, 0.0))
+            vectorized, _ = _measure(lambda: DWAwoObstacle.get_input(agent, current, destination, current_input, delta),
+                                     repeat)
+            print(f'planner resolution={resolution} delta={delta:.3f} vectorized={vectorized * 1000:.3f}ms')
+            continue
+
+        same = 0
+        cases = 20
+        for _ in range(cases):
+            current = np.array((rng.uniform(-1, 1), rng.uniform(-1, 1), rng.uniform(-np.pi, np.pi)))
+            destination = np.array((rng.uniform(-1, 1), rng.uniform(-1, 1), rng.uniform(-np.pi, np.pi)))
+            current_input = np.array((rng.uniform(Robot.MIN_V, Robot.MAX_V), rng.uniform(Robot.MIN_OMEGA, Robot.MAX_OMEGA)))
+            same += np.array_equal(legacy_get_input(agent, current, destination, current_input, delta),
+                                   DWAwoObstacle.get_input(agent, current, destination, current_input, delta))
+
+        v_range, omega_range = DWAwoObstacle._get_window(agent.get_max_accelarations(current),
+                                                         agent.get_linear_velocities(current),
+                                                         agent.get_angular_velocities(current),
+                                                         current_input, delta)
+        legacy, _ = _measure(lambda: legacy_get_input(agent, current, destination, current_input, delta), repeat)
+        vectorized, _ = _measure(lambda: DWAwoObstacle.get_input(agent, current, destination, current_input, delta), repeat)
+
+        print(f'planner resolution={resolution} delta={delta:.3f} candidates={len(v_range) * len(omega_range)}: '
+              f'legacy={legacy * 1000:.3f}ms vectorized={vectorized * 1000:.3f}ms '
+              f'speedup={legacy / vectorized:.1f}x same_input={same}/{cases}')
+        assert same == cases, f'the vectorized planner selected another input in {cases - same} of {cases} cases'
+
+    DWAwoObstacle.V_RESOLUTION = 0.01
+    DWAwoObstacle.OMEGA_RESOLUTION = 0.01
+
+
+def bench_fleet():
+    """
+    Notes:
+    ----------
+    compare FleetEKF with one EKF per robot.
+    the batched predict and update must agree with EKF (asserted with UPDATE_TOLERANCE), and the time of the filter only
+    (prediction and updates of all landmarks) and of the whole step of N robots are measured
+    with a time delta of one INTERVAL (a step of the fleet has to finish within timer.INTERVAL)
+    """
+
+    rng = np.random.default_rng(0)
+
+    for n in [10, 100, 200, 300, 500]:
+        initials = [(rng.uniform(-1, 1), rng.uniform(-1, 1), rng.uniform(-np.pi, np.pi)) for _ in range(n)]
+        ekfs = [EKF(BenchmarkAgent(LANDMARKS), initial) for initial in initials]
+        fleet = FleetEKF([BenchmarkAgent(LANDMARKS) for _ in range(n)], initials)
+
+        input = np.stack([rng.uniform(Robot.MIN_V, Robot.MAX_V, n), rng.uniform(Robot.MIN_OMEGA, Robot.MAX_OMEGA, n)], axis=-1)
+        landmark = np.array(LANDMARKS[0])
+        observed = np.stack([rng.uniform(0.5, 2.0, n), rng.uniform(-np.pi, np.pi, n)], axis=-1)
+        fleet_x, fleet_P = fleet.predict(input, DELTA)
+        fleet_x, fleet_P, fleet_K = fleet.update(fleet_x, fleet_P, np.tile(landmark, (n, 1)), observed)
+        error = 0.0
+        for i, ekf in enumerate(ekfs):
+            x, P = ekf.predict(input[i], DELTA)
+            x, P, K = ekf.update(x, P, LANDMARKS[0], observed[i])
+            error = max(error, np.abs(x - fleet_x[i]).max(), np.abs(P - fleet_P[i]).max(), np.abs(K - fleet_K[i]).max())
+
+        def step_ekfs():
+            for ekf in ekfs:
+                ekf.t = time.time() - DELTA
+                ekf.step()
+
+        def step_fleet():
+            fleet.t = time.time() - DELTA
+            fleet.step()
+
+        def filter_ekfs():
+            for i, ekf in enumerate(ekfs):
+                x, P = ekf.predict(input[i], DELTA)
+                for landmark in LANDMARKS:
+                    x, P, K = ekf.update(x, P, landmark, observed[i])
+
+        def filter_fleet():
+            x, P = fleet.predict(input, DELTA)
+            for landmark in LANDMARKS:
+                x, P, K = fleet.update(x, P, np.tile(landmark, (n, 1)), observed)
+
+        single_filter, _ = _measure(filter_ekfs, 5)
+        batched_filter, _ = _measure(filter_fleet, 5)
+        single, _ = _measure(step_ekfs, 5)
+        batched, _ = _measure(step_fleet, 5)
+        print(f'fleet robots={n}: filter ekf={single_filter * 1000:.3f}ms fleet={batched_filter * 1000:.3f}ms '
+              f'speedup={single_filter / batched_filter:.1f}x, '
+              f'step ekf={single * 1000:.3f}ms fleet={batched * 1000:.3f}ms '
+              f'speedup={single / batched:.1f}x realtime={batched < timer.INTERVAL}, max_error={error:.3e}')
+        assert error < UPDATE_TOLERANCE, f'the batched filter of {n} robots differs from EKF by {error:.3e}'
+
+    class BlindAgent(BenchmarkAgent):
+
+        def get_sensing_range(self, current):
+            return 0.0
+
+    clock = timer.SimulatedClock()
+    agents = [BlindAgent(LANDMARKS, seed=i) if i % 2 else BenchmarkAgent(LANDMARKS, seed=i) for i in range(4)]
+    fleet = FleetEKF(agents, [np.zeros(3)] * len(agents), clock=clock.time)
+    clock.advance(DELTA)
+    ideal, xhat, P, K = fleet.step()
+    gains = [telemetry.decode(telemetry.encode(ideal[i], agent.actual, xhat[i], P[i], K[i], agent.observed_list))
+             ['kalmanGain'] for i, agent in enumerate(agents)]
+    assert all((gain is None) == isinstance(agent, BlindAgent) for agent, gain in zip(agents, gains)), \
+        'a robot which observes no landmark must have no kalman gain'
+    print(f'fleet no observation: kalman gains={[None if gain is None else gain.shape for gain in gains]}')
+
+
+def linearized_sequential_update(ekf, a_priori_x, a_priori_P, landmarks, observed_list):
+    """
+    Parameters:
+    ----------
+    ekf: src.filters.EKF
+        EKF which has R
+    a_priori_x: np.array(x, y, theta)
+        predicted pose
+    a_priori_P: np.array().size(3, 3)
+        predicted covariance
+    landmarks: list of tuple(x, y)
+        coordinates of observed landmarks
+    observed_list: list of np.array(distance, angle)
+        distance and angle of each observed landmark
+
+    Returns:
+    ----------
+    tuple(np.array(x, y, theta), np.array().size(3, 3))
+        updated pose and covariance
+
+    Notes:
+    ----------
+    fuse the landmarks one by one like EKF.update, but every observation is linearized at a_priori_x.
+    the measurement model is then linear, so this is mathematically identical to EKF.update_stacked
+    """
+
+    xhat, P = a_priori_x, a_priori_P
+    for landmark, observed in zip(landmarks, observed_list):
+        H = Camera.H(landmark, a_priori_x)
+        yhat = observed - Camera.observe(landmark, a_priori_x)
+        yhat[1] = utils.normalize_angle(yhat[1])
+        yhat = yhat - H.dot(xhat - a_priori_x)
+        S = H.dot(P).dot(H.T) + ekf.R
+        K = P.dot(H.T).dot(np.linalg.inv(S))
+        xhat = xhat + K.dot(yhat)
+        P = (np.identity(3) - K.dot(H)).dot(P)
+    return xhat, P
+
+
+def bench_update():
+    """
+    Notes:
+    ----------
+    compare EKF.update_stacked with the sequential EKF.update of each landmark.
+    the stacked update must agree with linearized_sequential_update to machine precision (asserted with UPDATE_TOLERANCE).
+    the sequential EKF.update re-linearizes the observation at each intermediate estimate,
+    so it only agrees up to the second order of the correction (reported as relinearized_error)
+    """
+
+    rng = np.random.default_rng(0)
+
+    for n in [8, 32, 128]:
+        angles = np.linspace(0.0, 2.0 * np.pi, n, endpoint=False)
+        landmarks = [(1.5 * np.cos(a), 1.5 * np.sin(a)) for a in angles]
+        ekf = EKF(BenchmarkAgent(landmarks), (0.0, 0.0, 0.0))
+        x, P = ekf.predict(np.array((0.3, 0.1)), DELTA)
+
+        error = 0.0
+        relinearized_error = 0.0
+        for _ in range(20):
+            actual = x + rng.normal(0.0, 0.05, 3)
+            observed_list = [Camera.observe(landmark, actual) + rng.normal(0.0, np.sqrt(EKF.r), 2) for landmark in landmarks]
+            sequential_x, sequential_P = x, P
+            for landmark, observed in zip(landmarks, observed_list):
+                sequential_x, sequential_P, _ = ekf.update(sequential_x, sequential_P, landmark, observed)
+            linearized_x, linearized_P = linearized_sequential_update(ekf, x, P, landmarks, observed_list)
+            stacked_x, stacked_P, _ = ekf.update_stacked(x, P, landmarks, observed_list)
+            error = max(error, np.abs(linearized_x - stacked_x).max(), np.abs(linearized_P - stacked_P).max())
+            relinearized_error = max(relinearized_error, np.abs(sequential_x - stacked_x).max(),
+                                     np.abs(sequential_P - stacked_P).max())
+        assert error < UPDATE_TOLERANCE, f'update_stacked differs from the sequential update: landmarks={n} error={error:.3e}'
+
+        def sequential():
+            xhat, cov = x, P
+            for landmark, observed in zip(landmarks, observed_list):
+                xhat, cov, _ = ekf.update(xhat, cov, landmark, observed)
+
+        sequential_time, _ = _measure(sequential, 50)
+        stacked_time, _ = _measure(lambda: ekf.update_stacked(x, P, landmarks, observed_list), 50)
+        print(f'update landmarks={n}: sequential={sequential_time * 1000:.3f}ms stacked={stacked_time * 1000:.3f}ms '
+              f'speedup={sequential_time / stacked_time:.1f}x max_error={error:.3e} '
+              f'relinearized_error={relinearized_error:.3e}')
+
+
+def bench_headless():
+    """
+    Notes:
+    ----------
+    record a short real-time execution of CircularAgent, replay its time deltas by the headless runner
+    and check that both trajectories are identical, then measure how fast the headless runner simulates
+    """
+
+    from circular_agent import CircularAgent, INITIAL_POSE
+
+    ekf = EKF(CircularAgent(LANDMARKS, seed=0), INITIAL_POSE)
+    times, realtime_xhat = [ekf.start_t], []
+    for _ in range(20):
+        time.sleep(0.02)
+        ekf.step()
+        times.append(ekf.t)
+        realtime_xhat.append(ekf.xhat)
+
+    clock = timer.SimulatedClock(times[0])
+    ekf = EKF(CircularAgent(LANDMARKS, seed=0), INITIAL_POSE, clock=clock.time)
+    _, _, _, headless_xhat = timer.run(ekf, clock, delta=np.diff(times))
+    same = np.array_equal(np.array(realtime_xhat), headless_xhat)
+
+    lifetime = 600.0
+    clock = timer.SimulatedClock()
+    ekf = EKF(CircularAgent(LANDMARKS), INITIAL_POSE, clock=clock.time)
+    elapsed, _ = _measure(lambda: timer.run(ekf, clock, delta=timer.INTERVAL, lifetime=lifetime), 1)
+    print(f'headless simulated={lifetime:.0f}s ticks={int(lifetime / timer.INTERVAL)} wall={elapsed:.3f}s '
+          f'faster_than_real_time={lifetime / elapsed:.0f}x same_as_realtime={same}')
+    assert same, 'the headless trajectory must be identical to the real-time one'
+
+
+def bench_telemetry():
+    """
+    Notes:
+    ----------
+    compare the size and the encode / decode time of the binary frames and the json message.
+    both formats must round-trip every value exactly
+    """
+
+    rng = np.random.default_rng(0)
+
+    for n in [8, 128]:
+        ideal, actual, xhat = rng.normal(size=3), rng.normal(size=3), rng.normal(size=3)
+        P, K = rng.normal(size=(3, 3)), rng.normal(size=(3, 2))
+        observed_list = [((rng.normal(), rng.normal()), rng.normal(size=2)) for _ in range(n)]
+
+        result = []
+        for format in [telemetry.JSON, telemetry.BINARY]:
+            frames = telemetry.encode(ideal, actual, xhat, P, K, observed_list, format=format)
+            encode_time, _ = _measure(lambda: telemetry.encode(ideal, actual, xhat, P, K, observed_list, format=format), 200)
+            decode_time, msg = _measure(lambda: telemetry.decode(frames), 200)
+            same = np.array_equal(msg['ideal'], ideal) and np.array_equal(msg['actual'], actual) and \
+                np.array_equal(msg['xhat'], xhat) and np.array_equal(msg['covariance'], P) and \
+                np.array_equal(msg['kalmanGain'], K) and \
+                np.array_equal(msg['observed'], [(*o[0], *o[1]) for o in observed_list])
+            assert same, f'the {format} telemetry of {n} observations does not round-trip'
+            result.append(f'{format} bytes={sum(len(f) for f in frames)} encode={encode_time * 1e6:.1f}us '
+                          f'decode={decode_time * 1e6:.1f}us roundtrip={same}')
+        print(f'telemetry observations={n}: ' + ', '.join(result))
+
+
+def bench_plotter():
+    """
+    Notes:
+    ----------
+    measure the frame time of Plotter (update the data of the artists and draw them) at 10k and 100k points,
+    and compare it with the legacy frame which clears the axes and plots everything again
+    """
+
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    import plotter
+
+    for n in [10000, 100000]:
+        plotter.CAPACITY = n
+        p = plotter.Plotter()
+        track = p.track(0)
+        t = np.linspace(0.0, 100.0, n)
+        for pose in np.stack([np.cos(t), np.sin(t), t], axis=-1):
+            track.ideal_list.append(pose)
+            track.actual_list.append(pose)
+            track.xhat_list.append(pose)
+        track.observed_list = [(landmark[0], landmark[1], 1.0, 0.0) for landmark in LANDMARKS]
+
+        fig = plt.figure(figsize=(12.0, 12.0))
+        ax = fig.add_subplot(111)
+        ax.set_xlim([-1.2, 1.2])
+        ax.set_ylim([-1.2, 1.2])
+        fig.canvas.draw()
+
+        def frame():
+            p.received += 1
+            for artist in p._update_frame(ax):
+                ax.draw_artist(artist)
+            fig.canvas.blit(ax.bbox)
+
+        def skipped_frame():
+            for artist in p._update_frame(ax):
+                ax.draw_artist(artist)
+
+        def legacy_frame():
+            ax.cla()
+            ax.set_xlim([-1.2, 1.2])
+            ax.set_ylim([-1.2, 1.2])
+            for buffer, color in [(track.ideal_list, 'black'), (track.actual_list, 'blue'), (track.xhat_list, 'red')]:
+                view = buffer.view()
+                ax.plot(view[:, 0], view[:, 1], color=color)
+            for landmark in LANDMARKS:
+                ax.plot(landmark[0], landmark[1], 's', color='gray')
+                ax.plot([0.0, landmark[0]], [0.0, landmark[1]], color='green')
+            fig.canvas.draw()
+
+        frame_time, _ = _measure(frame, 10)
+        skipped_time, _ = _measure(skipped_frame, 10)
+        legacy_time, _ = _measure(legacy_frame, 10)
+        print(f'plotter points={n}: legacy={legacy_time * 1000:.1f}ms blit={frame_time * 1000:.1f}ms '
+              f'skipped={skipped_time * 1000:.3f}ms')
+        plt.close(fig)
+
+    plotter.CAPACITY = 10000
+
+
+def bench_recorder():
+    """
+    Notes:
+    ----------
+    record the same ticks by a Recorder which flushes every tick (flush_bytes=0) and by the buffered Recorder,
+    check that both logs are byte-identical and can be read by Log, and measure the time of a record call
+    """
+
+    import filecmp
+    import tempfile
+
+    from circular_agent import CircularAgent, INITIAL_POSE
+    from src.recorder import Recorder, Log, FIXED_COLUMNS, VARIABLE_COLUMNS
+
+    clock = timer.SimulatedClock()
+    ekf = EKF(CircularAgent(LANDMARKS, seed=0), INITIAL_POSE, clock=clock.time)
+    ticks = []
+    for _ in range(3000):
+        clock.advance(timer.INTERVAL)
+        ideal, xhat, P, K = ekf.step()
+        ticks.append((ekf.t - ekf.start_t, ekf.input, ideal, ekf.agent.actual, xhat, P, K, ekf.agent.observed_list))
+
+    with tempfile.TemporaryDirectory() as directory:
+        elapsed = {}
+        for name, flush_bytes in [('every_tick', 0), ('buffered', Recorder.FLUSH_BYTES)]:
+            recorder = Recorder(f'{directory}/{name}', flush_bytes=flush_bytes)
+            elapsed[name], _ = _measure(lambda: [recorder.record(*tick) for tick in ticks], 1)
+            recorder.close()
+
+        files = [f'{name}.bin' for name in list(FIXED_COLUMNS) + list(VARIABLE_COLUMNS)] + \
+            [f'{name}.idx' for name in VARIABLE_COLUMNS]
+        _, mismatch, errors = filecmp.cmpfiles(f'{directory}/every_tick', f'{directory}/buffered', files, shallow=False)
+        log = Log(f'{directory}/buffered')
+        same = len(mismatch) == 0 and len(errors) == 0 and len(log) == len(ticks) and \
+            np.array_equal(log[len(ticks) - 1]['xhat'], ticks[-1][4])
+
+    print(f'recorder ticks={len(ticks)}: every_tick={elapsed["every_tick"] / len(ticks) * 1e6:.1f}us '
+          f'buffered={elapsed["buffered"] / len(ticks) * 1e6:.1f}us '
+          f'speedup={elapsed["every_tick"] / elapsed["buffered"]:.1f}x same_log={same}')
+    assert same, 'the buffered log must be identical to the log flushed every tick'
+
+
+def bench_observation():
+    """
+    Notes:
+    ----------
+    measure Agent.get_observations with a limited sensing range and field of view on large maps,
+    and compare it with checking the visibility of every landmark
+    """
+
+    class LimitedAgent(BenchmarkAgent):
+
+        def get_sensing_range(self, current):
+            return 3.0
+
+        def get_fov(self, current):
+            return np.pi * 2.0 / 3.0
+
+    rng = np.random.default_rng(0)
+
+    for n in [1000, 10000, 100000]:
+        landmarks = [tuple(landmark) for landmark in rng.uniform(-50.0, 50.0, (n, 2))]
+        agent = LimitedAgent(landmarks, seed=0)
+        agent.actual = np.array((1.0, 2.0, 0.5))
+        points = np.array(landmarks)
+
+        def brute_force():
+            visible = Camera.visible(points, agent.actual, agent.get_sensing_range(agent.actual), agent.get_fov(agent.actual))
+            return [landmarks[i] for i in np.flatnonzero(visible)]
+
+        indexed, observed_list = _measure(agent.get_observations, 100)
+        brute, visible = _measure(brute_force, 100)
+        same = [o[0] for o in observed_list] == visible
+        print(f'observation landmarks={n} visible={len(observed_list)}: brute_force={brute * 1e6:.1f}us '
+              f'indexed={indexed * 1e6:.1f}us same_landmarks={same}')
+
+
+def bench_obstacle():
+    """
+    Notes:
+    ----------
+    measure building a DistanceField of random circular obstacles at some resolutions (done once),
+    and a tick of DWAwithObstacle which looks the clearance of every candidate arc up from the field.
+    the coarse-to-fine search of DWAwithObstacle is compared with the exhaustive one on random states near obstacles,
+    and the input it selects must keep SAFETY_MARGIN whenever the exhaustive search finds a safe input
+    """
+
+    agent = BenchmarkAgent(LANDMARKS)
+    rng = np.random.default_rng(0)
+    circles = [(x, y, r) for x, y, r in zip(rng.uniform(-5, 5, 20), rng.uniform(-5, 5, 20), rng.uniform(0.1, 0.5, 20))]
+    current, destination, current_input = np.array((0.0, 0.0, 0.5)), np.array((3.0, 3.0, 0.0)), np.array((0.25, 0.0))
+
+    for resolution in [0.05, 0.02, 0.01]:
+        build, field = _measure(lambda: DistanceField.from_circles(circles, (-5, 5), (-5, 5), resolution), 1)
+        planner = DWAwithObstacle(field)
+        without, _ = _measure(lambda: DWAwoObstacle.get_input(agent, current, destination, current_input, DELTA), 20)
+        with_obstacle, _ = _measure(lambda: planner.get_input(agent, current, destination, current_input, DELTA), 20)
+        print(f'obstacle resolution={resolution} cells={field.distance.size}: build={build * 1000:.1f}ms '
+              f'DWAwoObstacle={without * 1000:.3f}ms DWAwithObstacle={with_obstacle * 1000:.3f}ms')
+
+    cases = 200
+    states = []
+    while len(states) < cases:
+        x, y, r = circles[rng.integers(len(circles))]
+        angle = rng.uniform(-np.pi, np.pi)
+        current = np.array((x + (r + 0.15) * np.cos(angle), y + (r + 0.15) * np.sin(angle), rng.uniform(-np.pi, np.pi)))
+        if field.clearance(current[np.newaxis, :2])[0] >= DWAwithObstacle.SAFETY_MARGIN:
+            states.append((current, np.array((x, y, 0.0)) + (current - np.array((x, y, 0.0))) * -2.0,
+                           np.array((rng.uniform(Robot.MIN_V, Robot.MAX_V), rng.uniform(Robot.MIN_OMEGA, Robot.MAX_OMEGA)))))
+
+    for resolution in [0.01, 0.001]:
+        DWAwoObstacle.V_RESOLUTION = resolution
+        DWAwoObstacle.OMEGA_RESOLUTION = resolution
+        same, unsafe = 0, 0
+        times = {EXHAUSTIVE: 0.0, COARSE_TO_FINE: 0.0}
+        for current, destination, current_input in states:
+            inputs = {}
+            for search in times:
+                planner.SEARCH = search
+                elapsed, inputs[search] = _measure(lambda: planner.get_input(agent, current, destination, current_input,
+                                                                             DELTA), 1)
+                times[search] += elapsed / cases
+            same += np.array_equal(inputs[EXHAUSTIVE], inputs[COARSE_TO_FINE])
+            clearance = planner._eval_clearance(current, np.array([inputs[EXHAUSTIVE], inputs[COARSE_TO_FINE]]))
+            unsafe += clearance[0] >= DWAwithObstacle.SAFETY_MARGIN > clearance[1]
+
+        print(f'obstacle search resolution={resolution} cases={cases}: exhaustive={times[EXHAUSTIVE] * 1000:.3f}ms '
+              f'coarse_to_fine={times[COARSE_TO_FINE] * 1000:.3f}ms same_input={same}/{cases} unsafe_input={unsafe}')
+
+    DWAwoObstacle.V_RESOLUTION = 0.01
+    DWAwoObstacle.OMEGA_RESOLUTION = 0.01
+
+
+def bench_horizon():
+    """
+    Notes:
+    ----------
+    compare the rollouts of DWAwoObstacle looked up from the cached arc primitives with integrating
+    Robot.move HORIZON times for every candidate, and measure a tick of the planner at each horizon.
+    the ticks are measured with a fixed delta and with deltas which jitter like the wall-clock deltas of
+    timer.start, so the primitives must not be rebuilt every tick.
+    with the fixed delta the rollouts must match the integration, and with the jittered deltas the error
+    comes from rounding delta to PRIMITIVE_DELTA_RESOLUTION
+    """
+
+    agent = BenchmarkAgent(LANDMARKS)
+    current, destination, current_input = np.array((0.3, -0.2, 2.0)), np.ones(3), np.array((0.25, 0.1))
+    rng = np.random.default_rng(0)
+    deltas = DELTA + rng.uniform(-0.005, 0.005, 100)
+
+    for horizon in [1, 3, 5, 10, 20, 50]:
+        DWAwoObstacle.HORIZON = horizon
+        DWAwoObstacle._primitives.clear()
+        input_list = DWAwoObstacle._get_candidates(*DWAwoObstacle._get_window(agent.get_max_accelarations(current),
+                                                                              agent.get_linear_velocities(current),
+                                                                              agent.get_angular_velocities(current),
+                                                                              current_input, DELTA))
+
+        def integrate(delta):
+            next_list = current
+            for _ in range(horizon):
+                next_list = Robot.move(next_list, input_list, delta)
+            return next_list
+
+        def rollout_error(delta):
+            expected = integrate(delta)
+            next_list = DWAwoObstacle._predict(current, input_list, delta)
+            return np.abs(np.concatenate([next_list[:, :2] - expected[:, :2],
+                                          utils.normalize_angle(next_list[:, 2:] - expected[:, 2:])], axis=1)).max()
+
+        integrated, _ = _measure(lambda: integrate(DELTA), 100)
+        looked_up, _ = _measure(lambda: DWAwoObstacle._predict(current, input_list, DELTA), 100)
+        fixed, _ = _measure(lambda: DWAwoObstacle.get_input(agent, current, destination, current_input, DELTA), 100)
+        ticks = iter(itertools.cycle(deltas))
+        jittered, _ = _measure(lambda: DWAwoObstacle.get_input(agent, current, destination, current_input,
+                                                               next(ticks)), 100)
+        error = rollout_error(DELTA)
+        jittered_error = max(rollout_error(delta) for delta in deltas[:10])
+        assert error < 1e-12, f'rollouts of horizon {horizon} do not match the integration: {error}'
+        print(f'horizon={horizon} candidates={len(input_list)}: integrated={integrated * 1000:.3f}ms '
+              f'primitives={looked_up * 1000:.3f}ms get_input fixed={fixed * 1000:.3f}ms '
+              f'jittered={jittered * 1000:.3f}ms tables={len(DWAwoObstacle._primitives)} max_error={error:.1e} '
+              f'jittered_max_error={jittered_error:.1e}')
+
+    DWAwoObstacle.HORIZON = 1
+
+
+def bench_search():
+    """
+    Notes:
+    ----------
+    compare the coarse-to-fine search of DWAwoObstacle with the exhaustive search on random states.
+    it reports the time of a tick, how often both select the same input, and how much worse
+    the cost (normalized over the whole window) of the coarse-to-fine input is than the best one on average
+    """
+
+    agent = BenchmarkAgent(LANDMARKS)
+    rng = np.random.default_rng(0)
+    cases = 100
+    states = [(np.array((rng.uniform(-1, 1), rng.uniform(-1, 1), rng.uniform(-np.pi, np.pi))),
+               np.array((rng.uniform(-1, 1), rng.uniform(-1, 1), rng.uniform(-np.pi, np.pi))),
+               np.array((rng.uniform(Robot.MIN_V, Robot.MAX_V), rng.uniform(Robot.MIN_OMEGA, Robot.MAX_OMEGA))))
+              for _ in range(cases)]
+
+    for resolution, budget in [(0.01, 300), (0.01, 600), (0.001, 600), (0.001, 1200)]:
+        DWAwoObstacle.V_RESOLUTION = resolution
+        DWAwoObstacle.OMEGA_RESOLUTION = resolution
+        DWAwoObstacle.CANDIDATE_BUDGET = budget
+
+        same = 0
+        gaps = []
+        times = {EXHAUSTIVE: 0.0, COARSE_TO_FINE: 0.0}
+        for current, destination, current_input in states:
+            inputs = {}
+            for search in times:
+                DWAwoObstacle.SEARCH = search
+                elapsed, inputs[search] = _measure(lambda: DWAwoObstacle.get_input(agent, current, destination,
+                                                                                   current_input, DELTA), 1)
+                times[search] += elapsed / cases
+            same += np.array_equal(inputs[EXHAUSTIVE], inputs[COARSE_TO_FINE])
+
+            input_list = DWAwoObstacle._get_candidates(*DWAwoObstacle._get_window(
+                agent.get_max_accelarations(current), agent.get_linear_velocities(current),
+                agent.get_angular_velocities(current), current_input, DELTA))
+            costs = DWAwoObstacle._eval(current, destination, input_list,
+                                        DWAwoObstacle._predict(current, input_list, DELTA))
+            gaps.append(costs[np.flatnonzero(np.all(input_list == inputs[COARSE_TO_FINE], axis=1))[0]] - costs.min())
+
+        print(f'search resolution={resolution} budget={budget} candidates={len(input_list)}: '
+              f'exhaustive={times[EXHAUSTIVE] * 1000:.3f}ms coarse_to_fine={times[COARSE_TO_FINE] * 1000:.3f}ms '
+              f'same_input={same}/{cases} mean_cost_gap={np.mean(gaps):.4f}')
+
+    DWAwoObstacle.COARSE_GRID = 3
+    try:
+        DWAwoObstacle.get_input(agent, *states[0], DELTA)
+    except ValueError:
+        pass
+    else:
+        raise AssertionError('a COARSE_GRID whose stride does not shrink must be rejected')
+
+    DWAwoObstacle.SEARCH = EXHAUSTIVE
+    DWAwoObstacle.CANDIDATE_BUDGET = 600
+    DWAwoObstacle.COARSE_GRID = 9
+    DWAwoObstacle.V_RESOLUTION = 0.01
+    DWAwoObstacle.OMEGA_RESOLUTION = 0.01
+
+
+def bench_profile():
+    """
+    Notes:
+    ----------
+    measure the overhead of the profiler of EKF.step by the headless runner (it must be near zero when disabled),
+    and show the summary of each stage. the profiled trajectory must be identical to the unprofiled one
+    """
+
+    from circular_agent import CircularAgent, INITIAL_POSE
+
+    lifetime = 120.0
+    results = {}
+    for name, profiler in [('disabled', None), ('enabled', Profiler(timer.INTERVAL))]:
+        clock = timer.SimulatedClock()
+        ekf = EKF(CircularAgent(LANDMARKS, seed=0), INITIAL_POSE, clock=clock.time, profiler=profiler)
+        results[name] = _measure(lambda: timer.run(ekf, clock, delta=timer.INTERVAL, lifetime=lifetime), 1)
+
+    ticks = int(lifetime / timer.INTERVAL)
+    same = all(np.array_equal(disabled, enabled) for disabled, enabled in zip(results['disabled'][1], results['enabled'][1]))
+    print(f'profile ticks={ticks}: disabled={results["disabled"][0] / ticks * 1e6:.1f}us/tick '
+          f'enabled={results["enabled"][0] / ticks * 1e6:.1f}us/tick same_trajectory={same}')
+    assert same, 'profiling must not change the trajectory'
+
+    summary = profiler.summary()
+    print(f'profile overruns={summary["overruns"]} missed={summary["missed"]}')
+    for stage, latency in summary['stages'].items():
+        print(f'profile {stage:>8}: mean={latency["mean"] * 1e6:.1f}us p50={latency["p50"] * 1e6:.1f}us '
+              f'p99={latency["p99"] * 1e6:.1f}us max={latency["max"] * 1e6:.1f}us')
+
+
+def bench_publisher():
+    """
+    Notes:
+    ----------
+    measure the time which publishing a message takes in the control loop when stdout is slow (1ms per write),
+    encoding, sending and printing inline vs putting it into src.publisher.Publisher.
+    then stall the publisher thread and check that the queue keeps only the latest hwm messages
+    """
+
+    import zmq
+
+    class SlowStdout:
+
+        def write(self, text):
+            time.sleep(0.001)
+            return len(text)
+
+        def flush(self):
+            pass
+
+    ekf = EKF(BenchmarkAgent(LANDMARKS, seed=0), np.zeros(3))
+    ideal, xhat, P, K = ekf.step()
+    args = (ideal, ekf.agent.actual, xhat, P, K, ekf.agent.observed_list)
+    repeat = 200
+
+    socket = zmq.Context.instance().socket(zmq.PUB)
+    socket.bind('tcp://127.0.0.1:*')
+    publisher = Publisher('tcp://127.0.0.1:*', log_interval=0.05)
+
+    def inline():
+        frames = telemetry.encode(*args, format=timer.FORMAT)
+        socket.send_multipart(frames)
+        print(f'send msg: {xhat}')
+
+    def queued():
+        publisher.send(telemetry.encode, *args, format=timer.FORMAT)
+        publisher.log(lambda: f'send msg: {xhat}')
+
+    with contextlib.redirect_stdout(SlowStdout()):
+        inline_time, _ = _measure(inline, repeat)
+        queued_time, _ = _measure(queued, repeat)
+        publisher.close()
+    socket.close()
+    print(f'publisher slow stdout: inline={inline_time * 1e6:.1f}us queued={queued_time * 1e6:.1f}us '
+          f'sent={publisher.sent} dropped={publisher.dropped}')
+
+    publisher = Publisher('tcp://127.0.0.1:*', hwm=10)
+    stall = (lambda *args: time.sleep(0.1) or [b''], (), {})
+    publisher.queue.append(stall)
+    publisher.ready.set()
+    time.sleep(0.01)
+    for i in range(100):
+        publisher.send(lambda i: [str(i).encode('utf-8')], i)
+    latest = [args[0] for _, args, _ in publisher.queue]
+    publisher.close()
+    print(f'publisher stalled hwm=10: put=100 dropped={publisher.dropped} kept={latest}')
+
+    socket = zmq.Context.instance().socket(zmq.PUB)
+    socket.bind('tcp://127.0.0.1:*')
+    try:
+        Publisher(socket.getsockopt_string(zmq.LAST_ENDPOINT))
+        bind_error = None
+    except zmq.ZMQError as e:
+        bind_error = e
+    socket.close()
+    assert bind_error is not None, 'binding an endpoint in use must raise'
+
+    publisher = Publisher('tcp://127.0.0.1:*')
+    with contextlib.redirect_stderr(io.StringIO()):
+        publisher.send(lambda: [b'', 1 / 0])
+        publisher.send(telemetry.encode, *args, format=timer.FORMAT)
+        publisher.close()
+    assert (publisher.sent, publisher.failed) == (1, 1), 'a bad message must not stop the publisher'
+    print(f'publisher errors: bind_in_use={bind_error!r} sent={publisher.sent} failed={publisher.failed}')
+
+
+def bench_ukf():
+    """
+    Notes:
+    ----------
+    compare the accuracy (rmse of the estimated trajectory vs the actual trajectory) and the cost per tick
+    (the whole tick, and predict + update measured by src.profiler.Profiler) of EKF and UKF on each scenario
+    """
+
+    import circular_agent
+    import square_agent
+    import waypoints_agent
+
+    scenarios = [('circular', circular_agent.CircularAgent, circular_agent.INITIAL_POSE),
+                 ('square', square_agent.SquareAgent, square_agent.INITIAL_POSE),
+                 ('waypoints', waypoints_agent.WaypointsAgent, waypoints_agent.INITIAL_POSE)]
+    lifetime = 120.0
+    seeds = range(4)
+
+    for name, agent_class, initial in scenarios:
+        for filter_class, stacked_update in [(EKF, False), (UKF, False), (EKF, True), (UKF, True)]:
+            rmses, ticks, filters = [], [], []
+            for seed in seeds:
+                clock = timer.SimulatedClock()
+                profiler = Profiler(timer.INTERVAL)
+                ekf = filter_class(agent_class(LANDMARKS, seed=seed), initial, stacked_update=stacked_update,
+                                   clock=clock.time, profiler=profiler)
+                _, _, actual_list, xhat_list = timer.run(ekf, clock, delta=timer.INTERVAL, lifetime=lifetime)
+                stages = profiler.summary()['stages']
+                rmses.append((np.sqrt(np.mean(np.sum((xhat_list[:, :2] - actual_list[:, :2]) ** 2, axis=1))),
+                              np.sqrt(np.mean(utils.normalize_angle(xhat_list[:, 2] - actual_list[:, 2]) ** 2))))
+                ticks.append(stages['tick']['mean'])
+                filters.append(stages['predict']['mean'] + stages['update']['mean'])
+            rmse = np.mean(rmses, axis=0)
+            print(f'ukf {name:>9} {filter_class.__name__} stacked={stacked_update!s:>5}: '
+                  f'rmse=({rmse[0]:.5f}, {rmse[1]:.5f}) tick={np.mean(ticks) * 1000:.3f}ms '
+                  f'predict+update={np.mean(filters) * 1000:.3f}ms')
+
+
+def bench_particle():
+    """
+    Notes:
+    ----------
+    measure a tick of ParticleFilter for some numbers of particles (it must be far less than timer.INTERVAL),
+    compare its accuracy with EKF on CircularAgent, and count the ticks to recover from a wrong belief
+    by observing a pose far from all particles
+    """
+
+    from circular_agent import CircularAgent, INITIAL_POSE
+
+    lifetime = 60.0
+    for name, make in [('EKF', lambda agent, clock, profiler: EKF(agent, INITIAL_POSE, clock=clock, profiler=profiler))] + \
+            [(f'ParticleFilter(M={m})',
+              lambda agent, clock, profiler, m=m: ParticleFilter(agent, INITIAL_POSE, particles=m, seed=0, clock=clock,
+                                                                 profiler=profiler))
+             for m in [1000, 10000, 30000]]:
+        clock = timer.SimulatedClock()
+        profiler = Profiler(timer.INTERVAL)
+        _, _, actual_list, xhat_list = timer.run(make(CircularAgent(LANDMARKS, seed=0), clock.time, profiler), clock,
+                                                 delta=timer.INTERVAL, lifetime=lifetime)
+        stages = profiler.summary()['stages']
+        rmse = np.sqrt(np.mean(np.sum((xhat_list[:, :2] - actual_list[:, :2]) ** 2, axis=1)))
+        filter_time = stages['predict']['mean'] + stages['update']['mean']
+        print(f'particle {name}: rmse={rmse:.5f} predict+update={filter_time * 1000:.3f}ms '
+              f'tick p99={stages["tick"]["p99"] * 1000:.3f}ms max_rate={1.0 / stages["tick"]["mean"]:.0f}Hz')
+
+    agent = CircularAgent(LANDMARKS, seed=1)
+    pf = ParticleFilter(agent, INITIAL_POSE, particles=10000, seed=1)
+    truth = np.array((-0.5, -0.6, -2.0))
+    for tick in range(1, 101):
+        xhat, P = pf.predict(np.zeros(2), timer.INTERVAL)
+        xhat, P, _ = pf.update_stacked(xhat, P, LANDMARKS, list(agent._observe(LANDMARKS, truth)))
+        if np.linalg.norm(xhat[:2] - truth[:2]) < 0.05:
+            break
+    print(f'particle kidnapped M=10000 random_ratio={ParticleFilter.random_ratio}: recovered in {tick} ticks '
+          f'(error={np.linalg.norm(xhat[:2] - truth[:2]):.4f})')
+
+
+def bench_predict():
+    """
+    Notes:
+    ----------
+    verify the fused prediction kernel Robot.propagate against Robot.move and F P F^T + Q on random states,
+    and chain a million predictions of each path (the legacy path is measured on a tenth of the steps).
+    the fused kernel is measured with new output arrays (as EKF.predict) and in place (no new result arrays)
+    """
+
+    rng = np.random.default_rng(0)
+    Q = np.dot(EKF.q, np.identity(3))
+
+    def legacy(current, P, input, delta):
+        F = Robot.F(current, input, delta)
+        return Robot.move(current, input, delta), F.dot(P).dot(F.T) + Q
+
+    cases = 10000
+    pose_same, covariance_error = 0, 0.0
+    for _ in range(cases):
+        current = np.array((rng.uniform(-3, 3), rng.uniform(-3, 3), rng.uniform(-np.pi, np.pi)))
+        A = rng.normal(size=(3, 3))
+        P = A.dot(A.T)
+        input = np.array((rng.uniform(Robot.MIN_V, Robot.MAX_V), rng.uniform(Robot.MIN_OMEGA, Robot.MAX_OMEGA)))
+        expected_x, expected_P = legacy(current, P, input, DELTA)
+        fused_x, fused_P = Robot.propagate(current, P, input, DELTA, Q)
+        pose_same += np.array_equal(expected_x, fused_x)
+        covariance_error = max(covariance_error, np.abs(fused_P - expected_P).max() / np.abs(expected_P).max())
+    print(f'predict verify cases={cases}: same_pose={pose_same}/{cases} max_relative_covariance_error={covariance_error:.1e}')
+
+    steps = 1000000
+    input = np.array((0.3, 0.2))
+
+    def chain_legacy(n):
+        current, P = np.zeros(3), np.zeros((3, 3))
+        for _ in range(n):
+            current, P = legacy(current, P, input, 1e-3)
+        return current, P
+
+    def chain_fused(n):
+        current, P = np.zeros(3), np.zeros((3, 3))
+        for _ in range(n):
+            current, P = Robot.propagate(current, P, input, 1e-3, Q)
+        return current, P
+
+    def chain_in_place(n):
+        current, P = np.zeros(3), np.zeros((3, 3))
+        out = (current, P)
+        for _ in range(n):
+            Robot.propagate(current, P, input, 1e-3, Q, out=out)
+        return current, P
+
+    legacy_time, (legacy_x, _) = _measure(lambda: chain_legacy(steps // 10), 1)
+    fused_time, _ = _measure(lambda: chain_fused(steps), 1)
+    in_place_time, _ = _measure(lambda: chain_in_place(steps), 1)
+    drift = np.abs(chain_in_place(steps // 10)[0] - legacy_x).max()
+    print(f'predict steps={steps}: legacy={legacy_time / (steps // 10) * 1e6:.2f}us/step '
+          f'fused={fused_time / steps * 1e6:.2f}us/step in_place={in_place_time / steps * 1e6:.2f}us/step '
+          f'speedup={legacy_time * 10 / in_place_time:.1f}x pose_difference_after_{steps // 10}_steps={drift:.1e}')
+
+
+def bench_ideal():
+    """
+    Notes:
+    ----------
+    compare Agent.get_ideal_many with the legacy get_ideal of each agent called for each time,
+    on the reference path of an hour and on the boundaries of the segments of SquareAgent
+    """
+
+    from circular_agent import CircularAgent
+    from square_agent import SquareAgent
+
+    times = np.arange(0.0, 3600.0, timer.INTERVAL)
+    boundaries = np.concatenate([SquareAgent.BOUNDARIES + SquareAgent.BOUNDARIES[-1] * k for k in range(3)])
+    for agent_class, legacy in [(CircularAgent, legacy_circular_ideal), (SquareAgent, legacy_square_ideal)]:
+        agent = agent_class(LANDMARKS)
+        loop, expected = _measure(lambda: np.array([legacy(t) for t in times]), 1)
+        many, ideal = _measure(lambda: agent.get_ideal_many(times), 10)
+        single, _ = _measure(lambda: agent.get_ideal(None, 1.0), 1000)
+        same = np.array_equal(expected, ideal) and \
+            np.array_equal(np.array([legacy(t) for t in boundaries]), agent.get_ideal_many(boundaries)) and \
+            np.array_equal(np.array([agent.get_ideal(None, t) for t in times[:100]]), expected[:100])
+        print(f'ideal {agent_class.__name__} times={len(times)}: legacy_loop={loop * 1000:.1f}ms '
+              f'get_ideal_many={many * 1000:.3f}ms speedup={loop / many:.0f}x get_ideal={single * 1e6:.1f}us '
+              f'same={same}')
+        assert same, f'get_ideal_many of {agent_class.__name__} must be identical to the legacy get_ideal'
+
+
+def bench_route():
+    """
+    Notes:
+    ----------
+    build WaypointsAgent on routes of more and more waypoints, and measure the hooks of a tick
+    (get_ideal and the three hooks of the planner) while the agent goes around the route headlessly
+    """
+
+    from waypoints_agent import WaypointsAgent, WAYPOINTS
+    from src.route import Route
+
+    for size in [len(WAYPOINTS), 100, 1000, 10000]:
+        if size == len(WAYPOINTS):
+            waypoints = WAYPOINTS
+        else:
+            theta = np.linspace(0.0, 2.0 * np.pi, size, endpoint=False)
+            radius = 1.0 + 0.2 * np.sin(3.0 * theta)
+            waypoints = np.stack([radius * np.cos(theta), radius * np.sin(theta), theta], axis=1)
+        build, agent = _measure(lambda: WaypointsAgent(LANDMARKS, waypoints=waypoints), 1)
+
+        clock = timer.SimulatedClock()
+        ekf = EKF(agent, tuple(agent.route.pose(0.0)), clock=clock.time)
+        _, _, actual, _ = timer.run(ekf, clock, delta=timer.INTERVAL, lifetime=60.0)
+        agent.s = None
+        agent._track(actual[0])
+
+        def tick():
+            for current in actual:
+                agent.get_ideal(current, 0.0)
+                agent.get_max_accelarations(current)
+                agent.get_linear_velocities(current)
+                agent.get_angular_velocities(current)
+
+        hooks, _ = _measure(tick, 1)
+        cross = [np.linalg.norm(agent.route.pose(agent.route.nearest(pose))[:2] - pose[:2]) for pose in actual]
+        print(f'route waypoints={size}: build={build * 1000:.1f}ms hooks={hooks / len(actual) * 1e6:.1f}us/tick '
+              f'length={agent.route.length:.2f}m cross_track mean={np.mean(cross):.3f}m max={np.max(cross):.3f}m')
+
+    for waypoints, closed in [([WAYPOINTS[0]], True), ([WAYPOINTS[0]] * 3, True), ([WAYPOINTS[0]] * 3, False)]:
+        try:
+            Route(waypoints, closed=closed)
+        except ValueError:
+            continue
+        raise AssertionError(f'a route of {len(waypoints)} identical waypoints (closed={closed}) must be rejected')
+
+
+def bench_multirate():
+    """
+    Notes:
+    ----------
+    predict at 50Hz and fuse the observations of 5Hz which arrive late through the measurement queue
+    (the state is rolled back to the time of each observation), and compare with fusing the observations at 10Hz
+    at every tick. the time of a tick which only predicts and of a tick which rolls back are measured separately.
+    the process noise added in a second must be the same at every rate
+    """
+
+    from circular_agent import CircularAgent, INITIAL_POSE
+
+    lifetime = 60.0
+    for rate, interval, latency in [(10, None, 0.0), (50, 0.2, 0.0), (50, 0.2, 0.1), (50, 0.2, 0.5), (50, 0.2, 1.5)]:
+        clock = timer.SimulatedClock()
+        delta = 1.0 / rate
+        ekf = EKF(CircularAgent(LANDMARKS, seed=0), INITIAL_POSE, clock=clock.time, stacked_update=True,
+                  observation_interval=None if interval is None else np.inf)
+        pending = []
+        predict_only, fused, depths = [], [], []
+        observed_t = ekf.start_t
+        for _ in range(int(round(lifetime / delta))):
+            clock.advance(delta)
+            while len(pending) > 0 and pending[0][0] <= clock.time():
+                _, taken_t, observations = pending.pop(0)
+                ekf.add_observations(taken_t, observations)
+                depths.append(sum(entry[0] > taken_t for entry in ekf.history) + 1)
+            rolling = len(ekf.queue) > 0
+            start = time.perf_counter()
+            ekf.step()
+            (fused if rolling or interval is None else predict_only).append(time.perf_counter() - start)
+            if interval is not None and ekf.t - observed_t >= interval - 1e-9:
+                observed_t = ekf.t
+                pending.append((ekf.t + latency, ekf.t, ekf.agent.get_observations()))
+
+        name = 'inline' if interval is None else f'queue latency={latency:.1f}s rollback={np.mean(depths):.1f}ticks'
+        timing = f'predict_only={np.mean(predict_only) * 1e6:.0f}us ' if len(predict_only) > 0 else ''
+        print(f'multirate {rate}Hz {name}: {timing}fused={np.mean(fused) * 1e6:.0f}us late={ekf.late}')
+
+    noises = {}
+    for rate in [5, 10, 50]:
+        ekf = EKF(BenchmarkAgent(LANDMARKS), np.zeros(3))
+        for _ in range(rate):
+            ekf.xhat, ekf.P = ekf.predict(np.zeros(2), 1.0 / rate)
+        noises[rate] = np.trace(ekf.P)
+    print('multirate process noise per second: ' + ' '.join(f'{rate}Hz={noise:.4f}' for rate, noise in noises.items()))
+    assert np.allclose(list(noises.values()), noises[10]), 'the process noise per second must not depend on the rate'
+
+
+def bench_conflation():
+    """
+    Notes:
+    ----------
+    publish messages faster than a subscriber which writes to a slow stdout (0.2ms per write) can process one by one,
+    and sample the lag of the latest pose shown by Plotter at each refresh of the plot (500ms).
+    Plotter.subscribe is driven with a stubbed socket, which queues the messages up to the RCVHWM of the subscriber
+    and drops the newer ones like ZMQ. it receives one message at a time when plotter.BATCH is 1,
+    and drains the socket in batches for receive_many with the default BATCH
+    """
+
+    import queue
+    import threading
+    from unittest import mock
+
+    import zmq
+
+    import plotter
+
+    class SlowStdout:
+
+        def write(self, text):
+            time.sleep(0.0002)
+            return len(text)
+
+        def flush(self):
+            pass
+
+    class Stopped(Exception):
+        pass
+
+    class StubSocket:
+
+        def __init__(self, stop):
+            self.stop = stop
+            self.queue = None
+            self.dropped = 0
+
+        def setsockopt(self, option, value):
+            if option == zmq.RCVHWM:
+                self.queue = queue.Queue(maxsize=value)
+
+        def connect(self, endpoint):
+            pass
+
+        def send_multipart(self, frames):
+            try:
+                self.queue.put_nowait(frames)
+            except queue.Full:
+                self.dropped += 1
+
+        def recv_multipart(self, flags=0, copy=True):
+            if flags & zmq.NOBLOCK:
+                try:
+                    return self.queue.get_nowait()
+                except queue.Empty:
+                    raise zmq.Again()
+            while not self.stop.is_set():
+                try:
+                    return self.queue.get(timeout=0.1)
+                except queue.Empty:
+                    pass
+            raise Stopped()
+
+    class StubContext:
+
+        def __init__(self, socket):
+            self.stub = socket
+
+        def socket(self, socket_type):
+            return self.stub
+
+    duration = 5.0
+    ideal, P = np.zeros(3), np.identity(3)
+    batch = plotter.BATCH
+    for rate in [1000, 5000, 20000]:
+        for plotter.BATCH in [1, batch]:
+            p = plotter.Plotter(robots=[0])
+            stop = threading.Event()
+            socket = StubSocket(stop)
+
+            def consume():
+                try:
+                    p.subscribe()
+                except Stopped:
+                    pass
+
+            lags = []
+
+            def sample():
+                while not stop.wait(0.5):
+                    if len(p.tracks[0].xhat_list) > 0:
+                        lags.append(time.monotonic() - p.tracks[0].xhat_list.last()[0])
+
+            with mock.patch.object(plotter.zmq, 'Context', lambda: StubContext(socket)), \
+                    contextlib.redirect_stdout(SlowStdout()):
+                threads = [threading.Thread(target=consume), threading.Thread(target=sample)]
+                for thread in threads:
+                    thread.start()
+                time.sleep(0.2)
+                start = time.monotonic()
+                sent = 0
+                while time.monotonic() - start < duration:
+                    for _ in range(int((time.monotonic() - start) * rate) - sent):
+                        xhat = np.array([time.monotonic(), 0.0, 0.0])
+                        socket.send_multipart(telemetry.encode(ideal, ideal, xhat, P, None, [], robot=0))
+                        sent += 1
+                    time.sleep(0.001)
+                stop.set()
+                for thread in threads:
+                    thread.join()
+
+            print(f'conflation rate={rate}/s batch={plotter.BATCH}: sent={sent} received={p.received} '
+                  f'dropped={socket.dropped} lag mean={np.mean(lags) * 1000:.0f}ms max={np.max(lags) * 1000:.0f}ms '
+                  f'trajectory={len(p.tracks[0].xhat_list)}')
+    plotter.BATCH = batch
+
+
+BENCHMARKS = {
+    'planner': bench_planner,
+    'fleet': bench_fleet,
+    'update': bench_update,
+    'headless': bench_headless,
+    'telemetry': bench_telemetry,
+    'plotter': bench_plotter,
+    'recorder': bench_recorder,
+    'observation': bench_observation,
+    'obstacle': bench_obstacle,
+    'horizon': bench_horizon,
+    'search': bench_search,
+    'profile': bench_profile,
+    'publisher': bench_publisher,
+    'ukf': bench_ukf,
+    'particle': bench_particle,
+    'predict': bench_predict,
+    'ideal': bench_ideal,
+    'route': bench_route,
+    'multirate': bench_multirate,
+    'conflation': bench_conflation,
+}
+
+
+if __name__ == '__main__':
+    for name in sys.argv[1:] or BENCHMARKS.keys():
+        BENCHMARKS[name]()
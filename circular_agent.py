@@ -1,10 +1,13 @@
 #!/usr/bin/env python
 
+import argparse
+
 import numpy as np
 
 from src.environment import LANDMARKS
 from src.agent import Agent
 from src.filters import EKF
+from src.recorder import Recorder
 from src import utils, timer
 
 INPUT_OMEGA = 0.4
@@ -28,14 +31,36 @@ class CircularAgent(Agent):
             ideal pose of t
         """
 
-        ideal = np.array((0, 0, np.pi/2.0)) + np.array((np.cos(INPUT_OMEGA * t),
-                                                        np.sin(INPUT_OMEGA * t),
-                                                        INPUT_OMEGA * t))
-        ideal[2] = utils.normalize_angle(ideal[2])
+        return self.get_ideal_many(np.array((t,)))[0]
+
+    def get_ideal_many(self, times, current=None):
+        """
+        Parameters:
+        ----------
+        times: np.array().size(T)
+            elapsed times
+        current: np.array(x, y, theta)
+            current pose (is not used in this agent)
+
+        Returns:
+        ----------
+        np.array().size(T, 3)
+            ideal pose of each time
+        """
+
+        angle = INPUT_OMEGA * np.asarray(times, dtype=float)
+        ideal = np.array((0, 0, np.pi/2.0)) + np.stack([np.cos(angle), np.sin(angle), angle], axis=-1)
+        ideal[:, 2] = utils.normalize_angle(ideal[:, 2])
         return ideal
 
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='publish the telemetry of a robot which chases a target on a circle')
+    parser.add_argument('--robot', type=int, help=f'robot index of the published messages ({timer.ROBOT} by default)')
+    parser.add_argument('--endpoint', help=f'endpoint to bind ({timer.ENDPOINT} by default)')
+    parser.add_argument('--record', help='directory to record the ticks by src.recorder.Recorder')
+    args = parser.parse_args()
+
     agent = CircularAgent(LANDMARKS)
     ekf = EKF(agent, INITIAL_POSE)
-    timer.start(ekf)
+    timer.start(ekf, recorder=Recorder(args.record) if args.record else None, robot=args.robot, endpoint=args.endpoint)
@@ -0,0 +1,45 @@
+#!/usr/bin/env python
+
+import sys
+
+import zmq
+
+from src import telemetry
+
+HOST = 'localhost'
+PORT = 5556
+ENDPOINTS = (f'tcp://{HOST}:{PORT}',)
+
+
+def monitor(robots=None, endpoints=ENDPOINTS):
+    """
+    Parameters:
+    ----------
+    robots: list of int
+        robot indices to monitor (all robots when None)
+    endpoints: list of str
+        endpoints of the publishers to connect
+
+    Notes:
+    ----------
+    subscribe the profile summaries of src.timer and print the latency of each stage
+    """
+
+    context = zmq.Context()
+    subscriber = context.socket(zmq.SUB)
+    for endpoint in endpoints:
+        subscriber.connect(endpoint)
+    for topic in [telemetry.PROFILE_TOPIC] if robots is None else [telemetry.topic(r, telemetry.PROFILE_TOPIC) for r in robots]:
+        subscriber.setsockopt(zmq.SUBSCRIBE, topic)
+
+    while True:
+        summary = telemetry.decode_profile(subscriber.recv_multipart())
+        print(f'robot={summary["robot"]} ticks={summary["ticks"]} overruns={summary["overruns"]} missed={summary["missed"]} '
+              f'budget={summary["budget"] * 1000:.1f}ms')
+        for stage, latency in summary['stages'].items():
+            print(f'  {stage:>8}: mean={latency["mean"] * 1000:.3f}ms p50={latency["p50"] * 1000:.3f}ms '
+                  f'p90={latency["p90"] * 1000:.3f}ms p99={latency["p99"] * 1000:.3f}ms max={latency["max"] * 1000:.3f}ms')
+
+
+if __name__ == '__main__':
+    monitor([int(robot) for robot in sys.argv[1:]] or None)
@@ -1,6 +1,6 @@
 #!/usr/bin/env python
 
-import json
+import argparse
 import threading
 
 import numpy as np
@@ -11,23 +11,106 @@ import matplotlib.pyplot as plt
 import matplotlib.patches as patches
 from matplotlib.animation import FuncAnimation
 
+from src import telemetry
+from src.buffer import RingBuffer
+
 HOST = 'localhost'
 PORT = 5556
+ENDPOINTS = (f'tcp://{HOST}:{PORT}',)
+CAPACITY = 10000
+HISTORY_DECIMATION = 10
+BATCH = 256
+RCVHWM = 1000
 
 
-class Plotter:
+class Track:
 
-    def __init__(self):
+    def __init__(self, history=False):
         """
+        Parameters:
+        ----------
+        history: bool
+            if True, also keep the long history of the trajectories decimated by HISTORY_DECIMATION
+
         Notes:
         ----------
-        prepare ideal_list, actual_list, xhat_list, observed_list to plot them
+        trajectories of a robot: ideal_list, actual_list, xhat_list (the latest CAPACITY poses),
+        observed_list and the long history
         """
 
-        self.ideal_list = np.array([()]).reshape(0, 3)
-        self.actual_list = np.array([()]).reshape(0, 3)
-        self.xhat_list = np.array([()]).reshape(0, 3)
+        self.ideal_list = RingBuffer(CAPACITY)
+        self.actual_list = RingBuffer(CAPACITY)
+        self.xhat_list = RingBuffer(CAPACITY)
         self.observed_list = []
+        self.history = {
+            'ideal': RingBuffer(CAPACITY, decimation=HISTORY_DECIMATION),
+            'actual': RingBuffer(CAPACITY, decimation=HISTORY_DECIMATION),
+            'xhat': RingBuffer(CAPACITY, decimation=HISTORY_DECIMATION),
+        } if history else {}
+
+    def append(self, msg):
+        """
+        Parameters:
+        ----------
+        msg: dict
+            a message decoded by src.telemetry.decode (or a tick of src.recorder.Log)
+        """
+
+        self.ideal_list.append(msg['ideal'])
+        self.actual_list.append(msg['actual'])
+        self.xhat_list.append(msg['xhat'])
+        for key, history in self.history.items():
+            history.append(msg[key])
+        self.observed_list = [tuple(o) for o in msg['observed']]
+
+    def extend(self, msgs):
+        """
+        Parameters:
+        ----------
+        msgs: list of dict
+            messages of this robot (oldest first)
+
+        Notes:
+        ----------
+        append the poses of all messages to the trajectories at once,
+        and keep only the observations of the latest message because only they are drawn
+        """
+
+        for key, buffer in [('ideal', self.ideal_list), ('actual', self.actual_list), ('xhat', self.xhat_list)]:
+            rows = np.array([msg[key] for msg in msgs])
+            buffer.extend(rows)
+            if key in self.history:
+                self.history[key].extend(rows)
+        self.observed_list = [tuple(o) for o in msgs[-1]['observed']]
+
+
+class Plotter:
+
+    def __init__(self, history=False, robots=None, endpoints=ENDPOINTS):
+        """
+        Parameters:
+        ----------
+        history: bool
+            if True, also keep and plot the long history of the trajectories
+            decimated by HISTORY_DECIMATION
+        robots: list of int
+            robot indices to subscribe and plot (all robots when None)
+        endpoints: list of str
+            endpoints of the publishers to connect (the processes of some robots can publish on their own endpoints)
+
+        Notes:
+        ----------
+        prepare a Track of each robot (created when its first message is received if robots is None),
+        and the counters of received messages and drawn messages
+        """
+
+        self.history = history
+        self.robots = None if robots is None else list(robots)
+        self.endpoints = list(endpoints)
+        self.tracks = {} if robots is None else {robot: Track(history) for robot in robots}
+        self.artists = {}
+        self.received = 0
+        self.drawn = 0
 
     def start(self):
         """
@@ -44,60 +127,123 @@ class Plotter:
         """
         Notes:
         ----------
-        subscribe data by using zmq
+        subscribe data by using zmq.
+        only the topics of the robots to plot are subscribed, so the messages of the other robots are filtered
+        by ZMQ and never received nor decoded.
+        all waiting messages (up to BATCH) are received at once and applied by receive_many,
+        so the subscriber keeps up with any publish rate which it can decode and the plot shows the latest poses.
+        when it cannot, ZMQ drops the messages over RCVHWM instead of queuing them without limit
         """
 
         context = zmq.Context()
         subscriber = context.socket(zmq.SUB)
-        subscriber.connect(f'tcp://{HOST}:{PORT}')
-        subscriber.setsockopt(zmq.SUBSCRIBE, ''.encode('utf-8'))
+        subscriber.setsockopt(zmq.RCVHWM, RCVHWM)
+        for endpoint in self.endpoints:
+            subscriber.connect(endpoint)
+        topics = [telemetry.ROBOT_TOPIC] if self.robots is None else [telemetry.topic(robot) for robot in self.robots]
+        for topic in topics:
+            subscriber.setsockopt(zmq.SUBSCRIBE, topic)
 
         while True:
-            data = subscriber.recv()
-            msg = json.loads(data.decode('utf-8'))
-            self.ideal_list = np.append(self.ideal_list,
-                                        np.array([[msg['ideal']['x'], msg['ideal']['y'], msg['ideal']['theta']]]),
-                                        axis=0)
-            self.actual_list = np.append(self.actual_list,
-                                         np.array([[msg['actual']['x'], msg['actual']['y'], msg['actual']['theta']]]),
-                                         axis=0)
-            self.xhat_list = np.append(self.xhat_list,
-                                       np.array([[msg['xhat']['x'], msg['xhat']['y'], msg['xhat']['theta']]]),
-                                       axis=0)
-            self.observed_list = [(o['landmark']['x'], o['landmark']['y'], o['distance'], o['angle']) for o in msg['observed']]
-            print(f'covariance : {msg["covariance"]}')
-            print(f'kalman gain: {msg["kalmanGain"]}')
+            frames_list = [subscriber.recv_multipart(copy=False)]
+            while len(frames_list) < BATCH:
+                try:
+                    frames_list.append(subscriber.recv_multipart(zmq.NOBLOCK, copy=False))
+                except zmq.Again:
+                    break
+            self.receive_many([telemetry.decode(frames) for frames in frames_list])
+
+    def track(self, robot):
+        """
+        Parameters:
+        ----------
+        robot: int
+            robot index (None for the messages without it)
+
+        Returns:
+        ----------
+        Track
+            trajectories of robot (created at the first call)
+        """
+
+        if robot not in self.tracks:
+            self.tracks[robot] = Track(self.history)
+        return self.tracks[robot]
+
+    def receive(self, msg):
+        """
+        Parameters:
+        ----------
+        msg: dict
+            a message decoded by src.telemetry.decode (or a tick of src.recorder.Log)
+
+        Notes:
+        ----------
+        append the poses of a message to the trajectories of its robot
+        (a message of a robot which is not plotted is ignored)
+        """
+
+        robot = msg.get('robot')
+        if self.robots is not None and robot not in self.robots:
+            return
+        self.track(robot).append(msg)
+        self.received += 1
+        print(f'robot={robot} covariance : {msg["covariance"].flatten().tolist()}')
+        print(f'robot={robot} kalman gain: {None if msg["kalmanGain"] is None else msg["kalmanGain"].flatten().tolist()}')
+
+    def receive_many(self, msgs):
+        """
+        Parameters:
+        ----------
+        msgs: list of dict
+            messages decoded by src.telemetry.decode (oldest first)
+
+        Notes:
+        ----------
+        append the poses of all messages to the trajectories of each robot in a batch,
+        and print only the latest message of each robot (writing every message to stdout is slower than decoding it)
+        """
+
+        robots = {}
+        for msg in msgs:
+            robot = msg.get('robot')
+            if self.robots is None or robot in self.robots:
+                robots.setdefault(robot, []).append(msg)
+
+        for robot, robot_msgs in robots.items():
+            self.track(robot).extend(robot_msgs)
+            self.received += len(robot_msgs)
+            msg = robot_msgs[-1]
+            print(f'robot={robot} covariance : {msg["covariance"].flatten().tolist()} ({len(robot_msgs)} msgs)')
+            print(f'robot={robot} kalman gain: {None if msg["kalmanGain"] is None else msg["kalmanGain"].flatten().tolist()}')
 
     def plot(self):
         """
         Notes:
         ----------
-        * plot below trajectories
+        * plot below trajectories of each robot
             * the ideal trajectory
             * the actual trajectory with randome noises
             * the estimated trajectory by using EKF
         * plot observed landmarks
-        * plot estimated pose (x, y, theta) of robot
+        * plot estimated pose (x, y, theta) and index of robot
+
+        the artists are created once for each robot and only their data are updated by blitting.
+        a frame is skipped when no new message has been received since the last frame
         """
 
         fig = plt.figure(figsize=(12.0, 12.0))
         ax = fig.add_subplot(111)
+        ax.set_xlim([-1.2, 1.2])
+        ax.set_ylim([-1.2, 1.2])
 
-        def update(frame):
-            ax.cla()
-            ax.set_xlim([-1.2, 1.2])
-            ax.set_ylim([-1.2, 1.2])
+        def init():
+            return [artist for artists in self.artists.values() for artist in artists.values()]
 
-            for observed in self.observed_list:
-                self._plot_observed(ax, observed, 'green', 'gray')
-            if len(self.ideal_list) > 0:
-                self._plot_ideal(ax, 'black')
-            if len(self.actual_list):
-                self._plot_actual(ax, 'blue')
-            if len(self.xhat_list):
-                self._plot_estimated(ax, 'red')
+        def update(frame):
+            return self._update_frame(ax)
 
-        anim = FuncAnimation(fig, update, interval=500)
+        anim = FuncAnimation(fig, update, init_func=init, interval=500, blit=True, cache_frame_data=False)
 
         def on_click(event):
             anim.event_source.stop()
@@ -105,88 +251,156 @@ class Plotter:
         plt.connect('button_press_event', on_click)
         plt.show()
 
-    def _plot_ideal(self, ax, color):
+    def _update_frame(self, ax):
         """
         Parameters:
         ----------
         ax: Axes
             the axes to plot
-        color: str
-            the color of trajectory
 
-        Notes:
+        Returns:
         ----------
-        plot the ideal trajectory
+        list of Artist
+            the updated artists of all robots (empty when no new message has been received)
         """
 
-        ax.plot(self.ideal_list[:, 0], self.ideal_list[:, 1], color=color)
-        c = patches.Circle(xy=tuple(self.ideal_list[-1][:2]), radius=0.02, fc='none', ec=color)
-        ax.add_patch(c)
-        nose_x = [self.ideal_list[-1][0], self.ideal_list[-1][0] + 0.03 * np.cos(self.ideal_list[-1][2])]
-        nose_y = [self.ideal_list[-1][1], self.ideal_list[-1][1] + 0.03 * np.sin(self.ideal_list[-1][2])]
-        ax.plot(nose_x, nose_y, color=color, linewidth=2.0)
-
-    def _plot_actual(self, ax, color):
+        received = self.received
+        if received == self.drawn:
+            return []
+        self.drawn = received
+
+        updated = []
+        for robot, track in list(self.tracks.items()):
+            if len(track.xhat_list) == 0:
+                continue
+            if robot not in self.artists:
+                self.artists[robot] = self._create_artists(ax, robot)
+            updated += self._update_artists(track, self.artists[robot])
+        return updated
+
+    def _create_artists(self, ax, robot):
         """
         Parameters:
         ----------
         ax: Axes
             the axes to plot
-        color: str
-            the color of trajectory
+        robot: int
+            robot index to label
 
-        Notes:
+        Returns:
         ----------
-        plot the actual trajectory
+        dict of str -> Artist
+            the artists of trajectories, poses and observations of a robot (they have no data yet)
         """
 
-        ax.plot(self.actual_list[:, 0], self.actual_list[:, 1], color=color)
+        artists = {}
+        for key, color in [('ideal', 'black'), ('actual', 'blue'), ('xhat', 'red')]:
+            if self.history:
+                artists[f'{key}_history'], = ax.plot([], [], color=color, alpha=0.3, animated=True)
+        artists['sight'], = ax.plot([], [], color='green', animated=True)
+        artists['landmark'], = ax.plot([], [], 's', color='gray', animated=True)
+        artists['ideal'], = ax.plot([], [], color='black', animated=True)
+        artists['ideal_nose'], = ax.plot([], [], color='black', linewidth=2.0, animated=True)
+        artists['ideal_body'] = ax.add_patch(patches.Circle(xy=(0, 0), radius=0.02, fc='none', ec='black',
+                                                            visible=False, animated=True))
+        artists['actual'], = ax.plot([], [], color='blue', animated=True)
+        artists['xhat'], = ax.plot([], [], color='red', animated=True)
+        artists['xhat_nose'], = ax.plot([], [], color='red', linewidth=5.0, animated=True)
+        artists['xhat_body'] = ax.add_patch(patches.Circle(xy=(0, 0), radius=0.05, fc='none', ec='red',
+                                                           visible=False, animated=True))
+        artists['label'] = ax.text(0.0, 0.0, '' if robot is None else str(robot), color='red', visible=False,
+                                   animated=True)
+        return artists
+
+    def _update_artists(self, track, artists):
+        """
+        Parameters:
+        ----------
+        track: Track
+            the trajectories of a robot
+        artists: dict of str -> Artist
+            the artists of the robot created by _create_artists
 
-    def _plot_estimated(self, ax, color):
+        Returns:
+        ----------
+        list of Artist
+            the updated artists
+        """
+
+        for key, history in track.history.items():
+            view = history.view()
+            artists[f'{key}_history'].set_data(view[:, 0], view[:, 1])
+        self._plot_observed(track, artists['sight'], artists['landmark'])
+        self._plot_pose(track.ideal_list, artists['ideal'], artists['ideal_body'], artists['ideal_nose'], 0.03)
+        actual_list = track.actual_list.view()
+        artists['actual'].set_data(actual_list[:, 0], actual_list[:, 1])
+        self._plot_pose(track.xhat_list, artists['xhat'], artists['xhat_body'], artists['xhat_nose'], 0.1)
+        artists['label'].set_position(tuple(track.xhat_list.last()[:2] + 0.06))
+        artists['label'].set_visible(True)
+        return list(artists.values())
+
+    def _plot_pose(self, buffer, line, body, nose, nose_length):
         """
         Parameters:
         ----------
-        ax: Axes
-            the axes to plot
-        color: str
-            the color of trajectory
+        buffer: src.buffer.RingBuffer
+            the trajectory
+        line: Line2D
+            the artist of trajectory
+        body: Circle
+            the artist of current position
+        nose: Line2D
+            the artist of current direction
+        nose_length: float
+            the length of nose
 
         Notes:
         ----------
-        plot the estimated trajectory and current pose
+        update the trajectory and the current pose
         """
 
-        ax.plot(self.xhat_list[:, 0], self.xhat_list[:, 1], color=color)
-        c = patches.Circle(xy=tuple(self.xhat_list[-1][:2]), radius=0.05, fc='none', ec=color)
-        ax.add_patch(c)
-        nose_x = [self.xhat_list[-1][0], self.xhat_list[-1][0] + 0.1 * np.cos(self.xhat_list[-1][2])]
-        nose_y = [self.xhat_list[-1][1], self.xhat_list[-1][1] + 0.1 * np.sin(self.xhat_list[-1][2])]
-        ax.plot(nose_x, nose_y, color=color, linewidth=5.0)
+        trajectory = buffer.view()
+        line.set_data(trajectory[:, 0], trajectory[:, 1])
+        current = trajectory[-1]
+        body.set_center(tuple(current[:2]))
+        body.set_visible(True)
+        nose.set_data([current[0], current[0] + nose_length * np.cos(current[2])],
+                      [current[1], current[1] + nose_length * np.sin(current[2])])
 
-    def _plot_observed(self, ax, observed, color, mark_color):
+    def _plot_observed(self, track, sight, landmark):
         """
         Parameters:
         ----------
-        ax: Axes
-            the axes to plot
-        observed: tuple(landmark x, landmark y, distance, angle)
-            tuple of observed landmark
-        color: str
-            the color of observed sight line
-        mark_color: str
-            the color of observed landmark
+        track: Track
+            the trajectories of a robot
+        sight: Line2D
+            the artist of observed sight lines
+        landmark: Line2D
+            the artist of observed landmarks
 
         Notes:
         ----------
-        plot the landmark and observed sight line
+        update the landmarks and observed sight lines
+        (all sight lines are one line separated by nan)
         """
 
-        actual = self.actual_list[-1]
-        ax.plot(observed[0], observed[1], 's', color=mark_color)
-        xs = [actual[0], actual[0] + observed[2] * np.cos(observed[3] + actual[2])]
-        ys = [actual[1], actual[1] + observed[2] * np.sin(observed[3] + actual[2])]
-        ax.plot(xs, ys, color=color)
+        observed = np.array(track.observed_list).reshape(-1, 4)
+        actual = track.actual_list.last()
+        landmark.set_data(observed[:, 0], observed[:, 1])
+
+        xs = np.full((len(observed), 3), np.nan)
+        ys = np.full((len(observed), 3), np.nan)
+        xs[:, 0], ys[:, 0] = actual[0], actual[1]
+        xs[:, 1] = actual[0] + observed[:, 2] * np.cos(observed[:, 3] + actual[2])
+        ys[:, 1] = actual[1] + observed[:, 2] * np.sin(observed[:, 3] + actual[2])
+        sight.set_data(xs.ravel(), ys.ravel())
 
 
 if __name__ == '__main__':
-    Plotter().start()
+    parser = argparse.ArgumentParser(description='plot the telemetry of src.timer')
+    parser.add_argument('--robot', type=int, action='append', help='robot index to plot (repeatable, all robots by default)')
+    parser.add_argument('--endpoint', action='append', help=f'endpoint to connect (repeatable, {ENDPOINTS[0]} by default)')
+    parser.add_argument('--history', action='store_true', help='also plot the long history of the trajectories')
+    args = parser.parse_args()
+
+    Plotter(args.history, args.robot, args.endpoint or ENDPOINTS).start()
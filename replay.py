@@ -0,0 +1,99 @@
+#!/usr/bin/env python
+
+import argparse
+import threading
+import time
+
+import zmq
+
+from src.recorder import Log
+from src import telemetry, timer
+
+SETTLE = 0.5
+
+
+def replay(log, callback, speed=1.0, start=0):
+    """
+    Parameters:
+    ----------
+    log: src.recorder.Log
+        the recorded log
+    callback: callable
+        function called with each tick (dict of src.recorder.Log)
+    speed: float
+        playback speed (2.0 is twice as fast as recorded, 0 is as fast as possible)
+    start: int
+        index of the first tick (seeked in O(1))
+
+    Notes:
+    ----------
+    call callback with each tick at the recorded intervals scaled by speed
+    """
+
+    if len(log) <= start:
+        return
+
+    times = log.times()
+    wall_start = time.monotonic()
+    for i in range(start, len(log)):
+        if speed > 0:
+            wait = (times[i] - times[start]) / speed - (time.monotonic() - wall_start)
+            if wait > 0:
+                time.sleep(wait)
+        callback(log[i])
+
+
+def publish(log, speed=1.0, start=0, robot=None, endpoint=None):
+    """
+    Parameters:
+    ----------
+    log: src.recorder.Log
+        the recorded log
+    speed: float
+        playback speed
+    start: int
+        index of the first tick
+    robot: int
+        robot index of the messages (src.timer.ROBOT when None)
+    endpoint: str
+        endpoint to bind the PUB socket (src.timer.ENDPOINT when None)
+
+    Notes:
+    ----------
+    re-publish the recorded ticks on the same endpoint, topic and format as src.timer.
+    it waits SETTLE seconds after binding so that running subscribers can reconnect
+    """
+
+    robot = timer.ROBOT if robot is None else robot
+    context = zmq.Context()
+    publisher = context.socket(zmq.PUB)
+    publisher.bind(timer.ENDPOINT if endpoint is None else endpoint)
+    time.sleep(SETTLE)
+
+    def send(msg):
+        observed_list = [((o[0], o[1]), o[2:]) for o in msg['observed']]
+        publisher.send_multipart(telemetry.encode(msg['ideal'], msg['actual'], msg['xhat'], msg['covariance'],
+                                                  msg['kalmanGain'], observed_list, robot=robot, format=timer.FORMAT))
+
+    replay(log, send, speed, start)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='replay a log recorded by src.recorder.Recorder')
+    parser.add_argument('path', help='directory of the log')
+    parser.add_argument('--speed', type=float, default=1.0, help='playback speed (0 is as fast as possible)')
+    parser.add_argument('--start', type=int, default=0, help='index of the first tick')
+    parser.add_argument('--plot', action='store_true', help='feed Plotter directly instead of publishing')
+    parser.add_argument('--robot', type=int, help='robot index of the published messages')
+    parser.add_argument('--endpoint', help='endpoint to bind')
+    args = parser.parse_args()
+
+    log = Log(args.path)
+    if args.plot:
+        from plotter import Plotter
+
+        plotter = Plotter()
+        threading.Thread(target=replay, args=(log, plotter.receive, args.speed, args.start), daemon=True).start()
+        plotter.plot()
+    else:
+        publish(log, args.speed, args.start, args.robot, args.endpoint)
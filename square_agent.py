@@ -1,10 +1,13 @@
 #!/usr/bin/env python
 
+import argparse
+
 import numpy as np
 
 from src.environment import LANDMARKS
 from src.agent import Agent
 from src.filters import EKF
+from src.recorder import Recorder
 from src import utils, timer
 
 INPUT_V = 0.3
@@ -14,6 +17,20 @@ INITIAL_POSE = (1.0, 0.0, np.pi / 2.0)
 
 class SquareAgent(Agent):
 
+    SEGMENTS = np.array([
+        # start x, start y, start theta, x rate, y rate, theta rate, duration
+        (1.0, 0.0, np.pi / 2.0, 0.0, INPUT_V, 0.0, 1.0 / INPUT_V),
+        (1.0, 1.0, np.pi / 2.0, 0.0, 0.0, INPUT_OMEGA, np.pi / 2.0 / INPUT_OMEGA),
+        (1.0, 1.0, np.pi, -INPUT_V, 0.0, 0.0, 2.0 / INPUT_V),
+        (-1.0, 1.0, np.pi, 0.0, 0.0, INPUT_OMEGA, np.pi / 2.0 / INPUT_OMEGA),
+        (-1.0, 1.0, np.pi * 3.0 / 2.0, 0.0, -INPUT_V, 0.0, 2.0 / INPUT_V),
+        (-1.0, -1.0, np.pi * 3.0 / 2.0, 0.0, 0.0, INPUT_OMEGA, np.pi / 2.0 / INPUT_OMEGA),
+        (-1.0, -1.0, 0.0, INPUT_V, 0.0, 0.0, 2.0 / INPUT_V),
+        (1.0, -1.0, 0.0, 0.0, 0.0, INPUT_OMEGA, np.pi / 2.0 / INPUT_OMEGA),
+        (1.0, -1.0, np.pi / 2.0, 0.0, INPUT_V, 0.0, 1.0 / INPUT_V),
+    ])
+    BOUNDARIES = np.cumsum(np.append(0.0, SEGMENTS[:, 6]))
+
     def get_ideal(self, current, t):
         """
         Parameters:
@@ -29,44 +46,45 @@ class SquareAgent(Agent):
             ideal pose of t
         """
 
-        d0 = 0.0
-        d1 = d0 + 1.0 / INPUT_V
-        d2 = d1 + np.pi / 2.0 / INPUT_OMEGA
-        d3 = d2 + 2.0 / INPUT_V
-        d4 = d3 + np.pi / 2.0 / INPUT_OMEGA
-        d5 = d4 + 2.0 / INPUT_V
-        d6 = d5 + np.pi / 2.0 / INPUT_OMEGA
-        d7 = d6 + 2.0 / INPUT_V
-        d8 = d7 + np.pi / 2.0 / INPUT_OMEGA
-        d9 = d8 + 1.0 / INPUT_V
-
-        delta = t % d9
-
-        if d0 <= delta < d1:
-            ideal = np.array((1.0, 0 + INPUT_V * delta, np.pi / 2.0))
-        elif d1 <= delta < d2:
-            ideal = np.array((1.0, 1.0, np.pi / 2.0 + INPUT_OMEGA * (delta - d1)))
-        elif d2 <= delta < d3:
-            ideal = np.array((1.0 - INPUT_V * (delta - d2), 1.0, np.pi))
-        elif d3 <= delta < d4:
-            ideal = np.array((-1.0, 1.0, np.pi + INPUT_OMEGA * (delta - d3)))
-        elif d4 <= delta < d5:
-            ideal = np.array((-1.0, 1.0 - INPUT_V * (delta - d4), np.pi * 3.0 / 2.0))
-        elif d5 <= delta < d6:
-            ideal = np.array((-1.0, -1.0, np.pi * 3.0 / 2.0 + INPUT_OMEGA * (delta - d5)))
-        elif d6 <= delta < d7:
-            ideal = np.array((-1.0 + INPUT_V * (delta - d6), -1.0, 0.0))
-        elif d7 <= delta < d8:
-            ideal = np.array((1.0, -1.0, INPUT_OMEGA * (delta - d7)))
-        elif d8 <= delta < d9:
-            ideal = np.array((1.0, -1.0 + INPUT_V * (delta - d8), np.pi / 2.0))
-        else:
-            raise NotImplementedError
-        ideal[2] = utils.normalize_angle(ideal[2])
+        return self.get_ideal_many(np.array((t,)))[0]
+
+    def get_ideal_many(self, times, current=None):
+        """
+        Parameters:
+        ----------
+        times: np.array().size(T)
+            elapsed times
+        current: np.array(x, y, theta)
+            current pose (is not used in this agent)
+
+        Returns:
+        ----------
+        np.array().size(T, 3)
+            ideal pose of each time
+
+        Notes:
+        ----------
+        the path is the segments of SEGMENTS, whose boundaries BOUNDARIES are calculated once.
+        the segment of each time is looked up by np.searchsorted, and the pose moves from the start of the segment
+        at the constant rates of the segment
+        """
+
+        delta = np.asarray(times, dtype=float) % SquareAgent.BOUNDARIES[-1]
+        index = np.searchsorted(SquareAgent.BOUNDARIES, delta, side='right') - 1
+        segment = SquareAgent.SEGMENTS[index]
+
+        ideal = segment[:, 0:3] + segment[:, 3:6] * (delta - SquareAgent.BOUNDARIES[index])[:, np.newaxis]
+        ideal[:, 2] = utils.normalize_angle(ideal[:, 2])
         return ideal
 
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='publish the telemetry of a robot which chases a target on a square')
+    parser.add_argument('--robot', type=int, help=f'robot index of the published messages ({timer.ROBOT} by default)')
+    parser.add_argument('--endpoint', help=f'endpoint to bind ({timer.ENDPOINT} by default)')
+    parser.add_argument('--record', help='directory to record the ticks by src.recorder.Recorder')
+    args = parser.parse_args()
+
     agent = SquareAgent(LANDMARKS)
     ekf = EKF(agent, INITIAL_POSE)
-    timer.start(ekf)
+    timer.start(ekf, recorder=Recorder(args.record) if args.record else None, robot=args.robot, endpoint=args.endpoint)
@@ -3,6 +3,8 @@ import abc
 import numpy as np
 
 from src.robot import Robot
+from src.camera import Camera
+from src.spatial import GridIndex
 
 
 class Agent(metaclass=abc.ABCMeta):
@@ -11,17 +13,30 @@ class Agent(metaclass=abc.ABCMeta):
     ovserve_dist_sd = 0.02
     ovserve_angle_sd = 0.02
 
-    def __init__(self, landmarks):
+    NOISE_BLOCK = 4096
+
+    def __init__(self, landmarks, seed=None):
         """
         Parameters:
         ----------
         landmarks: list of tuple (x, y)
             list of the landmark coordination
+        seed: int or np.random.SeedSequence
+            seed of the random noises of this agent (unpredictable when None)
+
+        Notes:
+        ----------
+        the noises are drawn from the own generator of this agent in blocks of NOISE_BLOCK,
+        so agents which have the same seed generate the same trajectory
         """
 
         self.actual = None
         self.observed_list = []
         self.landmarks = landmarks
+        self.landmark_index = GridIndex(landmarks)
+        self.rng = np.random.default_rng(seed)
+        self.noise = np.empty(0)
+        self.noise_index = 0
 
     @abc.abstractmethod
     def get_ideal(self, current, t):
@@ -45,6 +60,29 @@ class Agent(metaclass=abc.ABCMeta):
 
         raise NotImplementedError
 
+    def get_ideal_many(self, times, current=None):
+        """
+        Parameters:
+        ----------
+        times: np.array().size(T)
+            elapsed times
+        current: np.array(x, y, theta)
+            current pose
+
+        Returns:
+        ----------
+        np.array().size(T, 3)
+            ideal pose of each time
+
+        Notes:
+        ----------
+        this default implement calls get_ideal for each time.
+        agents whose ideal pose is a function of time only (the same for every agent of the class) override this
+        to calculate all poses at once, and agents whose ideal pose depends on the current pose should not use this
+        """
+
+        return np.array([self.get_ideal(current, t) for t in np.asarray(times, dtype=float)]).reshape(-1, 3)
+
     def get_max_accelarations(self, current):
         """
         Parameters:
@@ -87,6 +125,34 @@ class Agent(metaclass=abc.ABCMeta):
         """
         return (Robot.MAX_OMEGA, Robot.MIN_OMEGA)
 
+    def get_sensing_range(self, current):
+        """
+        Parameters:
+        ----------
+        current: np.array(x, y, theta)
+            current pose (is not used in this default implement)
+
+        Returns:
+        ----------
+        float
+            max distance which the camera can observe
+        """
+        return Camera.RANGE
+
+    def get_fov(self, current):
+        """
+        Parameters:
+        ----------
+        current: np.array(x, y, theta)
+            current pose (is not used in this default implement)
+
+        Returns:
+        ----------
+        float
+            field of view (radian) of the camera
+        """
+        return Camera.FOV
+
     def move(self, current, input, delta):
         """
         Parameters:
@@ -104,9 +170,7 @@ class Agent(metaclass=abc.ABCMeta):
         """
 
         moved = Robot.move(current, input, delta)
-        self.actual = np.array([np.random.normal(moved[0], Agent.actual_xy_sd),
-                                np.random.normal(moved[1], Agent.actual_xy_sd),
-                                np.random.normal(moved[2], Agent.actual_theta_sd)])
+        self.actual = moved + self._normal(3) * np.array([Agent.actual_xy_sd, Agent.actual_xy_sd, Agent.actual_theta_sd])
 
     def get_observations(self):
         """
@@ -114,25 +178,160 @@ class Agent(metaclass=abc.ABCMeta):
         ----------
         list of tuple(landmark (x, y), np.array(distance, angle))
             list of observed landmark (tuple of (landmark pos, observed distance and angle))
+
+        Notes:
+        ----------
+        only the landmarks within the sensing range and the field of view are observed.
+        the candidates are looked up from the grid index of the landmarks,
+        so the cost depends on the number of nearby landmarks, not on the size of the map
         """
 
-        self.observed_list = [(landmark, self._observe(landmark, self.actual)) for landmark in self.landmarks]
+        sensing_range = self.get_sensing_range(self.actual)
+        fov = self.get_fov(self.actual)
+        if np.isfinite(sensing_range) or fov < 2.0 * np.pi:
+            candidates = self.landmark_index.query(self.actual, sensing_range)
+            visible = candidates[Camera.visible(self.landmark_index.points[candidates], self.actual, sensing_range, fov)]
+            landmarks = [self.landmarks[i] for i in visible]
+        else:
+            landmarks = self.landmarks
+
+        self.observed_list = list(zip(landmarks, self._observe(landmarks, self.actual)))
         return self.observed_list
 
-    def _observe(self, landmark, actual):
+    @classmethod
+    def get_ideal_fleet(cls, agents, currents, t):
+        """
+        Parameters:
+        ----------
+        agents: list of src.agent.Agent
+            agents of robots
+        currents: np.array().size(N, 3)
+            current poses
+        t: float
+            elapsed time
+
+        Returns:
+        ----------
+        np.array().size(N, 3)
+            ideal pose of t of each agent
+
+        Notes:
+        ----------
+        the agents whose class overrides get_ideal_many follow a reference path which is a function of time only,
+        so get_ideal_many is called once for each of these classes and the pose is shared by its agents.
+        get_ideal is called for each of the other agents
+        """
+
+        ideal = np.empty((len(agents), 3))
+        groups = {}
+        for i, agent in enumerate(agents):
+            groups.setdefault(type(agent), []).append(i)
+        for agent_class, index in groups.items():
+            if agent_class.get_ideal_many is not Agent.get_ideal_many:
+                ideal[index] = agents[index[0]].get_ideal_many(np.array((t,)))[0]
+            else:
+                ideal[index] = [agents[i].get_ideal(currents[i], t) for i in index]
+        return ideal
+
+    @classmethod
+    def move_fleet(cls, agents, currents, inputs, delta):
+        """
+        Parameters:
+        ----------
+        agents: list of src.agent.Agent
+            agents of robots
+        currents: np.array().size(N, 3)
+            current poses
+        inputs: np.array().size(N, 2)
+            input vectors of linear velocity and angular velocity
+        delta: float
+            time delta of this tick
+
+        Notes:
+        ----------
+        same as calling move of each agent, but all poses are moved by a single Robot.move.
+        the noises are still taken from the generator of each agent, so the trajectories do not change
+        """
+
+        moved = Robot.move(currents, inputs, delta)
+        noise = np.array([agent._normal(3) for agent in agents]).reshape(-1, 3)
+        actual = moved + noise * np.array([Agent.actual_xy_sd, Agent.actual_xy_sd, Agent.actual_theta_sd])
+        for agent, pose in zip(agents, actual):
+            agent.actual = pose
+
+    @classmethod
+    def get_observations_fleet(cls, agents):
+        """
+        Parameters:
+        ----------
+        agents: list of src.agent.Agent
+            agents of robots (which share the same landmarks)
+
+        Returns:
+        ----------
+        tuple(np.array().size(L, 2), np.array().size(N, L) of bool, np.array().size(N, L, 2))
+            coordinates of the landmarks, whether each agent observes each landmark,
+            and the observed distance and angle with noise (only valid where the landmark is observed)
+
+        Notes:
+        ----------
+        same as calling get_observations of each agent (the same noises, and observed_list of each agent is set),
+        but the visibility and the observations of all agents are calculated at once
+        """
+
+        points = agents[0].landmark_index.points
+        actual = np.array([agent.actual for agent in agents]).reshape(-1, 3)
+        sensing_range = [agent.get_sensing_range(pose) for agent, pose in zip(agents, actual)]
+        fov = [agent.get_fov(pose) for agent, pose in zip(agents, actual)]
+        visible = Camera.visible(points, actual, sensing_range, fov)
+
+        counts = visible.sum(axis=1)
+        noise = np.concatenate([np.empty(0)] + [agent._normal(2 * count) for agent, count in zip(agents, counts)])
+        observed = Camera.observe(points, actual[:, np.newaxis, :])
+        observed[visible] += noise.reshape(-1, 2) * np.array([Agent.ovserve_dist_sd, Agent.ovserve_angle_sd])
+
+        for agent, mask, rows in zip(agents, visible, observed):
+            index = np.flatnonzero(mask)
+            agent.observed_list = list(zip([agent.landmarks[i] for i in index], rows[index]))
+        return points, visible, observed
+
+    def _observe(self, landmarks, actual):
         """
         Parameters:
         ----------
+        landmarks: list of tuple (x, y)
+            list of the landmark coordination
         actual: np.array(x, y, theta)
             actual pose
 
         Returns:
         ----------
-        np.array(distance, angle)
-            observed distance and angle of a landmark with noise
+        np.array().size(N, 2)
+            observed distance and angle of each landmark with noise
+        """
+
+        if len(landmarks) == 0:
+            return np.empty((0, 2))
+        noise = self._normal(2 * len(landmarks)).reshape(-1, 2) * np.array([Agent.ovserve_dist_sd, Agent.ovserve_angle_sd])
+        return Camera.observe(np.array(landmarks, dtype=float), actual) + noise
+
+    def _normal(self, n):
+        """
+        Parameters:
+        ----------
+        n: int
+            number of noises
+
+        Returns:
+        ----------
+        np.array().size(n)
+            standard normal noises taken from the pre-generated block (refilled when it runs out)
         """
 
-        dist = np.random.normal(np.linalg.norm(np.array(landmark) - actual[:2]), Agent.ovserve_dist_sd)
-        angle = np.random.normal(np.arctan2(landmark[1] - actual[1], landmark[0] - actual[0]) - actual[2],
-                                 Agent.ovserve_angle_sd)
-        return np.array([dist, angle])
+        if self.noise_index + n > len(self.noise):
+            rest = self.noise[self.noise_index:]
+            self.noise = np.concatenate([rest, self.rng.standard_normal(max(Agent.NOISE_BLOCK, n))])
+            self.noise_index = 0
+        noise = self.noise[self.noise_index:self.noise_index + n]
+        self.noise_index += n
+        return noise
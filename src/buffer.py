@@ -0,0 +1,109 @@
+import threading
+
+import numpy as np
+
+
+class RingBuffer:
+
+    SLACK = 1024
+
+    def __init__(self, capacity, width=3, decimation=1):
+        """
+        Parameters:
+        ----------
+        capacity: int
+            max number of rows which can be viewed
+        width: int
+            number of columns of a row
+        decimation: int
+            store only every decimation-th appended row (1 stores all rows)
+
+        Notes:
+        ----------
+        each row is written twice (at i and i + size) into a preallocated array,
+        so the latest rows are always a contiguous slice and view() returns them without copying.
+        the storage has SLACK rows more than capacity, so a view is not overwritten by next SLACK appends
+        """
+
+        self.capacity = capacity
+        self.decimation = decimation
+        self.size = capacity + RingBuffer.SLACK
+        self.data = np.zeros((2 * self.size, width))
+        self.count = 0
+        self.appended = 0
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        """
+        Returns:
+        ----------
+        int
+            number of rows which can be viewed
+        """
+
+        return min(self.count, self.capacity)
+
+    def append(self, row):
+        """
+        Parameters:
+        ----------
+        row: np.array().size(width)
+            row to append (amortized O(1), no allocation)
+        """
+
+        with self.lock:
+            self.appended += 1
+            if (self.appended - 1) % self.decimation != 0:
+                return
+            i = self.count % self.size
+            self.data[i] = row
+            self.data[i + self.size] = row
+            self.count += 1
+
+    def extend(self, rows):
+        """
+        Parameters:
+        ----------
+        rows: np.array().size(N, width)
+            rows to append at once (same as appending each row, but the lock is taken once and
+            the rows are written by two vectorized assignments)
+        """
+
+        rows = np.asarray(rows).reshape(-1, self.data.shape[1])
+        with self.lock:
+            first = (-self.appended) % self.decimation
+            self.appended += len(rows)
+            rows = rows[first::self.decimation]
+            skipped = max(len(rows) - self.size, 0)
+            index = (self.count + skipped + np.arange(len(rows) - skipped)) % self.size
+            self.data[index] = rows[skipped:]
+            self.data[index + self.size] = rows[skipped:]
+            self.count += len(rows)
+
+    def view(self):
+        """
+        Returns:
+        ----------
+        np.array().size(len, width)
+            read-only view of the latest rows (oldest first)
+        """
+
+        with self.lock:
+            count = self.count
+        n = min(count, self.capacity)
+        start = (count - n) % self.size
+        view = self.data[start:start + n]
+        view.flags.writeable = False
+        return view
+
+    def last(self):
+        """
+        Returns:
+        ----------
+        np.array().size(width)
+            copy of the latest row
+        """
+
+        with self.lock:
+            i = (self.count - 1) % self.size
+            return self.data[i].copy()
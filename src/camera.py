@@ -1,43 +1,96 @@
 import numpy as np
 
+from src import utils
+
 
 class Camera:
 
+    RANGE = np.inf
+    FOV = 2.0 * np.pi
+
     @classmethod
     def observe(cls, landmark, current):
         """
         Parameters:
         ----------
-        landmark: tuple(x, y)
-            coordinate of landmark
-        current: np.array(x, y, theta)
-            current pose
+        landmark: tuple(x, y) or np.array.shape(N, 2)
+            coordinate of landmark (or stacked coordinates)
+        current: np.array(x, y, theta) or np.array.shape(N, 3)
+            current pose (or stacked poses)
 
         Returns:
         ----------
-        np.array(distance, angle)
+        np.array(distance, angle) or np.array.shape(N, 2)
             predict observation of landmark
         """
 
-        return np.array([np.linalg.norm(np.array(landmark) - current[:2]),
-                         np.arctan2(landmark[1] - current[1], landmark[0] - current[0]) - current[2]])
+        landmark = np.asarray(landmark, dtype=float)
+        current = np.asarray(current, dtype=float)
+
+        diff = landmark - current[..., :2]
+        return np.stack([np.linalg.norm(diff, axis=-1),
+                         np.arctan2(diff[..., 1], diff[..., 0]) - current[..., 2]], axis=-1)
 
     @classmethod
     def H(cls, landmark, current):
         """
         Parameters:
         ----------
-        landmark: tuple(x, y)
-            coordinate of landmark
-        current: np.array(x, y, theta)
-            current pose
+        landmark: tuple(x, y) or np.array.shape(N, 2)
+            coordinate of landmark (or stacked coordinates)
+        current: np.array(x, y, theta) or np.array.shape(N, 3)
+            current pose (or stacked poses)
 
         Returns:
         ----------
-        np.array.shape(2, 3)
+        np.array.shape(2, 3) or np.array.shape(N, 2, 3)
             jacobians of observe equation
         """
 
-        q = (landmark[0] - current[0]) ** 2 + (landmark[1] - current[1]) ** 2
-        return np.array([[(current[0] - landmark[0])/np.sqrt(q), (current[1] - landmark[1])/np.sqrt(q), 0.0],
-                         [(landmark[1] - current[1])/q, (current[0] - landmark[0])/q, -1.0]])
+        landmark = np.asarray(landmark, dtype=float)
+        current = np.asarray(current, dtype=float)
+
+        dx = landmark[..., 0] - current[..., 0]
+        dy = landmark[..., 1] - current[..., 1]
+        q = dx ** 2 + dy ** 2
+        sqrt_q = np.sqrt(q)
+
+        H = np.zeros(q.shape + (2, 3))
+        H[..., 0, 0] = -dx / sqrt_q
+        H[..., 0, 1] = -dy / sqrt_q
+        H[..., 1, 0] = dy / q
+        H[..., 1, 1] = -dx / q
+        H[..., 1, 2] = -1.0
+        return H
+
+    @classmethod
+    def visible(cls, landmarks, current, sensing_range, fov):
+        """
+        Parameters:
+        ----------
+        landmarks: np.array.shape(L, 2)
+            coordinates of landmarks
+        current: np.array(x, y, theta) or np.array.shape(N, 3)
+            current pose (or stacked poses)
+        sensing_range: float or np.array.shape(N)
+            max distance to observe (of each pose)
+        fov: float or np.array.shape(N)
+            field of view (radian) centered on the direction of the robot (of each pose)
+
+        Returns:
+        ----------
+        np.array.shape(L) or np.array.shape(N, L) of bool
+            whether each landmark can be observed from current pose (from each pose)
+        """
+
+        landmarks = np.asarray(landmarks, dtype=float).reshape(-1, 2)
+        current = np.asarray(current, dtype=float)
+        sensing_range = np.asarray(sensing_range, dtype=float)[..., np.newaxis]
+        fov = np.asarray(fov, dtype=float)[..., np.newaxis]
+
+        diff = landmarks - current[..., np.newaxis, :2]
+        visible = np.einsum('...ij,...ij->...i', diff, diff) <= sensing_range ** 2
+        if np.any(fov < 2.0 * np.pi):
+            bearing = utils.normalize_angle(np.arctan2(diff[..., 1], diff[..., 0]) - current[..., 2, np.newaxis])
+            visible &= (np.abs(bearing) <= fov / 2.0) | (fov >= 2.0 * np.pi)
+        return visible
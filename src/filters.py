@@ -1,17 +1,25 @@
+import bisect
+import heapq
+import itertools
 import time
 
 import numpy as np
 
+from src.agent import Agent
 from src.robot import Robot
 from src.camera import Camera
 from src.planner import DWAwoObstacle
+from src import utils
 
 
 class EKF:
     q = 0.01
     r = 0.02
+    Q_INTERVAL = 0.2
+    HISTORY = 50
 
-    def __init__(self, agent, initial):
+    def __init__(self, agent, initial, stacked_update=False, clock=time.time, planner=DWAwoObstacle, profiler=None,
+                 observation_interval=None):
         """
         Parameters:
         ----------
@@ -19,21 +27,51 @@ class EKF:
             agent of robot
         initial: np.array(x, y, theta)
             initial pose
+        stacked_update: bool
+            if True, all observed landmarks are fused by one stacked update (update_stacked)
+            instead of one update per landmark
+        clock: callable
+            function which returns the current time in seconds
+            (time.time by default, or src.timer.SimulatedClock.time to run faster than real time)
+        planner: object
+            local planner which has get_input(agent, current, destination, current_input, delta)
+            (DWAwoObstacle by default, or a src.planner.DWAwithObstacle)
+        profiler: src.profiler.Profiler
+            profiler which measures each stage of step (not measured when None)
+        observation_interval: float
+            if given, the observations of the agent are taken once in this seconds and fused
+            through the measurement queue (add_observations), instead of being fused at every tick
+            (np.inf to fuse only the observations given by add_observations)
 
         Notes:
         ----------
-        initialize xhat, P, Q, R and start_time
+        initialize xhat, P, Q, R and start_time.
+        Q is the process noise of Q_INTERVAL seconds (the nominal tick of src.timer.INTERVAL),
+        and a prediction adds it in proportion to its time delta, so the noise per second does not depend on the rate.
+        the last HISTORY entries (ticks and fused measurements) are kept with their states,
+        so an observation which arrives later than the ticks after it can still be fused at its own time
         """
 
         self.agent = agent
+        self.stacked_update = stacked_update
         self.xhat = np.array(initial)
         self.P = np.zeros((3, 3))
         self.Q = np.dot(EKF.q, np.identity(3))
         self.R = np.dot(EKF.r, np.identity(2))
         self.input = np.array((0, 0))
-        self.start_t = time.time()
+        self.clock = clock
+        self.planner = planner
+        self.profiler = profiler
+        self.start_t = self.clock()
         self.t = self.start_t
 
+        self.observation_interval = observation_interval
+        self.observed_t = self.start_t
+        self.queue = []
+        self.sequence = itertools.count()
+        self.history = [[self.t, self.input, None, self._state()]]
+        self.late = 0
+
     def predict(self, input, delta):
         """
         Parameters:
@@ -47,12 +85,16 @@ class EKF:
         ----------
         tuple(np.array(x, y, theta), np.array().size(3, 3))
             predicted pose and covariance
+
+        Notes:
+        ----------
+        Q is scaled by delta / Q_INTERVAL (see __init__).
+        the fused kernel Robot.propagate returns new arrays, because the results are kept by step
+        and may be sent or recorded after the next tick
         """
 
-        a_priori_x = Robot.move(self.xhat, input, delta)
-        F = Robot.F(self.xhat, input, delta)
-        a_priori_P = F.dot(self.P).dot(F.T) + self.Q
-        return a_priori_x, a_priori_P
+        ratio = delta / self.Q_INTERVAL
+        return Robot.propagate(self.xhat, self.P, input, delta, self.Q if ratio == 1.0 else ratio * self.Q)
 
     def update(self, a_priori_x, a_priori_P, landmark, observed):
         """
@@ -74,6 +116,7 @@ class EKF:
         """
 
         yhat = observed - Camera.observe(landmark, a_priori_x)
+        yhat[1] = utils.normalize_angle(yhat[1])
         H = Camera.H(landmark, a_priori_x)
         S = H.dot(a_priori_P).dot(H.T) + self.R
         K = a_priori_P.dot(H.T).dot(np.linalg.inv(S))
@@ -81,27 +124,697 @@ class EKF:
         P = (np.identity(3) - K.dot(H)).dot(a_priori_P)
         return xhat, P, K
 
+    def update_stacked(self, a_priori_x, a_priori_P, landmarks, observed_list):
+        """
+        Parameters:
+        ----------
+        a_priori_x: np.array(x, y, theta)
+            predicted pose
+        a_priori_P: np.array().size(3, 3)
+            predicted covariance
+        landmarks: list of tuple(x, y)
+            coordinates of observed landmarks
+        observed_list: list of np.array(distance, angle)
+            distance and angle of each observed landmark
+
+        Returns:
+        ----------
+        tuple(np.array(x, y, theta), np.array().size(3, 3), np.array().size(3, 2N))
+            updated pose, covariance and kalman gain
+
+        Notes:
+        ----------
+        stack N observations into one 2N measurement vector and one (2N, 3) jacobian, and fuse them at once.
+        the gain is solved from S K^T = H P instead of inverting S
+        (S and P are symmetric, so K = P H^T S^-1 = (S^-1 H P)^T)
+        """
+
+        landmarks = np.array(landmarks, dtype=float)
+        yhat = np.array(observed_list, dtype=float) - Camera.observe(landmarks, a_priori_x)
+        yhat[:, 1] = utils.normalize_angle(yhat[:, 1])
+        yhat = yhat.reshape(-1)
+        H = Camera.H(landmarks, a_priori_x).reshape(-1, 3)
+        S = H.dot(a_priori_P).dot(H.T) + np.kron(np.identity(len(landmarks)), self.R)
+        K = np.linalg.solve(S, H.dot(a_priori_P)).T
+        xhat = a_priori_x + K.dot(yhat)
+        P = (np.identity(3) - K.dot(H)).dot(a_priori_P)
+        return xhat, P, K
+
+    def add_observations(self, t, observations):
+        """
+        Parameters:
+        ----------
+        t: float
+            time when the observations were taken (by the clock of this filter)
+        observations: list of tuple(tuple(x, y), np.array(distance, angle))
+            observed landmarks and their distances and angles (like src.agent.Agent.get_observations)
+
+        Notes:
+        ----------
+        the observations are queued and fused by the first step whose time is t or later.
+        when t is earlier than the last tick, the state is rolled back to t, the observations are fused
+        and the later ticks are predicted again. observations older than the history are dropped and counted as late
+        """
+
+        heapq.heappush(self.queue, (t, next(self.sequence), observations))
+
     def step(self):
         """
         Returns:
         ----------
         tuple(np.array(x, y, theta), np.array(x, y, theta), np.array().size(3, 3), np.array().size(3, 2))
             ideal pose, estimated pose, covariance and kalman gain
+            (the kalman gain is np.array().size(3, 2N) when stacked_update is True)
 
         Notes:
         ----------
         estimate estimated pose of this time tick by using kalman filter
         """
 
-        t = time.time()
+        profiler = self.profiler
+        if profiler is not None:
+            profiler.start()
+
+        t = self.clock()
         delta = t - self.t
         ideal = self.agent.get_ideal(self.xhat, t - self.start_t)
-        input = DWAwoObstacle.get_input(self.agent, self.xhat, ideal, self.input, delta)
+        if profiler is not None:
+            profiler.lap('ideal')
+        input = self.planner.get_input(self.agent, self.xhat, ideal, self.input, delta)
+        if profiler is not None:
+            profiler.lap('plan')
         self.agent.move(self.xhat, input, delta)
+        if profiler is not None:
+            profiler.lap('move')
         xhat, P = self.predict(input, delta)
+        if profiler is not None:
+            profiler.lap('predict')
+        K = None
+        observations = None
+        if self.observation_interval is None:
+            observations = self.agent.get_observations()
+        elif t - self.observed_t >= self.observation_interval:
+            self.observed_t = t
+            self.add_observations(t, self.agent.get_observations())
+        if profiler is not None:
+            profiler.lap('observe')
+        if observations is not None:
+            xhat, P, K = self._correct(xhat, P, observations)
+
+        self.xhat = xhat
+        self.P = P
+        self.t = t
+        self.input = input
+        self.history.append([t, input, observations, self._state()])
+        if len(self.queue) > 0 and self.queue[0][0] <= t:
+            fused_K = self._fuse(t)
+            K = K if fused_K is None else fused_K
+            xhat, P = self.xhat, self.P
+        if len(self.history) > self.HISTORY:
+            del self.history[:-self.HISTORY]
+        if profiler is not None:
+            profiler.lap('update')
+            profiler.stop(delta)
+
+        return ideal, xhat, P, K
+
+    def _correct(self, xhat, P, observations):
+        """
+        Parameters:
+        ----------
+        xhat: np.array(x, y, theta)
+            predicted pose
+        P: np.array().size(3, 3)
+            predicted covariance
+        observations: list of tuple(tuple(x, y), np.array(distance, angle))
+            observed landmarks and their distances and angles
+
+        Returns:
+        ----------
+        tuple(np.array(x, y, theta), np.array().size(3, 3), np.array().size(3, 2))
+            updated pose, covariance and kalman gain (None when nothing is observed)
+        """
+
         K = None
-        for landmark, observed in self.agent.get_observations():
-            xhat, P, K = self.update(xhat, P, landmark, observed)
+        if self.stacked_update:
+            if len(observations) > 0:
+                xhat, P, K = self.update_stacked(xhat, P, [o[0] for o in observations], [o[1] for o in observations])
+        else:
+            for landmark, observed in observations:
+                xhat, P, K = self.update(xhat, P, landmark, observed)
+        return xhat, P, K
+
+    def _fuse(self, t):
+        """
+        Parameters:
+        ----------
+        t: float
+            time of the last tick
+
+        Returns:
+        ----------
+        np.array().size(3, 2)
+            kalman gain of the last update (None when nothing is fused)
+
+        Notes:
+        ----------
+        insert the queued observations until t into the history at their own times,
+        and then predict and update again from the state just before the earliest of them.
+        an inserted entry predicts with the input of the tick which contains it.
+        the process noise is added in proportion to the time of each prediction, so a split tick adds the same noise in total
+        """
+
+        history = self.history
+        first = len(history)
+        while len(self.queue) > 0 and self.queue[0][0] <= t:
+            measured_t, _, observations = heapq.heappop(self.queue)
+            if measured_t <= history[0][0]:
+                self.late += 1
+                continue
+            # [measured_t] sorts before any entry of the same time, so the entries are never compared beyond the time
+            i = bisect.bisect_left(history, [measured_t])
+            history.insert(i, [measured_t, history[i][1], observations, None])
+            first = min(first, i)
+
+        K = None
+        if first == len(history):
+            return K
+
+        self._restore(history[first - 1][3])
+        previous_t = history[first - 1][0]
+        for entry in history[first:]:
+            entry_t, input, observations, _ = entry
+            xhat, P = self.predict(input, entry_t - previous_t)
+            if observations is not None:
+                xhat, P, K = self._correct(xhat, P, observations)
+            self.xhat = xhat
+            self.P = P
+            entry[3] = self._state()
+            previous_t = entry_t
+        return K
+
+    def _state(self):
+        """
+        Returns:
+        ----------
+        tuple
+            state of the filter to keep in the history
+            (the arrays are not copied because predict and update always return new arrays)
+        """
+
+        return self.xhat, self.P
+
+    def _restore(self, state):
+        """
+        Parameters:
+        ----------
+        state: tuple
+            state returned by _state
+        """
+
+        self.xhat, self.P = state
+
+
+class UKF(EKF):
+    alpha = 1.0
+    beta = 2.0
+    kappa = 0.0
+
+    def __init__(self, agent, initial, **kwargs):
+        """
+        Parameters:
+        ----------
+        agent: src.agent.Agent
+            agent of robot
+        initial: np.array(x, y, theta)
+            initial pose
+        kwargs:
+            same as EKF (stacked_update, clock, planner, profiler and observation_interval)
+
+        Notes:
+        ----------
+        unscented kalman filter which has the same interface as EKF.
+        instead of linearizing by Robot.F and Camera.H, the 2n+1 sigma points of the pose are propagated through
+        Robot.move and Camera.observe at once as a (2n+1, ...) array
+        """
+
+        super().__init__(agent, initial, **kwargs)
+
+        n = len(self.xhat)
+        self.lamb = UKF.alpha ** 2 * (n + UKF.kappa) - n
+        self.Wm = np.full(2 * n + 1, 1.0 / (2.0 * (n + self.lamb)))
+        self.Wm[0] = self.lamb / (n + self.lamb)
+        self.Wc = self.Wm.copy()
+        self.Wc[0] += 1.0 - UKF.alpha ** 2 + UKF.beta
+
+    def predict(self, input, delta):
+        """
+        Parameters:
+        ----------
+        input: np.array(v, omega)
+            input vector of linear velocity and angular velocity
+        delta: float
+            time delta (Q is scaled by delta / Q_INTERVAL like EKF.predict)
+
+        Returns:
+        ----------
+        tuple(np.array(x, y, theta), np.array().size(3, 3))
+            predicted pose and covariance
+        """
+
+        points = Robot.move(self._sigma_points(self.xhat, self.P), input, delta)
+        a_priori_x = self._mean(points, 2)
+        diff = self._diff(points, a_priori_x, 2)
+        a_priori_P = (self.Wc * diff.T).dot(diff) + delta / self.Q_INTERVAL * self.Q
+        return a_priori_x, a_priori_P
+
+    def update(self, a_priori_x, a_priori_P, landmark, observed):
+        """
+        Parameters:
+        ----------
+        a_priori_x: np.array(x, y, theta)
+            predicted pose
+        a_priori_P: np.array().size(3, 3)
+            predicted covariance
+        landmark: tuple(x, y)
+            coordinate of observed landmark
+        observed: np.array(distance, angle)
+            distance and angle of observed landmark
+
+        Returns:
+        ----------
+        tuple(np.array(x, y, theta), np.array().size(3, 3), np.array().size(3, 2))
+            updated pose, covariance and kalman gain
+        """
+
+        return self.update_stacked(a_priori_x, a_priori_P, [landmark], [observed])
+
+    def update_stacked(self, a_priori_x, a_priori_P, landmarks, observed_list):
+        """
+        Parameters:
+        ----------
+        a_priori_x: np.array(x, y, theta)
+            predicted pose
+        a_priori_P: np.array().size(3, 3)
+            predicted covariance
+        landmarks: list of tuple(x, y)
+            coordinates of observed landmarks
+        observed_list: list of np.array(distance, angle)
+            distance and angle of each observed landmark
+
+        Returns:
+        ----------
+        tuple(np.array(x, y, theta), np.array().size(3, 3), np.array().size(3, 2N))
+            updated pose, covariance and kalman gain
+
+        Notes:
+        ----------
+        every sigma point observes every landmark by one call of Camera.observe ((2n+1, N, 2) observations)
+        """
+
+        landmarks = np.array(landmarks, dtype=float)
+        points = self._sigma_points(a_priori_x, a_priori_P)
+        observations = Camera.observe(landmarks, points[:, np.newaxis, :])
+        z = self._mean(observations, 1)
+
+        diff_x = self._diff(points, a_priori_x, 2)
+        diff_z = self._diff(observations, z, 1).reshape(len(points), -1)
+        S = (self.Wc * diff_z.T).dot(diff_z) + np.kron(np.identity(len(landmarks)), self.R)
+        C = (self.Wc * diff_x.T).dot(diff_z)
+        K = np.linalg.solve(S, C.T).T
+
+        yhat = np.array(observed_list, dtype=float) - z
+        yhat[:, 1] = utils.normalize_angle(yhat[:, 1])
+        xhat = a_priori_x + K.dot(yhat.reshape(-1))
+        P = a_priori_P - K.dot(S).dot(K.T)
+        return xhat, P, K
+
+    def _sigma_points(self, x, P):
+        """
+        Parameters:
+        ----------
+        x: np.array(x, y, theta)
+            mean pose
+        P: np.array().size(3, 3)
+            covariance
+
+        Returns:
+        ----------
+        np.array().size(7, 3)
+            x, and x +/- each column of the square root of (n + lambda) P
+        """
+
+        A = (len(x) + self.lamb) * P
+        try:
+            L = np.linalg.cholesky(A)
+        except np.linalg.LinAlgError:
+            w, v = np.linalg.eigh((A + A.T) / 2.0)
+            L = v * np.sqrt(np.maximum(w, 0.0))
+        return np.concatenate([x[np.newaxis, :], x + L.T, x - L.T])
+
+    def _mean(self, points, angle):
+        """
+        Parameters:
+        ----------
+        points: np.array().size(2n+1, ..., M)
+            propagated sigma points
+        angle: int
+            index of the angle element (the circular mean is used for it)
+
+        Returns:
+        ----------
+        np.array().size(..., M)
+            weighted mean of the sigma points
+        """
+
+        mean = np.tensordot(self.Wm, points, axes=1)
+        mean[..., angle] = np.arctan2(np.tensordot(self.Wm, np.sin(points[..., angle]), axes=1),
+                                      np.tensordot(self.Wm, np.cos(points[..., angle]), axes=1))
+        return mean
+
+    def _diff(self, points, mean, angle):
+        """
+        Parameters:
+        ----------
+        points: np.array().size(2n+1, ..., M)
+            propagated sigma points
+        mean: np.array().size(..., M)
+            weighted mean of the sigma points
+        angle: int
+            index of the angle element (the difference is normalized between -pi and +pi)
+
+        Returns:
+        ----------
+        np.array().size(2n+1, ..., M)
+            difference of each sigma point from the mean
+        """
+
+        diff = points - mean
+        diff[..., angle] = utils.normalize_angle(diff[..., angle])
+        return diff
+
+
+class ParticleFilter(EKF):
+    xy_sd = 0.01
+    theta_sd = 0.02
+    distance_sd = 0.04
+    angle_sd = 0.04
+    random_ratio = 0.01
+    resample_threshold = 0.5
+
+    PARTICLES = 1000
+    MARGIN = 0.5
+
+    def __init__(self, agent, initial, particles=PARTICLES, seed=None, **kwargs):
+        """
+        Parameters:
+        ----------
+        agent: src.agent.Agent
+            agent of robot
+        initial: np.array(x, y, theta)
+            initial pose
+        particles: int
+            number of particles
+        seed: int or np.random.SeedSequence
+            seed of the random numbers of this filter
+        kwargs:
+            same as EKF (clock, planner, profiler and observation_interval, all observations are always fused at once)
+
+        Notes:
+        ----------
+        particle filter which has the same interface as EKF. the particles are a (M, 3) array which is moved
+        by one call of Robot.move and weighted by the likelihood of all observations of all particles at once.
+        after resampling, random_ratio of the particles are drawn uniformly around the landmarks,
+        so the filter can recover when the robot is kidnapped
+        """
+
+        self.rng = np.random.default_rng(seed)
+        self.particles = np.tile(np.array(initial, dtype=float), (particles, 1))
+        self.weights = np.full(particles, 1.0 / particles)
+        landmarks = np.array(agent.landmarks, dtype=float).reshape(-1, 2)
+        self.bounds = (landmarks.min(axis=0) - ParticleFilter.MARGIN, landmarks.max(axis=0) + ParticleFilter.MARGIN)
+
+        super().__init__(agent, initial, **dict(kwargs, stacked_update=True))
+
+    def predict(self, input, delta):
+        """
+        Parameters:
+        ----------
+        input: np.array(v, omega)
+            input vector of linear velocity and angular velocity
+        delta: float
+            time delta (the standard deviations of the motion noise are given for Q_INTERVAL seconds
+            and scaled by the square root of delta / Q_INTERVAL, so the variance grows in proportion to the time)
+
+        Returns:
+        ----------
+        tuple(np.array(x, y, theta), np.array().size(3, 3))
+            mean and covariance of the moved particles
+        """
+
+        noise = self.rng.standard_normal(self.particles.shape) * \
+            np.array([ParticleFilter.xy_sd, ParticleFilter.xy_sd, ParticleFilter.theta_sd]) * np.sqrt(delta / self.Q_INTERVAL)
+        self.particles = Robot.move(self.particles, input, delta) + noise
+        self.particles[:, 2] = utils.normalize_angle(self.particles[:, 2])
+        return self._estimate()
+
+    def update(self, a_priori_x, a_priori_P, landmark, observed):
+        """
+        Parameters:
+        ----------
+        a_priori_x: np.array(x, y, theta)
+            predicted pose (not used, the particles are updated)
+        a_priori_P: np.array().size(3, 3)
+            predicted covariance (not used)
+        landmark: tuple(x, y)
+            coordinate of observed landmark
+        observed: np.array(distance, angle)
+            distance and angle of observed landmark
+
+        Returns:
+        ----------
+        tuple(np.array(x, y, theta), np.array().size(3, 3), None)
+            mean and covariance of the updated particles (there is no kalman gain)
+        """
+
+        return self.update_stacked(a_priori_x, a_priori_P, [landmark], [observed])
+
+    def update_stacked(self, a_priori_x, a_priori_P, landmarks, observed_list):
+        """
+        Parameters:
+        ----------
+        a_priori_x: np.array(x, y, theta)
+            predicted pose (not used, the particles are updated)
+        a_priori_P: np.array().size(3, 3)
+            predicted covariance (not used)
+        landmarks: list of tuple(x, y)
+            coordinates of observed landmarks
+        observed_list: list of np.array(distance, angle)
+            distance and angle of each observed landmark
+
+        Returns:
+        ----------
+        tuple(np.array(x, y, theta), np.array().size(3, 3), None)
+            mean and covariance of the updated particles (there is no kalman gain)
+
+        Notes:
+        ----------
+        the log likelihood of all observations is calculated as a (M, N) array at once,
+        and the particles are resampled when the effective number of particles is less than resample_threshold
+        """
+
+        diff = np.array(observed_list, dtype=float) - Camera.observe(np.array(landmarks, dtype=float),
+                                                                     self.particles[:, np.newaxis, :])
+        diff[..., 1] = utils.normalize_angle(diff[..., 1])
+        log_likelihood = -0.5 * np.sum((diff[..., 0] / ParticleFilter.distance_sd) ** 2 +
+                                       (diff[..., 1] / ParticleFilter.angle_sd) ** 2, axis=1)
+
+        log_weights = np.log(np.maximum(self.weights, np.finfo(float).tiny)) + log_likelihood
+        weights = np.exp(log_weights - log_weights.max())
+        self.weights = weights / weights.sum()
+        xhat, P = self._estimate()
+
+        if 1.0 / np.sum(self.weights ** 2) < ParticleFilter.resample_threshold * len(self.weights):
+            self._resample()
+        return xhat, P, None
+
+    def _estimate(self):
+        """
+        Returns:
+        ----------
+        tuple(np.array(x, y, theta), np.array().size(3, 3))
+            weighted mean (the circular mean for theta) and covariance of the particles
+        """
+
+        xhat = self.weights.dot(self.particles)
+        xhat[2] = np.arctan2(self.weights.dot(np.sin(self.particles[:, 2])), self.weights.dot(np.cos(self.particles[:, 2])))
+        diff = self.particles - xhat
+        diff[:, 2] = utils.normalize_angle(diff[:, 2])
+        return xhat, (self.weights * diff.T).dot(diff)
+
+    def _state(self):
+        """
+        Returns:
+        ----------
+        tuple
+            estimated pose, covariance, particles and weights
+            (the arrays are not copied because predict, update and _resample always make new arrays)
+        """
+
+        return self.xhat, self.P, self.particles, self.weights
+
+    def _restore(self, state):
+        """
+        Parameters:
+        ----------
+        state: tuple
+            state returned by _state
+        """
+
+        self.xhat, self.P, self.particles, self.weights = state
+
+    def _resample(self):
+        """
+        Notes:
+        ----------
+        systematic resampling in O(M). the i-th particle is copied as many times as the number of the points
+        (u + j) / M (j = 0, 1, ..., M - 1) in its interval of the cumulative weights,
+        and then random_ratio of the particles are replaced by uniformly random poses
+        """
+
+        m = len(self.weights)
+        cumulative = np.cumsum(self.weights)
+        cumulative[-1] = 1.0
+        ends = np.clip(np.ceil(cumulative * m - self.rng.random()), 0, m).astype(int)
+        self.particles = np.repeat(self.particles, np.diff(ends, prepend=0), axis=0)
+        self.weights = np.full(m, 1.0 / m)
+
+        n = int(m * ParticleFilter.random_ratio)
+        if n > 0:
+            index = self.rng.choice(m, n, replace=False)
+            self.particles[index, :2] = self.rng.uniform(self.bounds[0], self.bounds[1], (n, 2))
+            self.particles[index, 2] = self.rng.uniform(-np.pi, np.pi, n)
+
+
+class FleetEKF:
+    q = EKF.q
+    r = EKF.r
+    Q_INTERVAL = EKF.Q_INTERVAL
+
+    def __init__(self, agents, initials, clock=time.time, planner=DWAwoObstacle):
+        """
+        Parameters:
+        ----------
+        agents: list of src.agent.Agent
+            agents of robots (which share the same landmarks)
+        initials: list of np.array(x, y, theta)
+            initial poses of robots
+        clock: callable
+            function which returns the current time in seconds
+        planner: src.planner.DWAwoObstacle
+            planner class (or instance, like src.planner.DWAwithObstacle) whose get_inputs calculates the inputs
+
+        Notes:
+        ----------
+        initialize stacked xhat (N, 3), P (N, 3, 3), Q, R and start_time
+        """
+
+        if any(not np.array_equal(agent.landmark_index.points, agents[0].landmark_index.points) for agent in agents):
+            raise ValueError('all agents of a fleet must share the same landmarks')
+
+        self.agents = agents
+        self.planner = planner
+        self.xhat = np.array(initials, dtype=float).reshape(len(agents), 3)
+        self.P = np.zeros((len(agents), 3, 3))
+        self.Q = np.dot(FleetEKF.q, np.identity(3))
+        self.R = np.dot(FleetEKF.r, np.identity(2))
+        self.input = np.zeros((len(agents), 2))
+        self.clock = clock
+        self.start_t = self.clock()
+        self.t = self.start_t
+
+    def predict(self, input, delta):
+        """
+        Parameters:
+        ----------
+        input: np.array().size(N, 2)
+            input vectors of linear velocity and angular velocity
+        delta: float
+            time delta (Q is scaled by delta / Q_INTERVAL like EKF.predict)
+
+        Returns:
+        ----------
+        tuple(np.array().size(N, 3), np.array().size(N, 3, 3))
+            predicted poses and covariances
+        """
+
+        ratio = delta / self.Q_INTERVAL
+        a_priori_x = Robot.move(self.xhat, input, delta)
+        F = Robot.F(self.xhat, input, delta)
+        a_priori_P = F @ self.P @ F.transpose(0, 2, 1) + (self.Q if ratio == 1.0 else ratio * self.Q)
+        return a_priori_x, a_priori_P
+
+    def update(self, a_priori_x, a_priori_P, landmark, observed):
+        """
+        Parameters:
+        ----------
+        a_priori_x: np.array().size(N, 3)
+            predicted poses
+        a_priori_P: np.array().size(N, 3, 3)
+            predicted covariances
+        landmark: np.array().size(N, 2)
+            coordinates of the landmark observed by each robot
+        observed: np.array().size(N, 2)
+            distance and angle of the landmark observed by each robot
+
+        Returns:
+        ----------
+        tuple(np.array().size(N, 3), np.array().size(N, 3, 3), np.array().size(N, 3, 2))
+            updated poses, covariances and kalman gains
+        """
+
+        yhat = observed - Camera.observe(landmark, a_priori_x)
+        yhat[:, 1] = utils.normalize_angle(yhat[:, 1])
+        H = Camera.H(landmark, a_priori_x)
+        Ht = H.transpose(0, 2, 1)
+        S = H @ a_priori_P @ Ht + self.R
+        K = a_priori_P @ Ht @ np.linalg.inv(S)
+        xhat = a_priori_x + np.einsum('nij,nj->ni', K, yhat)
+        P = (np.identity(3) - K @ H) @ a_priori_P
+        return xhat, P, K
+
+    def step(self):
+        """
+        Returns:
+        ----------
+        tuple(np.array().size(N, 3), np.array().size(N, 3), np.array().size(N, 3, 3), list of np.array().size(3, 2))
+            ideal poses, estimated poses, covariances and kalman gains
+            (the gain of a robot is None when it observes no landmark, like EKF.step)
+
+        Notes:
+        ----------
+        estimate estimated poses of all robots of this time tick by using kalman filter.
+        the ideal poses, the noisy motion, the observations, planning, prediction and update are calculated
+        for all robots at once. the i-th observation of every robot is fused in the same batch,
+        and robots which have less observations than i are left as they are.
+        """
+
+        t = self.clock()
+        delta = t - self.t
+        ideal = Agent.get_ideal_fleet(self.agents, self.xhat, t - self.start_t)
+        input = self.planner.get_inputs(self.agents, self.xhat, ideal, self.input, delta)
+        Agent.move_fleet(self.agents, self.xhat, input, delta)
+        xhat, P = self.predict(input, delta)
+        K = np.zeros((len(self.agents), 3, 2))
+
+        landmarks, visible, observed = Agent.get_observations_fleet(self.agents)
+        order = np.cumsum(visible, axis=1) - 1
+        counts = visible.sum(axis=1)
+        for i in range(counts.max(initial=0)):
+            index, landmark = np.nonzero(visible & (order == i))
+            xhat[index], P[index], K[index] = self.update(xhat[index], P[index], landmarks[landmark],
+                                                          observed[index, landmark])
+        K = [gain if count > 0 else None for gain, count in zip(K, counts)]
 
         self.xhat = xhat
         self.P = P
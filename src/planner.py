@@ -1,10 +1,13 @@
-import itertools
+import functools
 
 import numpy as np
 
 from src.robot import Robot
 from src import utils
 
+EXHAUSTIVE = 'exhaustive'
+COARSE_TO_FINE = 'coarse_to_fine'
+
 
 class DWAwoObstacle:
 
@@ -22,6 +25,17 @@ class DWAwoObstacle:
 
     DISTANCE_THRESHOLD = 0.1
 
+    HORIZON = 1
+    PRIMITIVE_CACHE_SIZE = 8
+    PRIMITIVE_DELTA_RESOLUTION = 0.01
+
+    SEARCH = EXHAUSTIVE
+    CANDIDATE_BUDGET = 600
+    COARSE_GRID = 9
+    REFINE_CELLS = 2
+
+    _primitives = {}
+
     @classmethod
     def get_input(cls, agent, current, destination, current_input, delta):
         """
@@ -49,45 +63,489 @@ class DWAwoObstacle:
         angular_velocities = agent.get_angular_velocities(current)
 
         v_range, omega_range = cls._get_window(max_accelarations, linear_velocities, angular_velocities, current_input, delta)
+        if cls.SEARCH == COARSE_TO_FINE:
+            return cls._search_coarse_to_fine(current, destination, v_range, omega_range, delta)
+
+        input_list = cls._get_candidates(v_range, omega_range)
+        next_list = cls._predict(current, input_list, delta)
 
-        input_list = np.array([[]]).reshape(0, 2)
-        heading_list = np.array([])
-        velocity_list = np.array([])
-        distance_list = np.array([])
-        theta_list = np.array([])
-
-        for v, omega in itertools.product(v_range, omega_range):
-            input = np.array((v, omega))
-            next = Robot.move(current, input, delta)
-            input_list = np.append(input_list, [input], axis=0)
-            heading_list = np.append(heading_list, cls._eval_heading(next, destination))
-            velocity_list = np.append(velocity_list, cls._eval_velocity(input))
-            distance_list = np.append(distance_list, cls._eval_distance(next, destination))
-            theta_list = np.append(theta_list, cls._eval_theta(next, destination))
-
-        def _eval(a):
-            if np.linalg.norm(current[:2] - destination[:2]) < DWAwoObstacle.DISTANCE_THRESHOLD:
-                error_angle_gain = DWAwoObstacle.NEAR_ERROR_ANGLE_GAIN
-                velocity_gain = DWAwoObstacle.NEAR_VELOCITY_GAIN
-                distance_gain = DWAwoObstacle.NEAR_DISTANCE_GAIN
-                theta_gain = DWAwoObstacle.NEAR_THETA_GAIN
-            else:
-                error_angle_gain = DWAwoObstacle.FAR_ERROR_ANGLE_GAIN
-                velocity_gain = DWAwoObstacle.FAR_VELOCITY_GAIN
-                distance_gain = DWAwoObstacle.FAR_DISTANCE_GAIN
-                theta_gain = DWAwoObstacle.FAR_THETA_GAIN
-
-            return error_angle_gain * a[0] + velocity_gain * a[1] + distance_gain * a[2] + theta_gain * a[3]
-
-        candidate_list = np.apply_along_axis(_eval, 0, np.array([
-            utils.normalize_min_max(heading_list),
-            utils.normalize_min_max(velocity_list),
-            utils.normalize_min_max(distance_list),
-            utils.normalize_min_max(theta_list),
-        ]))
+        candidate_list = cls._eval(current, destination, input_list, next_list)
 
         return input_list[np.argmin(candidate_list)]
 
+    @classmethod
+    def get_inputs(cls, agents, currents, destinations, current_inputs, delta):
+        """
+        Parameters:
+        ----------
+        agents: list of src.agent.Agent
+            agents of robots
+        currents: np.array.shape(N, 3)
+            current poses
+        destinations: np.array.shape(N, 3)
+            destination poses
+        current_inputs: np.array.shape(N, 2)
+            current input vectors
+        delta: float
+            time delta of this tick
+
+        Returns:
+        ----------
+        np.array.shape(N, 2)
+            next input vectors of linear velocity and angular velocity
+
+        Notes:
+        ----------
+        the candidates of all robots are concatenated and evaluated at once.
+        the costs are normalized in each robot's own window, so the selected inputs are identical to
+        calling get_input for each robot. when SEARCH is COARSE_TO_FINE, get_input is called for each robot
+        """
+
+        currents = np.asarray(currents, dtype=float)
+        destinations = np.asarray(destinations, dtype=float)
+
+        if cls.SEARCH == COARSE_TO_FINE:
+            return np.array([cls.get_input(agent, current, destination, current_input, delta)
+                             for agent, current, destination, current_input
+                             in zip(agents, currents, destinations, current_inputs)])
+
+        input_list, candidate_list, counts = cls._eval_many(agents, currents, destinations, current_inputs, delta)
+        return cls._select_many(candidate_list, input_list, counts)
+
+    @classmethod
+    def _get_candidates(cls, v_range, omega_range):
+        """
+        Parameters:
+        ----------
+        v_range: np.array([v0, v1, ...])
+            list of possible linear velocities
+        omega_range: np.array([omega0, omega1, ...])
+            list of possible angular velocities
+
+        Returns:
+        ----------
+        np.array.shape(len(v_range) * len(omega_range), 2)
+            all combinations of (v, omega) in the same order as itertools.product(v_range, omega_range)
+        """
+
+        vs, omegas = np.meshgrid(v_range, omega_range, indexing='ij')
+        return np.stack([vs.ravel(), omegas.ravel()], axis=-1)
+
+    @classmethod
+    def _get_candidates_many(cls, v_values, v_counts, omega_values, omega_counts):
+        """
+        Parameters:
+        ----------
+        v_values: np.array.shape(SV)
+            possible linear velocities of all robots (concatenated)
+        v_counts: np.array.shape(N)
+            number of possible linear velocities of each robot
+        omega_values: np.array.shape(SO)
+            possible angular velocities of all robots (concatenated)
+        omega_counts: np.array.shape(N)
+            number of possible angular velocities of each robot
+
+        Returns:
+        ----------
+        tuple(np.array.shape(M, 2), np.array.shape(M))
+            the candidates of all robots (concatenated in the order of robots, each of them is the same as
+            _get_candidates of the robot) and the index of the angular velocity of each candidate in omega_values
+        """
+
+        row_counts = np.repeat(omega_counts, v_counts)
+        row_offsets = np.repeat(np.cumsum(omega_counts) - omega_counts, v_counts) - (np.cumsum(row_counts) - row_counts)
+        columns = np.arange(row_counts.sum()) + np.repeat(row_offsets, row_counts)
+        return np.stack([np.repeat(v_values, row_counts), omega_values[columns]], axis=-1), columns
+
+    @classmethod
+    def _arange_many(cls, starts, stops, step):
+        """
+        Parameters:
+        ----------
+        starts: np.array.shape(N)
+            first value of each range
+        stops: np.array.shape(N)
+            last value of each range
+        step: float
+            step of the ranges
+
+        Returns:
+        ----------
+        tuple(np.array.shape(M), np.array.shape(N))
+            the ranges concatenated and the length of each range.
+            each range is identical to np.append(np.arange(start, stop, step), stop)
+            (numpy fills an arange by start + i * ((start + step) - start))
+        """
+
+        lengths = np.maximum(np.ceil((stops - starts) / step), 0).astype(int)
+        counts = lengths + 1
+        offsets = np.repeat(np.cumsum(counts) - counts, counts)
+        i = np.arange(counts.sum()) - offsets
+
+        start = np.repeat(starts, counts)
+        values = start + i * (np.repeat(starts + step, counts) - start)
+        values[i == 1] = (start + step)[i == 1]
+        last = i == np.repeat(lengths, counts)
+        values[last] = np.repeat(stops, counts)[last]
+        return values, counts
+
+    @classmethod
+    def _search_coarse_to_fine(cls, current, destination, v_range, omega_range, delta, penalty=None, penalty_gain=0.0):
+        """
+        Parameters:
+        ----------
+        current: np.array(x, y, theta)
+            current pose
+        destination: np.array(x, y, theta)
+            destination pose
+        v_range: np.array([v0, v1, ...])
+            list of possible linear velocities
+        omega_range: np.array([omega0, omega1, ...])
+            list of possible angular velocities
+        delta: float
+            time delta of this tick
+        penalty: callable
+            function which returns tuple(np.array.shape(N), np.array.shape(N) of bool) of the candidate inputs,
+            the cost which is added to the other costs and whether each candidate is safe (not used when None)
+        penalty_gain: float
+            gain of the normalized cost of penalty
+
+        Returns:
+        ----------
+        np.array(v, omega)
+            next input vector of linear velocity and angular velocity
+
+        Notes:
+        ----------
+        search the grid of get_input without evaluating all of it. a COARSE_GRID x COARSE_GRID subgrid which spans
+        the whole window is evaluated first, and then the neighborhoods of the REFINE_CELLS best candidates
+        are evaluated at a finer stride, until the stride is 1 or CANDIDATE_BUDGET candidates are evaluated.
+        the costs are normalized by the minimum and maximum of the coarse subgrid at every level,
+        so the candidates of different levels are comparable.
+        the unsafe candidates of penalty are never selected, and while no evaluated candidate is safe,
+        the candidates of the smallest penalty cost are refined and selected instead.
+        a candidate is evaluated at most once (the refined cells which are already evaluated are skipped),
+        and COARSE_GRID must be 5 or more so that the stride shrinks at every level
+        """
+
+        if cls.COARSE_GRID < 5:
+            raise ValueError(f'COARSE_GRID must be 5 or more: {cls.COARSE_GRID}')
+
+        sizes = np.array([len(v_range), len(omega_range)])
+        strides = np.maximum(1, -(-(sizes - 1) // (cls.COARSE_GRID - 1)))
+        gains = cls._get_gains(current, destination)
+
+        def _evaluate(indices):
+            input_list = np.stack([v_range[indices[:, 0]], omega_range[indices[:, 1]]], axis=-1)
+            next_list = cls._predict(current, input_list, delta)
+            costs = [cls._eval_heading(next_list, destination), cls._eval_velocity(input_list),
+                     cls._eval_distance(next_list, destination), cls._eval_theta(next_list, destination)]
+            if penalty is None:
+                return np.stack(costs, axis=-1), np.ones(len(indices), dtype=bool)
+            cost, safe = penalty(input_list)
+            return np.stack(costs + [cost], axis=-1), safe
+
+        axes = [np.unique(np.append(np.arange(0, size, stride), size - 1)) for size, stride in zip(sizes, strides)]
+        indices = cls._get_candidates(*axes).astype(int)
+        costs, safe = _evaluate(indices)
+        minimum = costs.min(axis=0)
+        range = costs.max(axis=0) - minimum
+
+        def _score(costs, safe):
+            normalized = np.where(range == 0, 1.0, (costs - minimum) / np.where(range == 0, 1.0, range))
+            score = gains[0] * normalized[:, 0] + gains[1] * normalized[:, 1] + \
+                gains[2] * normalized[:, 2] + gains[3] * normalized[:, 3]
+            if penalty is not None:
+                score = score + penalty_gain * normalized[:, 4]
+            return np.where(safe, score, np.inf)
+
+        def _rank():
+            return scores if safes.any() else penalties
+
+        scores, safes, penalties = _score(costs, safe), safe, costs[:, -1]
+        while np.any(strides > 1):
+            next_strides = np.maximum(1, -(-2 * strides // (cls.COARSE_GRID - 1)))
+            offsets = cls._get_candidates(*[np.arange(-stride, stride + 1, next_stride)
+                                            for stride, next_stride in zip(strides, next_strides)]).astype(int)
+            best = indices[np.argsort(_rank(), kind='stable')[:cls.REFINE_CELLS]]
+            refined = (best[:, np.newaxis, :] + offsets).reshape(-1, 2).clip(0, sizes - 1)
+            refined = np.setdiff1d(refined[:, 0] * sizes[1] + refined[:, 1], indices[:, 0] * sizes[1] + indices[:, 1])
+            refined = np.stack(np.divmod(refined, sizes[1]), axis=-1)
+            if len(indices) + len(refined) > cls.CANDIDATE_BUDGET:
+                break
+
+            costs, safe = _evaluate(refined)
+            indices = np.concatenate([indices, refined])
+            scores = np.concatenate([scores, _score(costs, safe)])
+            safes = np.concatenate([safes, safe])
+            penalties = np.concatenate([penalties, costs[:, -1]])
+            strides = next_strides
+
+        best = indices[np.argmin(_rank())]
+        return np.array((v_range[best[0]], omega_range[best[1]]))
+
+    @classmethod
+    def _predict(cls, current, input_list, delta):
+        """
+        Parameters:
+        ----------
+        current: np.array(x, y, theta) or np.array.shape(N, 3)
+            current pose (or the current pose of each candidate)
+        input_list: np.array.shape(N, 2)
+            candidate inputs
+        delta: float
+            time delta of this tick
+
+        Returns:
+        ----------
+        np.array.shape(N, 3)
+            candidate poses after HORIZON ticks of keeping each input
+
+        Notes:
+        ----------
+        when HORIZON is 1, this is Robot.move. otherwise the rollouts are not integrated tick by tick:
+        the end pose of a rollout from the origin is looked up from the arc primitives of omega
+        (its position is scaled by v because the motion model is linear in v),
+        and it is rotated and translated to the current pose. the primitives are built with delta rounded
+        to PRIMITIVE_DELTA_RESOLUTION (see _get_primitives)
+        """
+
+        if cls.HORIZON == 1:
+            return Robot.move(current, input_list, delta)
+
+        index = np.rint(input_list[:, 1] / cls.OMEGA_RESOLUTION).astype(int)
+        first, primitives = cls._get_primitives(delta, index.min(), index.max())
+        primitive = primitives[index - first]
+
+        local_x = input_list[:, 0] * primitive[:, 0]
+        local_y = input_list[:, 0] * primitive[:, 1]
+        cos = np.cos(current[..., 2])
+        sin = np.sin(current[..., 2])
+
+        return np.stack([current[..., 0] + cos * local_x - sin * local_y,
+                         current[..., 1] + sin * local_x + cos * local_y,
+                         utils.normalize_angle(current[..., 2] + primitive[:, 2])], axis=-1)
+
+    @classmethod
+    def _predict_many(cls, currents, input_list, omega_values, omega_counts, columns, counts, delta):
+        """
+        Parameters:
+        ----------
+        currents: np.array.shape(N, 3)
+            current poses
+        input_list: np.array.shape(M, 2)
+            candidate inputs of all robots
+        omega_values: np.array.shape(SO)
+            possible angular velocities of all robots (concatenated)
+        omega_counts: np.array.shape(N)
+            number of possible angular velocities of each robot
+        columns: np.array.shape(M)
+            index of the angular velocity of each candidate in omega_values
+        counts: np.array.shape(N)
+            number of candidates of each robot
+        delta: float
+            time delta of this tick
+
+        Returns:
+        ----------
+        np.array.shape(M, 3)
+            same as _predict with the current pose of each candidate
+
+        Notes:
+        ----------
+        when HORIZON is 1, the direction and theta of Robot.move only depend on the robot and omega,
+        so they are calculated once for each angular velocity of each robot (by the same arithmetic as Robot.move)
+        and only the terms multiplied by v are calculated for each candidate
+        """
+
+        if cls.HORIZON != 1:
+            return cls._predict(np.repeat(currents, counts, axis=0), input_list, delta)
+
+        column_currents = np.repeat(currents, omega_counts, axis=0)
+        angle = column_currents[:, 2] + omega_values * delta / 2.0
+        theta = utils.normalize_angle(column_currents[:, 2] + delta * omega_values)
+
+        v = input_list[:, 0]
+        return np.stack([np.repeat(currents[:, 0], counts) + (np.cos(angle) * delta)[columns] * v,
+                         np.repeat(currents[:, 1], counts) + (np.sin(angle) * delta)[columns] * v,
+                         theta[columns]], axis=-1)
+
+    @classmethod
+    def _get_primitives(cls, delta, first, last):
+        """
+        Parameters:
+        ----------
+        delta: float
+            time delta of a tick (rounded to PRIMITIVE_DELTA_RESOLUTION)
+        first: int
+            smallest index of omega (omega = index * OMEGA_RESOLUTION) which is needed
+        last: int
+            largest index of omega which is needed
+
+        Returns:
+        ----------
+        tuple(int, np.array.shape(M, 3))
+            the index of omega of the first row, and the end pose (x, y, theta) in the robot-local frame
+            of the rollout of HORIZON ticks from the origin with input (1, omega) for each omega
+
+        Notes:
+        ----------
+        the table only depends on delta, HORIZON and OMEGA_RESOLUTION, so it is built once for each of them
+        (covering the omega range of Robot at least) and cached. at most PRIMITIVE_CACHE_SIZE tables are kept.
+        delta is rounded to PRIMITIVE_DELTA_RESOLUTION, because the delta of a real-time tick is a wall-clock
+        difference which jitters every tick and would rebuild the table every tick. the rollout predicts the next
+        HORIZON ticks, which are not the same length as this one anyway, so the rounded delta is as good a guess
+        """
+
+        delta = max(round(delta / cls.PRIMITIVE_DELTA_RESOLUTION), 1) * cls.PRIMITIVE_DELTA_RESOLUTION
+        key = (delta, cls.HORIZON, cls.OMEGA_RESOLUTION)
+        cached = cls._primitives.get(key)
+        if cached is not None and cached[0] <= first and last < cached[0] + len(cached[1]):
+            return cached
+
+        first = min(first, int(np.floor(Robot.MIN_OMEGA / cls.OMEGA_RESOLUTION)))
+        last = max(last, int(np.ceil(Robot.MAX_OMEGA / cls.OMEGA_RESOLUTION)))
+        omega = np.arange(first, last + 1) * cls.OMEGA_RESOLUTION
+        input_list = np.stack([np.ones_like(omega), omega], axis=-1)
+
+        pose = np.zeros((len(omega), 3))
+        for _ in range(cls.HORIZON):
+            pose = Robot.move(pose, input_list, delta)
+
+        cls._primitives.pop(key, None)
+        while len(cls._primitives) >= cls.PRIMITIVE_CACHE_SIZE:
+            cls._primitives.pop(next(iter(cls._primitives)))
+        cls._primitives[key] = (first, pose)
+        return cls._primitives[key]
+
+    @classmethod
+    def _get_gains(cls, current, destination):
+        """
+        Parameters:
+        ----------
+        current: np.array(x, y, theta)
+            current pose
+        destination: np.array(x, y, theta)
+            destination pose
+
+        Returns:
+        ----------
+        Tuple (float, float, float, float)
+            tuple of the error angle gain, the velocity gain, the distance gain and the theta gain
+        """
+
+        if np.linalg.norm(current[:2] - destination[:2]) < cls.DISTANCE_THRESHOLD:
+            return (cls.NEAR_ERROR_ANGLE_GAIN, cls.NEAR_VELOCITY_GAIN, cls.NEAR_DISTANCE_GAIN, cls.NEAR_THETA_GAIN)
+        else:
+            return (cls.FAR_ERROR_ANGLE_GAIN, cls.FAR_VELOCITY_GAIN, cls.FAR_DISTANCE_GAIN, cls.FAR_THETA_GAIN)
+
+    @classmethod
+    def _eval(cls, current, destination, input_list, next_list):
+        """
+        Parameters:
+        ----------
+        current: np.array(x, y, theta)
+            current pose
+        destination: np.array(x, y, theta)
+            destination pose
+        input_list: np.array.shape(N, 2)
+            candidate inputs
+        next_list: np.array.shape(N, 3)
+            candidate poses calculated from the Robot's motion model
+
+        Returns:
+        ----------
+        np.array.shape(N)
+            weighted sum of the normalized costs of each candidate
+            (smaller is better)
+        """
+
+        error_angle_gain, velocity_gain, distance_gain, theta_gain = cls._get_gains(current, destination)
+
+        return error_angle_gain * utils.normalize_min_max(cls._eval_heading(next_list, destination)) + \
+            velocity_gain * utils.normalize_min_max(cls._eval_velocity(input_list)) + \
+            distance_gain * utils.normalize_min_max(cls._eval_distance(next_list, destination)) + \
+            theta_gain * utils.normalize_min_max(cls._eval_theta(next_list, destination))
+
+    @classmethod
+    def _eval_many(cls, agents, currents, destinations, current_inputs, delta):
+        """
+        Parameters:
+        ----------
+        agents: list of src.agent.Agent
+            agents of robots
+        currents: np.array.shape(N, 3)
+            current poses
+        destinations: np.array.shape(N, 3)
+            destination poses
+        current_inputs: np.array.shape(N, 2)
+            current input vectors
+        delta: float
+            time delta of this tick
+
+        Returns:
+        ----------
+        tuple(np.array.shape(M, 2), np.array.shape(M), np.array.shape(N))
+            the candidates of all robots, the cost of each candidate (same as _eval, normalized in the candidates
+            of each robot) and the number of candidates of each robot
+
+        Notes:
+        ----------
+        the velocity cost of a candidate only depends on the robot and v, and the theta cost only depends on
+        the robot and omega, so they are normalized and weighted once for each velocity of each robot
+        """
+
+        v_values, v_counts, omega_values, omega_counts = cls._get_window_many(agents, currents, current_inputs, delta)
+        input_list, columns = cls._get_candidates_many(v_values, v_counts, omega_values, omega_counts)
+        counts = v_counts * omega_counts
+        indices = np.cumsum(counts) - counts
+        v_indices = np.cumsum(v_counts) - v_counts
+        omega_indices = np.cumsum(omega_counts) - omega_counts
+        next_list = cls._predict_many(currents, input_list, omega_values, omega_counts, columns, counts, delta)
+
+        near = np.linalg.norm(currents[:, :2] - destinations[:, :2], axis=-1) < cls.DISTANCE_THRESHOLD
+        gains = np.where(near[:, np.newaxis],
+                         (cls.NEAR_ERROR_ANGLE_GAIN, cls.NEAR_VELOCITY_GAIN, cls.NEAR_DISTANCE_GAIN, cls.NEAR_THETA_GAIN),
+                         (cls.FAR_ERROR_ANGLE_GAIN, cls.FAR_VELOCITY_GAIN, cls.FAR_DISTANCE_GAIN, cls.FAR_THETA_GAIN))
+        destination_list = np.stack([np.repeat(destinations[:, 0], counts), np.repeat(destinations[:, 1], counts)], axis=-1)
+
+        def _normalize(x, i, indices, counts):
+            return np.repeat(gains[:, i], counts) * utils.normalize_min_max_reduceat(x, indices)
+
+        velocity = _normalize(cls._eval_velocity(v_values[:, np.newaxis]), 1, v_indices, v_counts)
+        column_firsts = np.repeat(indices - omega_indices, omega_counts) + np.arange(len(omega_values))
+        theta = _normalize(cls._eval_theta(next_list[column_firsts], np.repeat(destinations, omega_counts, axis=0)),
+                           3, omega_indices, omega_counts)
+
+        candidate_list = _normalize(cls._eval_heading(next_list, destination_list), 0, indices, counts) + \
+            np.repeat(velocity, np.repeat(omega_counts, v_counts)) + \
+            _normalize(cls._eval_distance(next_list, destination_list), 2, indices, counts) + \
+            theta[columns]
+        return input_list, candidate_list, counts
+
+    @classmethod
+    def _select_many(cls, candidate_list, input_list, counts):
+        """
+        Parameters:
+        ----------
+        candidate_list: np.array.shape(M)
+            cost of each candidate of all robots
+        input_list: np.array.shape(M, 2)
+            candidate inputs of all robots
+        counts: np.array.shape(N)
+            number of candidates of each robot
+
+        Returns:
+        ----------
+        np.array.shape(N, 2)
+            the first candidate of the smallest cost of each robot (same as np.argmin)
+        """
+
+        indices = np.cumsum(counts) - counts
+        minimums = np.repeat(np.minimum.reduceat(candidate_list, indices), counts)
+        positions = np.flatnonzero(candidate_list == minimums)
+        return input_list[positions[np.searchsorted(positions, indices)]]
+
     @classmethod
     def _get_window(cls, max_accelarations, linear_velocities, angular_velocities, current_input, delta):
         """
@@ -109,6 +567,8 @@ class DWAwoObstacle:
         tuple(np.array([v0, v1, ...]), np.array([omega0, omega1, ...]))
             list of possible linear velocities and list of possible angle velocities
             calculated from current input and robot specifications.
+            when HORIZON is more than 1, the angular velocities are the multiples of OMEGA_RESOLUTION
+            in the window, so that the rollouts can be looked up from the arc primitives.
             caution) this candidate velocities do not consider any obstacles
         """
 
@@ -120,80 +580,300 @@ class DWAwoObstacle:
         min_omega = np.max((current_input[1] - delta_omega, angular_velocities[1]))
         max_omega = np.min((current_input[1] + delta_omega, angular_velocities[0]))
 
-        return np.append(np.arange(min_v, max_v, DWAwoObstacle.V_RESOLUTION), max_v), \
-            np.append(np.arange(min_omega, max_omega, DWAwoObstacle.OMEGA_RESOLUTION), max_omega)
+        v_range = np.append(np.arange(min_v, max_v, cls.V_RESOLUTION), max_v)
+        if cls.HORIZON == 1:
+            return v_range, np.append(np.arange(min_omega, max_omega, cls.OMEGA_RESOLUTION), max_omega)
+
+        first = int(np.ceil(np.round(min_omega / cls.OMEGA_RESOLUTION, 6)))
+        last = int(np.floor(np.round(max_omega / cls.OMEGA_RESOLUTION, 6)))
+        if last < first:
+            first = last = int(np.rint(max_omega / cls.OMEGA_RESOLUTION))
+        return v_range, np.arange(first, last + 1) * cls.OMEGA_RESOLUTION
+
+    @classmethod
+    def _get_window_many(cls, agents, currents, current_inputs, delta):
+        """
+        Parameters:
+        ----------
+        agents: list of src.agent.Agent
+            agents of robots
+        currents: np.array.shape(N, 3)
+            current poses
+        current_inputs: np.array.shape(N, 2)
+            current input vectors
+        delta: float
+            time delta of this tick
+
+        Returns:
+        ----------
+        tuple(np.array.shape(SV), np.array.shape(N), np.array.shape(SO), np.array.shape(N))
+            the possible linear velocities of all robots (concatenated), the number of them of each robot,
+            the possible angular velocities of all robots and the number of them of each robot.
+            the velocities of each robot are the same as _get_window of the robot, but the windows of all robots
+            are calculated by a few array operations
+        """
+
+        max_accelarations = np.array([agent.get_max_accelarations(current) for agent, current in zip(agents, currents)],
+                                     dtype=float).reshape(-1, 2)
+        linear_velocities = np.array([agent.get_linear_velocities(current) for agent, current in zip(agents, currents)],
+                                     dtype=float).reshape(-1, 2)
+        angular_velocities = np.array([agent.get_angular_velocities(current) for agent, current in zip(agents, currents)],
+                                      dtype=float).reshape(-1, 2)
+        current_inputs = np.asarray(current_inputs, dtype=float).reshape(-1, 2)
+
+        delta_v = max_accelarations[:, 0] * delta
+        delta_omega = max_accelarations[:, 1] * delta
+
+        min_v = np.maximum(current_inputs[:, 0] - delta_v, linear_velocities[:, 1])
+        max_v = np.minimum(current_inputs[:, 0] + delta_v, linear_velocities[:, 0])
+        min_omega = np.maximum(current_inputs[:, 1] - delta_omega, angular_velocities[:, 1])
+        max_omega = np.minimum(current_inputs[:, 1] + delta_omega, angular_velocities[:, 0])
+
+        v_values, v_counts = cls._arange_many(min_v, max_v, cls.V_RESOLUTION)
+        if cls.HORIZON == 1:
+            omega_values, omega_counts = cls._arange_many(min_omega, max_omega, cls.OMEGA_RESOLUTION)
+            return v_values, v_counts, omega_values, omega_counts
+
+        first = np.ceil(np.round(min_omega / cls.OMEGA_RESOLUTION, 6)).astype(int)
+        last = np.floor(np.round(max_omega / cls.OMEGA_RESOLUTION, 6)).astype(int)
+        empty = last < first
+        first[empty] = last[empty] = np.rint(max_omega[empty] / cls.OMEGA_RESOLUTION).astype(int)
+        omega_counts = last - first + 1
+        offsets = np.repeat(np.cumsum(omega_counts) - omega_counts, omega_counts)
+        omega_values = (np.repeat(first, omega_counts) + np.arange(omega_counts.sum()) - offsets) * cls.OMEGA_RESOLUTION
+        return v_values, v_counts, omega_values, omega_counts
 
     @classmethod
     def _eval_heading(cls, next, destination):
         """
         Parameters:
         ----------
-        next: np.array(x, y, theta)
-            candidate pose calculated from the Robot's motion model
-        destination: np.array(x, y, theta)
-            destination pose
+        next: np.array(x, y, theta) or np.array.shape(N, 3)
+            candidate pose (or poses) calculated from the Robot's motion model
+        destination: np.array(x, y, theta) or np.array.shape(N, 3)
+            destination pose (or destination poses of each candidate, only x and y are used)
 
         Returns:
         ----------
-        float
+        float or np.array.shape(N)
             the difference angle between the direction to destination and candidate pose's theta
             (smaller is better)
         """
 
-        angle = np.arctan2(destination[1] - next[1], destination[0] - next[0])
-        return np.abs(utils.normalize_angle(angle - next[2]))
+        angle = np.arctan2(destination[..., 1] - next[..., 1], destination[..., 0] - next[..., 0])
+        return np.abs(utils.normalize_angle(angle - next[..., 2]))
 
     @classmethod
     def _eval_velocity(cls, input):
         """
         Parameters:
         ----------
-        input: np.array(v, omega)
-            candidate input
+        input: np.array(v, omega) or np.array.shape(N, 2)
+            candidate input (or inputs)
 
         Returns:
         ----------
-        float
+        float or np.array.shape(N)
             the difference velocity between max linear velocity and next linear velocity
             (smaller is better)
         """
 
-        return Robot.MAX_V - input[0]
+        return Robot.MAX_V - input[..., 0]
 
     @classmethod
     def _eval_distance(cls, next, destination):
         """
         Parameters:
         ----------
-        next: np.array(x, y, theta)
-            candidate pose calculated from the Robot's motion model
-        destination: np.array(x, y, theta)
-            destination pose
+        next: np.array(x, y, theta) or np.array.shape(N, 3)
+            candidate pose (or poses) calculated from the Robot's motion model
+        destination: np.array(x, y, theta) or np.array.shape(N, 3)
+            destination pose (or destination poses of each candidate, only x and y are used)
 
         Returns:
         ----------
-        float
+        float or np.array.shape(N)
             the distance between the destination and candidate pose
             (smaller is better)
         """
 
-        return np.linalg.norm(next[:2] - destination[:2])
+        dx = next[..., 0] - destination[..., 0]
+        dy = next[..., 1] - destination[..., 1]
+        return np.sqrt(dx * dx + dy * dy)
 
     @classmethod
     def _eval_theta(cls, next, destination):
         """
         Parameters:
         ----------
-        next: np.array(x, y, theta)
-            candidate pose calculated from the Robot's motion model
-        destination: np.array(x, y, theta)
-            destination pose
+        next: np.array(x, y, theta) or np.array.shape(N, 3)
+            candidate pose (or poses) calculated from the Robot's motion model
+        destination: np.array(x, y, theta) or np.array.shape(N, 3)
+            destination pose (or destination poses of each candidate)
 
         Returns:
         ----------
-        float
+        float or np.array.shape(N)
             the difference angle between the destination's theta and candidate pose's theta
             (smaller is better)
         """
 
-        return np.abs(utils.normalize_angle(next[2] - destination[2]))
+        return np.abs(utils.normalize_angle(next[..., 2] - destination[..., 2]))
+
+
+class DWAwithObstacle(DWAwoObstacle):
+
+    SAFETY_MARGIN = 0.1
+    CLEARANCE_LIMIT = 0.5
+    OBSTACLE_GAIN = 0.5
+
+    ARC_TIME = 1.0
+    ARC_SAMPLES = 5
+
+    def __init__(self, distance_field):
+        """
+        Parameters:
+        ----------
+        distance_field: src.spatial.DistanceField
+            precomputed clearance of the obstacle map
+        """
+
+        self.distance_field = distance_field
+
+    def get_input(self, agent, current, destination, current_input, delta):
+        """
+        Parameters:
+        ----------
+        agent: src.agent.Agent
+            agent of robot
+        current: np.array(x, y, theta)
+            current pose
+        destination: np.array(x, y, theta)
+            destination pose
+        current_input: np.array(v, omega)
+            current input vector
+        delta: float
+            time delta of this tick
+
+        Returns:
+        ----------
+        np.array(v, omega)
+            next input vector of linear velocity and angular velocity
+
+        Notes:
+        ----------
+        same as DWAwoObstacle.get_input, but the candidates whose arcs come closer to obstacles than SAFETY_MARGIN
+        are rejected and the clearance of the arc is added to the cost.
+        when every candidate is rejected, the candidate which keeps the largest clearance is selected.
+        when SEARCH is COARSE_TO_FINE, the clearance is evaluated only for the candidates of the search
+        """
+
+        max_accelarations = agent.get_max_accelarations(current)
+        linear_velocities = agent.get_linear_velocities(current)
+        angular_velocities = agent.get_angular_velocities(current)
+
+        v_range, omega_range = self._get_window(max_accelarations, linear_velocities, angular_velocities,
+                                                current_input, delta)
+        if self.SEARCH == COARSE_TO_FINE:
+            return self._search_coarse_to_fine(current, destination, v_range, omega_range, delta,
+                                               functools.partial(self._eval_penalty, current), self.OBSTACLE_GAIN)
+
+        input_list = self._get_candidates(v_range, omega_range)
+        next_list = self._predict(current, input_list, delta)
+
+        clearance = self._eval_clearance(current, input_list)
+        safe = clearance >= self.SAFETY_MARGIN
+        if not safe.any():
+            return input_list[np.argmax(clearance)]
+
+        candidate_list = self._eval(current, destination, input_list, next_list) + \
+            self.OBSTACLE_GAIN * utils.normalize_min_max(self.CLEARANCE_LIMIT - np.minimum(clearance, self.CLEARANCE_LIMIT))
+        candidate_list[~safe] = np.inf
+
+        return input_list[np.argmin(candidate_list)]
+
+    def get_inputs(self, agents, currents, destinations, current_inputs, delta):
+        """
+        Parameters:
+        ----------
+        agents: list of src.agent.Agent
+            agents of robots
+        currents: np.array.shape(N, 3)
+            current poses
+        destinations: np.array.shape(N, 3)
+            destination poses
+        current_inputs: np.array.shape(N, 2)
+            current input vectors
+        delta: float
+            time delta of this tick
+
+        Returns:
+        ----------
+        np.array.shape(N, 2)
+            next input vectors of linear velocity and angular velocity
+
+        Notes:
+        ----------
+        same as DWAwoObstacle.get_inputs, but the candidates are rejected and scored by their clearance
+        like get_input. the selected inputs are identical to calling get_input for each robot
+        """
+
+        currents = np.asarray(currents, dtype=float)
+        destinations = np.asarray(destinations, dtype=float)
+
+        if self.SEARCH == COARSE_TO_FINE:
+            return np.array([self.get_input(agent, current, destination, current_input, delta)
+                             for agent, current, destination, current_input
+                             in zip(agents, currents, destinations, current_inputs)])
+
+        input_list, candidate_list, counts = self._eval_many(agents, currents, destinations, current_inputs, delta)
+        indices = np.cumsum(counts) - counts
+        clearance = self._eval_clearance(np.repeat(currents, counts, axis=0), input_list)
+        safe = clearance >= self.SAFETY_MARGIN
+
+        candidate_list = candidate_list + self.OBSTACLE_GAIN * utils.normalize_min_max_reduceat(
+            self.CLEARANCE_LIMIT - np.minimum(clearance, self.CLEARANCE_LIMIT), indices)
+        candidate_list[~safe] = np.inf
+        blocked = ~np.logical_or.reduceat(safe, indices)
+        candidate_list = np.where(np.repeat(blocked, counts), -clearance, candidate_list)
+
+        return self._select_many(candidate_list, input_list, counts)
+
+    def _eval_penalty(self, current, input_list):
+        """
+        Parameters:
+        ----------
+        current: np.array(x, y, theta)
+            current pose
+        input_list: np.array.shape(N, 2)
+            candidate inputs
+
+        Returns:
+        ----------
+        tuple(np.array.shape(N), np.array.shape(N) of bool)
+            the cost of the clearance of each candidate (smaller is farther from obstacles, up to CLEARANCE_LIMIT)
+            and whether its arc keeps SAFETY_MARGIN
+        """
+
+        clearance = self._eval_clearance(current, input_list)
+        return self.CLEARANCE_LIMIT - np.minimum(clearance, self.CLEARANCE_LIMIT), clearance >= self.SAFETY_MARGIN
+
+    def _eval_clearance(self, current, input_list):
+        """
+        Parameters:
+        ----------
+        current: np.array(x, y, theta) or np.array.shape(N, 3)
+            current pose (or the current pose of each candidate)
+        input_list: np.array.shape(N, 2)
+            candidate inputs
+
+        Returns:
+        ----------
+        np.array.shape(N)
+            the smallest clearance on the arc of each candidate for ARC_TIME seconds
+            (sampled at ARC_SAMPLES points and looked up from the distance field)
+        """
+
+        times = np.linspace(0.0, self.ARC_TIME, self.ARC_SAMPLES + 1)[1:]
+        arcs = Robot.move(np.asarray(current)[..., np.newaxis, :], input_list[:, np.newaxis, :], times)
+        return np.min(self.distance_field.clearance(arcs), axis=1)
@@ -0,0 +1,184 @@
+import math
+import time
+
+import numpy as np
+
+STAGES = ('ideal', 'plan', 'move', 'predict', 'observe', 'update', 'tick')
+
+
+class LatencyHistogram:
+
+    LOW = 1e-6
+    HIGH = 10.0
+    BUCKETS_PER_DECADE = 20
+
+    def __init__(self):
+        """
+        Notes:
+        ----------
+        count latencies in logarithmic buckets between LOW and HIGH seconds
+        (and an underflow and an overflow bucket), so the memory is fixed regardless of the number of records
+        and the relative error of a percentile is at most 10 ** (1 / BUCKETS_PER_DECADE)
+        """
+
+        buckets = int(round(math.log10(LatencyHistogram.HIGH / LatencyHistogram.LOW) * LatencyHistogram.BUCKETS_PER_DECADE))
+        self.edges = LatencyHistogram.LOW * 10.0 ** (np.arange(buckets + 1) / LatencyHistogram.BUCKETS_PER_DECADE)
+        self.counts = np.zeros(len(self.edges) + 1, dtype=np.int64)
+        self.reset()
+
+    def reset(self):
+        """
+        Notes:
+        ----------
+        clear all records
+        """
+
+        self.counts[:] = 0
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, seconds):
+        """
+        Parameters:
+        ----------
+        seconds: float
+            latency to record (O(1), no allocation)
+        """
+
+        if seconds < LatencyHistogram.LOW:
+            i = 0
+        else:
+            i = min(int(math.log10(seconds / LatencyHistogram.LOW) * LatencyHistogram.BUCKETS_PER_DECADE) + 1,
+                    len(self.counts) - 1)
+        self.counts[i] += 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def percentile(self, q):
+        """
+        Parameters:
+        ----------
+        q: float
+            percentile between 0 and 100
+
+        Returns:
+        ----------
+        float
+            upper edge of the bucket which has the q-th percentile latency (0 when nothing is recorded)
+        """
+
+        if self.count == 0:
+            return 0.0
+        i = int(np.searchsorted(np.cumsum(self.counts), q / 100.0 * self.count))
+        return min(self.edges[min(i, len(self.edges) - 1)], self.max)
+
+    def summary(self):
+        """
+        Returns:
+        ----------
+        dict
+            count, mean, p50, p90, p99 and max latency in seconds
+        """
+
+        return {
+            'count': self.count,
+            'mean': self.total / self.count if self.count > 0 else 0.0,
+            'p50': self.percentile(50),
+            'p90': self.percentile(90),
+            'p99': self.percentile(99),
+            'max': self.max,
+        }
+
+
+class Profiler:
+
+    def __init__(self, budget):
+        """
+        Parameters:
+        ----------
+        budget: float
+            seconds which a tick can take (usually src.timer.INTERVAL)
+
+        Notes:
+        ----------
+        measure each stage of a tick with time.perf_counter into a LatencyHistogram of STAGES.
+        a tick which takes longer than budget is counted as an overrun, and the ticks which should have been
+        executed in the time delta of a tick but were not are counted as missed
+        """
+
+        self.budget = budget
+        self.histograms = {stage: LatencyHistogram() for stage in STAGES}
+        self.reset()
+
+    def reset(self):
+        """
+        Notes:
+        ----------
+        clear all histograms and counters
+        """
+
+        for histogram in self.histograms.values():
+            histogram.reset()
+        self.ticks = 0
+        self.overruns = 0
+        self.missed = 0
+        self.start_t = self.lap_t = time.perf_counter()
+
+    def start(self):
+        """
+        Notes:
+        ----------
+        call at the beginning of a tick
+        """
+
+        self.start_t = self.lap_t = time.perf_counter()
+
+    def lap(self, stage):
+        """
+        Parameters:
+        ----------
+        stage: str
+            name of the stage which has just finished (one of STAGES)
+        """
+
+        t = time.perf_counter()
+        self.histograms[stage].record(t - self.lap_t)
+        self.lap_t = t
+
+    def stop(self, delta):
+        """
+        Parameters:
+        ----------
+        delta: float
+            time delta of this tick
+
+        Notes:
+        ----------
+        call at the end of a tick
+        """
+
+        elapsed = time.perf_counter() - self.start_t
+        self.histograms['tick'].record(elapsed)
+        self.ticks += 1
+        if elapsed > self.budget:
+            self.overruns += 1
+        if self.ticks > 1:
+            self.missed += max(int(round(delta / self.budget)) - 1, 0)
+
+    def summary(self):
+        """
+        Returns:
+        ----------
+        dict
+            budget, the number of ticks, overruns and missed ticks, and the summary of the histogram of each stage
+        """
+
+        return {
+            'budget': self.budget,
+            'ticks': self.ticks,
+            'overruns': self.overruns,
+            'missed': self.missed,
+            'stages': {stage: histogram.summary() for stage, histogram in self.histograms.items()},
+        }
@@ -0,0 +1,139 @@
+import collections
+import sys
+import threading
+import time
+
+import zmq
+
+HWM = 100
+LOG_INTERVAL = 1.0
+
+
+class Publisher:
+
+    def __init__(self, endpoint, hwm=HWM, log_interval=LOG_INTERVAL):
+        """
+        Parameters:
+        ----------
+        endpoint: str
+            endpoint to bind the PUB socket (like 'tcp://*:5556')
+        hwm: int
+            max number of messages waiting to be sent (the oldest one is dropped when it is full),
+            which is also the send high-water mark of the socket
+        log_interval: float
+            min seconds between lines written to stdout
+
+        Notes:
+        ----------
+        messages are put into a bounded deque by the control loop and are encoded, sent and logged
+        by a dedicated thread which owns the socket, so slow stdout or socket backpressure never stalls the control loop.
+        appending to and popping from a deque are atomic, so the control loop never waits for a lock.
+        the socket is bound here before the thread starts (which hands the socket over to the thread),
+        so a bind failure like an endpoint in use raises zmq.ZMQError to the caller
+        """
+
+        self.endpoint = endpoint
+        self.hwm = hwm
+        self.log_interval = log_interval
+        self.queue = collections.deque(maxlen=hwm)
+        self.ready = threading.Event()
+        self.closed = False
+        self.sent = 0
+        self.dropped = 0
+        self.failed = 0
+        self.logged_t = -float('inf')
+
+        self.socket = zmq.Context.instance().socket(zmq.PUB)
+        self.socket.setsockopt(zmq.SNDHWM, hwm)
+        try:
+            self.socket.bind(endpoint)
+        except zmq.ZMQError:
+            self.socket.close(linger=0)
+            raise
+
+        self.thread = threading.Thread(target=self._drain, daemon=True)
+        self.thread.start()
+
+    def send(self, encode, *args, **kwargs):
+        """
+        Parameters:
+        ----------
+        encode: callable
+            function which returns the frames of a multipart message from args and kwargs
+            (like src.telemetry.encode), called on the publisher thread
+        args, kwargs:
+            arguments of encode (must not be modified after this call)
+        """
+
+        self._put((encode, args, kwargs))
+
+    def log(self, message):
+        """
+        Parameters:
+        ----------
+        message: callable
+            function which returns a line to write to stdout
+
+        Notes:
+        ----------
+        only one message in log_interval seconds is sampled, and it is formatted and written on the publisher thread
+        with the numbers of sent and dropped messages
+        """
+
+        t = time.monotonic()
+        if t - self.logged_t >= self.log_interval:
+            self.logged_t = t
+            self._put((None, (message,), {}))
+
+    def close(self):
+        """
+        Notes:
+        ----------
+        send the waiting messages, and then stop the publisher thread and close the socket
+        """
+
+        self.closed = True
+        self.ready.set()
+        self.thread.join()
+
+    def _put(self, item):
+        """
+        Parameters:
+        ----------
+        item: tuple(callable, tuple, dict)
+            message to put into the queue (the oldest one is dropped when the queue is full)
+        """
+
+        if len(self.queue) == self.hwm:
+            self.dropped += 1
+        self.queue.append(item)
+        self.ready.set()
+
+    def _drain(self):
+        """
+        Notes:
+        ----------
+        body of the publisher thread.
+        a message which fails to be encoded, sent or logged is counted as failed and reported,
+        and the thread goes on with the next one
+        """
+
+        try:
+            while True:
+                self.ready.wait()
+                self.ready.clear()
+                while len(self.queue) > 0:
+                    encode, args, kwargs = self.queue.popleft()
+                    try:
+                        if encode is None:
+                            print(f'{args[0]()} (sent={self.sent} dropped={self.dropped} failed={self.failed})')
+                        else:
+                            self.socket.send_multipart(encode(*args, **kwargs))
+                            self.sent += 1
+                    except Exception as e:
+                        self.failed += 1
+                        print(f'failed to publish a message: {e!r}', file=sys.stderr)
+                if self.closed:
+                    break
+        finally:
+            self.socket.close(linger=1000)
@@ -0,0 +1,262 @@
+"""
+VERSION: int
+    schema version of the log
+FIXED_COLUMNS: dict of str -> int
+    columns which have a fixed number of float64 in each tick
+VARIABLE_COLUMNS: dict of str -> int
+    columns which have a variable number of rows in each tick, and the number of float64 in a row
+
+a log is a directory which has a raw little-endian float64 file '<column>.bin' for each column,
+an int64 file '<column>.idx' of the end row of each tick for each variable column and 'meta.json'.
+the kalman gain (3, M) is stored as M rows of 3 (its transpose),
+and the observations are stored as rows of (landmark x, landmark y, distance, angle)
+"""
+
+import json
+import os
+import time
+
+import numpy as np
+
+VERSION = 1
+FIXED_COLUMNS = {
+    't': 1,
+    'input': 2,
+    'ideal': 3,
+    'actual': 3,
+    'xhat': 3,
+    'covariance': 9,
+}
+VARIABLE_COLUMNS = {
+    'kalmanGain': 3,
+    'observed': 4,
+}
+
+_FLOAT = np.dtype('<f8')
+_INDEX = np.dtype('<i8')
+
+
+class Recorder:
+
+    FLUSH_BYTES = 1 << 16
+    FLUSH_INTERVAL = 1.0
+
+    def __init__(self, path, flush_bytes=FLUSH_BYTES, flush_interval=FLUSH_INTERVAL):
+        """
+        Parameters:
+        ----------
+        path: str
+            directory of the log (created if it does not exist, appended if it exists)
+        flush_bytes: int
+            write the buffered ticks when this number of bytes are buffered
+        flush_interval: float
+            write the buffered ticks when this number of seconds have passed since the last write
+        """
+
+        os.makedirs(path, exist_ok=True)
+        with open(os.path.join(path, 'meta.json'), 'w') as f:
+            json.dump({'version': VERSION, 'fixed': FIXED_COLUMNS, 'variable': VARIABLE_COLUMNS}, f)
+
+        self.files = {name: open(os.path.join(path, f'{name}.bin'), 'ab')
+                      for name in list(VARIABLE_COLUMNS.keys()) + list(FIXED_COLUMNS.keys())}
+        self.indexes = {name: open(os.path.join(path, f'{name}.idx'), 'ab') for name in VARIABLE_COLUMNS}
+        self.rows = {name: os.path.getsize(os.path.join(path, f'{name}.bin')) // (_FLOAT.itemsize * width)
+                     for name, width in VARIABLE_COLUMNS.items()}
+
+        columns = list(self.indexes.values()) + [f for name, f in self.files.items() if name != 't'] + [self.files['t']]
+        self.buffers = {f: bytearray() for f in columns}
+        self.buffered = 0
+        self.flush_bytes = flush_bytes
+        self.flush_interval = flush_interval
+        self.flushed_t = time.monotonic()
+
+    def record(self, t, input, ideal, actual, xhat, P, K, observed_list):
+        """
+        Parameters:
+        ----------
+        t: float
+            elapsed time
+        input: np.array(v, omega)
+            input vector
+        ideal: np.array(x, y, theta)
+            ideal pose
+        actual: np.array(x, y, theta)
+            actual pose
+        xhat: np.array(x, y, theta)
+            estimated pose
+        P: np.array().size(3, 3)
+            covariance
+        K: np.array().size(3, M)
+            kalman gain (None when no landmark is observed)
+        observed_list: list of tuple(landmark (x, y), np.array(distance, angle))
+            list of observed landmark
+
+        Notes:
+        ----------
+        append a tick to the buffers of the columns. the buffers are written to the files by flush
+        when flush_bytes are buffered or flush_interval seconds have passed, so the files are not flushed every tick
+        """
+
+        variables = {
+            'kalmanGain': np.empty((0, 3)) if K is None else np.transpose(K),
+            'observed': np.array([(o[0][0], o[0][1], o[1][0], o[1][1]) for o in observed_list]).reshape(-1, 4),
+        }
+        for name, rows in variables.items():
+            self._append(self.files[name], np.ascontiguousarray(rows, dtype=_FLOAT).tobytes())
+            self.rows[name] += len(rows)
+            self._append(self.indexes[name], np.array([self.rows[name]], dtype=_INDEX).tobytes())
+
+        fixed = {'input': input, 'ideal': ideal, 'actual': actual, 'xhat': xhat, 'covariance': P, 't': t}
+        for name, value in fixed.items():
+            self._append(self.files[name], np.ravel(np.asarray(value, dtype=_FLOAT)).tobytes())
+
+        if self.buffered >= self.flush_bytes or time.monotonic() - self.flushed_t >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        """
+        Notes:
+        ----------
+        write the buffered ticks to the files. the time column is written last,
+        so a reader never sees a tick which is partially written
+        """
+
+        for f, buffer in self.buffers.items():
+            if len(buffer) > 0:
+                f.write(buffer)
+                f.flush()
+                buffer.clear()
+        self.buffered = 0
+        self.flushed_t = time.monotonic()
+
+    def close(self):
+        """
+        Notes:
+        ----------
+        write the buffered ticks and close all files of the log
+        """
+
+        self.flush()
+        for f in list(self.files.values()) + list(self.indexes.values()):
+            f.close()
+
+    def _append(self, f, data):
+        """
+        Parameters:
+        ----------
+        f: file
+            file of a column
+        data: bytes
+            data to append to the buffer of the file
+        """
+
+        self.buffers[f] += data
+        self.buffered += len(data)
+
+
+class Log:
+
+    def __init__(self, path):
+        """
+        Parameters:
+        ----------
+        path: str
+            directory of the log recorded by Recorder
+
+        Notes:
+        ----------
+        memory-map all columns, so any tick can be read in O(1) without loading the whole log
+        """
+
+        with open(os.path.join(path, 'meta.json')) as f:
+            meta = json.load(f)
+        if meta['version'] != VERSION:
+            raise ValueError(f'unsupported log version: {meta["version"]}')
+
+        self.length = os.path.getsize(os.path.join(path, 't.bin')) // _FLOAT.itemsize
+        self.columns = {name: _map(os.path.join(path, f'{name}.bin'), _FLOAT, self.length * width).reshape(-1, width)
+                        for name, width in FIXED_COLUMNS.items()}
+        self.variables = {name: _map(os.path.join(path, f'{name}.bin'), _FLOAT, None).reshape(-1, width)
+                          for name, width in VARIABLE_COLUMNS.items()}
+        self.indexes = {name: _map(os.path.join(path, f'{name}.idx'), _INDEX, self.length)
+                        for name in VARIABLE_COLUMNS}
+
+    def __len__(self):
+        """
+        Returns:
+        ----------
+        int
+            number of ticks
+        """
+
+        return self.length
+
+    def __getitem__(self, i):
+        """
+        Parameters:
+        ----------
+        i: int
+            index of tick
+
+        Returns:
+        ----------
+        dict
+            same as src.telemetry.decode, and 't' (elapsed time) and 'input' (np.array(v, omega)).
+            the arrays are read-only views of the memory-mapped files
+        """
+
+        if i < 0:
+            i += self.length
+        if not 0 <= i < self.length:
+            raise IndexError(f'tick {i} is out of range')
+
+        variables = {}
+        for name in VARIABLE_COLUMNS:
+            start = self.indexes[name][i - 1] if i > 0 else 0
+            variables[name] = self.variables[name][start:self.indexes[name][i]]
+
+        return {
+            'robot': None,
+            't': self.columns['t'][i, 0],
+            'input': self.columns['input'][i],
+            'ideal': self.columns['ideal'][i],
+            'actual': self.columns['actual'][i],
+            'xhat': self.columns['xhat'][i],
+            'covariance': self.columns['covariance'][i].reshape(3, 3),
+            'kalmanGain': variables['kalmanGain'].T if len(variables['kalmanGain']) > 0 else None,
+            'observed': variables['observed'],
+        }
+
+    def times(self):
+        """
+        Returns:
+        ----------
+        np.array().size(T)
+            elapsed time of each tick
+        """
+
+        return self.columns['t'][:, 0]
+
+
+def _map(path, dtype, count):
+    """
+    Parameters:
+    ----------
+    path: str
+        file to map
+    dtype: np.dtype
+        type of elements
+    count: int
+        number of elements to map (the whole file when None)
+
+    Returns:
+    ----------
+    np.array()
+        read-only memory-mapped array (an empty array when there is nothing to map)
+    """
+
+    if count is None:
+        count = os.path.getsize(path) // dtype.itemsize
+    if count == 0:
+        return np.empty(0, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode='r', shape=(count,))
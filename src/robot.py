@@ -1,3 +1,5 @@
+import math
+
 import numpy as np
 
 from src import utils
@@ -40,49 +42,120 @@ class Robot:
         """
         Parameters:
         ----------
-        current: np.array(x, y, theta)
-            current pose
-        input: np.array(v, omega)
-            input vector
-        delta: float
-            time delta
+        current: np.array(x, y, theta) or np.array.shape(N, 3)
+            current pose (or stacked poses)
+        input: np.array(v, omega) or np.array.shape(N, 2)
+            input vector (or stacked input vectors)
+        delta: float or np.array()
+            time delta (an array is broadcast against the leading dimensions of input)
 
         Returns:
         ----------
-        np.array(x, y, theta)
+        np.array(x, y, theta) or np.array.shape(N, 3)
             predict pose of next tick
+
+        Notes:
+        ----------
+        current and input are broadcast against each other, so that a single pose can be moved
+        by many candidate inputs (or many poses by many inputs) in one call.
+        the result is identical to current + Robot.T(theta, omega, delta).dot(input)
         """
 
-        theta = current[2]
-        omega = input[1]
+        current = np.asarray(current, dtype=float)
+        input = np.asarray(input, dtype=float)
+
+        v = input[..., 0]
+        omega = input[..., 1]
+        angle = current[..., 2] + omega * delta / 2.0
 
-        next = current + Robot.T(theta, omega, delta).dot(input.T)
-        next[2] = utils.normalize_angle(next[2])
+        next = current + np.stack([np.cos(angle) * delta * v,
+                                   np.sin(angle) * delta * v,
+                                   np.broadcast_to(delta * omega, angle.shape)], axis=-1)
+        next[..., 2] = utils.normalize_angle(next[..., 2])
         return next
 
     @classmethod
     def F(cls, current, input, delta):
+        """
+        Parameters:
+        ----------
+        current: np.array(x, y, theta) or np.array.shape(N, 3)
+            current pose (or stacked poses)
+        input: np.array(v, omega) or np.array.shape(N, 2)
+            input vector (or stacked input vectors)
+        delta: float
+            time delta
+
+        Returns:
+        ----------
+        np.array.shape(3, 3) or np.array.shape(N, 3, 3)
+            jacobians of state equation
+        """
+
+        current = np.asarray(current, dtype=float)
+        input = np.asarray(input, dtype=float)
+
+        v = input[..., 0]
+        omega = input[..., 1]
+        angle = current[..., 2] + omega * delta / 2.0
+
+        F = np.zeros(np.broadcast(current[..., 0], v).shape + (3, 3))
+        F[..., 0, 0] = 1.0
+        F[..., 1, 1] = 1.0
+        F[..., 2, 2] = 1.0
+        F[..., 0, 2] = -1.0 * np.sin(angle) * delta * v
+        F[..., 1, 2] = 1.0 * np.cos(angle) * delta * v
+        return F
+
+    @classmethod
+    def propagate(cls, current, P, input, delta, Q, out=None):
         """
         Parameters:
         ----------
         current: np.array(x, y, theta)
             current pose
+        P: np.array().size(3, 3)
+            current covariance
         input: np.array(v, omega)
             input vector
         delta: float
             time delta
+        Q: np.array().size(3, 3)
+            process noise covariance
+        out: tuple(np.array().size(3), np.array().size(3, 3))
+            C-contiguous buffers to write the predicted pose and covariance into (new arrays are returned when None).
+            they can be current and P themselves to predict in place
 
         Returns:
         ----------
-        np.array.shape(3, 3)
-            jacobians of state equation
-        """
+        tuple(np.array(x, y, theta), np.array().size(3, 3))
+            same as (Robot.move(current, input, delta), F P F^T + Q) where F is Robot.F(current, input, delta)
 
-        theta = current[2]
-
-        v = input[0]
-        omega = input[1]
+        Notes:
+        ----------
+        fused prediction of a single robot in closed form. F is the identity except F[0, 2] = a and F[1, 2] = b,
+        so F P F^T is written element by element from a and b, which share one sin and cos of the same angle,
+        without building T, F or the intermediate products. the elements are still unpacked into Python floats,
+        so allocation is reduced rather than avoided: out only saves the two result arrays (EKF.predict passes
+        None because it keeps the results of each tick)
+        """
 
-        return np.array([[1.0, 0.0, -1.0 * np.sin(theta + omega * delta / 2.0) * delta * v],
-                         [0.0, 1.0,  1.0 * np.cos(theta + omega * delta / 2.0) * delta * v],
-                         [0.0, 0.0,  1.0]])
+        x, y, theta = current.tolist()
+        (p00, p01, p02), (p10, p11, p12), (p20, p21, p22) = P.tolist()
+        (q00, q01, q02), (q10, q11, q12), (q20, q21, q22) = Q.tolist()
+        v, omega = input.tolist()
+
+        angle = theta + omega * delta / 2.0
+        a = -1.0 * math.sin(angle) * delta * v
+        b = 1.0 * math.cos(angle) * delta * v
+
+        a02 = p02 + a * p22
+        a12 = p12 + b * p22
+
+        if out is None:
+            out = (np.empty(3), np.empty((3, 3)))
+        out[0].ravel()[:] = (x + b, y - a, (theta + delta * omega + math.pi) % (2.0 * math.pi) - math.pi)
+        out[1].ravel()[:] = (p00 + a * p20 + a02 * a + q00, p01 + a * p21 + a02 * b + q01, a02 + q02,
+                             p10 + b * p20 + a12 * a + q10, p11 + b * p21 + a12 * b + q11, a12 + q12,
+                             p20 + p22 * a + q20, p21 + p22 * b + q21, p22 + q22)
+        return out
@@ -0,0 +1,192 @@
+import numpy as np
+
+
+class Route:
+
+    RESOLUTION = 0.01
+    ALPHA = 0.5
+    WINDOW = 0.5
+
+    def __init__(self, waypoints, closed=True, resolution=RESOLUTION):
+        """
+        Parameters:
+        ----------
+        waypoints: list of tuple(x, y)
+            points to pass through in order (theta is ignored when a pose is given)
+        closed: bool
+            if True, the route returns from the last waypoint to the first one
+        resolution: float
+            max arc length between samples of the route
+
+        Notes:
+        ----------
+        compile the waypoints once into a centripetal Catmull-Rom spline (ALPHA = 0.5, which never makes
+        cusps or self-intersections in a segment) resampled at the same arc length step, and a table of the cumulative
+        arc length at each waypoint. a sample at an arc length is found by the step and a waypoint by a binary search
+        of the table, so the queries cost the same regardless of the number of waypoints.
+        ValueError is raised unless there are at least 2 distinct waypoints (repeated points are merged)
+        """
+
+        points = np.array([w[:2] for w in waypoints], dtype=float).reshape(-1, 2)
+        points = points[np.append(True, np.any(np.diff(points, axis=0) != 0, axis=1))[:len(points)]]
+        if closed and len(points) > 1 and np.array_equal(points[0], points[-1]):
+            points = points[:-1]
+        if len(points) < 2:
+            raise ValueError(f'a route needs at least 2 distinct waypoints: {len(points)} of {len(waypoints)} are distinct')
+        self.closed = closed
+        self.waypoints = points
+
+        if closed:
+            control = np.concatenate([points[-1:], points, points[:2]])
+        else:
+            control = np.concatenate([2 * points[:1] - points[1:2], points, 2 * points[-1:] - points[-2:-1]])
+        samples, index = Route._sample(control, resolution)
+        s = np.append(0.0, np.cumsum(np.linalg.norm(np.diff(samples, axis=0), axis=1)))
+        self.length = s[-1]
+        self.waypoint_s = s[index[:len(points)]]
+
+        self.s, self.step = np.linspace(0.0, self.length, max(int(np.ceil(self.length / resolution)), 1) + 1, retstep=True)
+        self.points = np.stack([np.interp(self.s, s, samples[:, 0]), np.interp(self.s, s, samples[:, 1])], axis=1)
+        direction = np.diff(self.points, axis=0)
+        heading = np.arctan2(direction[:, 1], direction[:, 0])
+        self.theta = np.append(heading, heading[0] if closed else heading[-1])
+
+    def __len__(self):
+        """
+        Returns:
+        ----------
+        int
+            number of waypoints
+        """
+
+        return len(self.waypoints)
+
+    def pose(self, s):
+        """
+        Parameters:
+        ----------
+        s: float or np.array().size(T)
+            arc length from the first waypoint (wrapped when closed, clipped when not closed)
+
+        Returns:
+        ----------
+        np.array(x, y, theta) or np.array().size(T, 3)
+            pose on the route at s (theta is the direction of the route)
+        """
+
+        s = self._wrap(np.asarray(s, dtype=float))
+        i = np.minimum((s / self.step).astype(int), len(self.s) - 2)
+        ratio = ((s - self.s[i]) / self.step)[..., np.newaxis]
+        xy = self.points[i] + ratio * (self.points[i + 1] - self.points[i])
+        return np.concatenate([xy, self.theta[i][..., np.newaxis]], axis=-1)
+
+    def nearest(self, point, s=None):
+        """
+        Parameters:
+        ----------
+        point: np.array(x, y)
+            coordinate to project onto the route
+        s: float
+            arc length of the nearest point of the last query (the whole route is searched when None)
+
+        Returns:
+        ----------
+        float
+            arc length of the nearest sample of the route to point
+
+        Notes:
+        ----------
+        when s is given, only the samples within WINDOW before and after s are searched,
+        so tracking a route costs the same however many waypoints it has
+        """
+
+        if s is None or self.length <= 2.0 * Route.WINDOW:
+            candidates = slice(0, len(self.points))
+        else:
+            window = int(Route.WINDOW / self.step)
+            center = int(float(self._wrap(np.float64(s))) / self.step)
+            if center - window >= 0 and center + window < len(self.points):
+                candidates = slice(center - window, center + window + 1)
+            elif self.closed:
+                candidates = (np.arange(-window, window + 1) + center) % (len(self.points) - 1)
+            else:
+                candidates = slice(max(center - window, 0), min(center + window + 1, len(self.points)))
+
+        diff = self.points[candidates] - np.asarray(point[:2], dtype=float)
+        return float(self.s[candidates][np.argmin(np.einsum('ij,ij->i', diff, diff))])
+
+    def next_waypoint(self, s):
+        """
+        Parameters:
+        ----------
+        s: float
+            arc length
+
+        Returns:
+        ----------
+        tuple(int, float)
+            index of the next waypoint after s and the arc length from s to it
+            (the last waypoint and 0 at the end of a route which is not closed)
+        """
+
+        s = float(self._wrap(np.asarray(s, dtype=float)))
+        i = int(np.searchsorted(self.waypoint_s, s, side='right'))
+        if i < len(self.waypoint_s):
+            return i, self.waypoint_s[i] - s
+        if self.closed:
+            return 0, self.length - s
+        return i - 1, 0.0
+
+    def _wrap(self, s):
+        """
+        Parameters:
+        ----------
+        s: np.array()
+            arc length
+
+        Returns:
+        ----------
+        np.array()
+            arc length between 0 and length
+        """
+
+        return np.mod(s, self.length) if self.closed else np.clip(s, 0.0, self.length)
+
+    @classmethod
+    def _sample(cls, control, resolution):
+        """
+        Parameters:
+        ----------
+        control: np.array().size(K + 3, 2)
+            control points (the route passes through control[1:-1])
+        resolution: float
+            max chord length between samples
+
+        Returns:
+        ----------
+        tuple(np.array().size(S, 2), np.array().size(K + 1))
+            samples of all segments at once (at most resolution apart), and the index of the sample of each control[1:-1]
+        """
+
+        p0, p1, p2, p3 = control[:-3], control[1:-2], control[2:-1], control[3:]
+        t1 = np.linalg.norm(p1 - p0, axis=1) ** Route.ALPHA
+        t2 = t1 + np.linalg.norm(p2 - p1, axis=1) ** Route.ALPHA
+        t3 = t2 + np.linalg.norm(p3 - p2, axis=1) ** Route.ALPHA
+
+        counts = np.maximum(np.ceil(np.linalg.norm(p2 - p1, axis=1) / resolution).astype(int), 1)
+        starts = np.append(0, np.cumsum(counts))
+        segment = np.repeat(np.arange(len(counts)), counts)
+        ratio = (np.arange(starts[-1]) - starts[segment]) / counts[segment]
+
+        p0, p1, p2, p3 = p0[segment], p1[segment], p2[segment], p3[segment]
+        t1, t2, t3 = t1[segment, np.newaxis], t2[segment, np.newaxis], t3[segment, np.newaxis]
+        t = t1 + ratio[:, np.newaxis] * (t2 - t1)
+
+        a1 = ((t1 - t) * p0 + t * p1) / t1
+        a2 = ((t2 - t) * p1 + (t - t1) * p2) / (t2 - t1)
+        a3 = ((t3 - t) * p2 + (t - t2) * p3) / (t3 - t2)
+        b1 = ((t2 - t) * a1 + t * a2) / t2
+        b2 = ((t3 - t) * a2 + (t - t1) * a3) / (t3 - t1)
+        samples = ((t2 - t) * b1 + (t - t1) * b2) / (t2 - t1)
+
+        return np.concatenate([samples, control[-2:-1]]), starts
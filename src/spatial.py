@@ -0,0 +1,186 @@
+import numpy as np
+
+
+class GridIndex:
+
+    CELL_SIZE = 1.0
+
+    def __init__(self, points, cell_size=CELL_SIZE):
+        """
+        Parameters:
+        ----------
+        points: list of tuple(x, y)
+            coordinates to index
+        cell_size: float
+            size of a square cell of the grid
+
+        Notes:
+        ----------
+        hash each point into the grid cell which contains it (built once)
+        """
+
+        self.points = np.array(points, dtype=float).reshape(-1, 2)
+        self.cell_size = cell_size
+
+        cells = np.floor(self.points / cell_size).astype(int)
+        self.cells = {}
+        for i, cell in enumerate(map(tuple, cells)):
+            self.cells.setdefault(cell, []).append(i)
+        self.cells = {cell: np.array(indices) for cell, indices in self.cells.items()}
+
+    def __len__(self):
+        """
+        Returns:
+        ----------
+        int
+            number of indexed points
+        """
+
+        return len(self.points)
+
+    def query(self, center, radius):
+        """
+        Parameters:
+        ----------
+        center: np.array(x, y)
+            center of the query circle
+        radius: float
+            radius of the query circle
+
+        Returns:
+        ----------
+        np.array([i0, i1, ...])
+            sorted indices of the points within radius from center
+            (only the cells which overlap the circle are searched)
+        """
+
+        if not np.isfinite(radius):
+            return np.arange(len(self.points))
+
+        x0, y0 = np.floor((np.asarray(center[:2]) - radius) / self.cell_size).astype(int)
+        x1, y1 = np.floor((np.asarray(center[:2]) + radius) / self.cell_size).astype(int)
+        if (x1 - x0 + 1) * (y1 - y0 + 1) > len(self.cells):
+            candidates = np.arange(len(self.points))
+        else:
+            found = [self.cells[(x, y)] for x in range(x0, x1 + 1) for y in range(y0, y1 + 1) if (x, y) in self.cells]
+            candidates = np.sort(np.concatenate(found)) if len(found) > 0 else np.empty(0, dtype=int)
+
+        diff = self.points[candidates] - center[:2]
+        return candidates[np.einsum('ij,ij->i', diff, diff) <= radius ** 2]
+
+
+class DistanceField:
+
+    def __init__(self, occupancy, resolution, origin=(0.0, 0.0)):
+        """
+        Parameters:
+        ----------
+        occupancy: np.array().size(H, W) of bool
+            obstacle map (row is y and column is x)
+        resolution: float
+            size of a cell
+        origin: tuple(x, y)
+            coordinate of the corner of cell (0, 0)
+
+        Notes:
+        ----------
+        precompute the distance from each cell to the nearest obstacle cell once.
+        the nearest obstacle of each cell is propagated from its 8 neighbors at halving steps (jump flooding),
+        and then from its adjacent neighbors until nothing changes. each propagation is vectorized
+        """
+
+        self.occupancy = np.asarray(occupancy, dtype=bool)
+        self.resolution = resolution
+        self.origin = np.array(origin, dtype=float)
+        self.distance = DistanceField._transform(self.occupancy) * resolution
+
+    @classmethod
+    def from_circles(cls, circles, xlim, ylim, resolution):
+        """
+        Parameters:
+        ----------
+        circles: list of tuple(x, y, radius)
+            circular obstacles
+        xlim: tuple(min x, max x)
+            range of the map
+        ylim: tuple(min y, max y)
+            range of the map
+        resolution: float
+            size of a cell
+
+        Returns:
+        ----------
+        src.spatial.DistanceField
+            distance field of the rasterized obstacles
+        """
+
+        xs = np.arange(xlim[0], xlim[1], resolution) + resolution / 2.0
+        ys = np.arange(ylim[0], ylim[1], resolution) + resolution / 2.0
+        gx, gy = np.meshgrid(xs, ys)
+        occupancy = np.zeros(gx.shape, dtype=bool)
+        for x, y, radius in circles:
+            occupancy |= (gx - x) ** 2 + (gy - y) ** 2 <= radius ** 2
+        return cls(occupancy, resolution, (xlim[0], ylim[0]))
+
+    def clearance(self, points):
+        """
+        Parameters:
+        ----------
+        points: np.array().size(..., 2)
+            coordinates (poses are also accepted, theta is ignored)
+
+        Returns:
+        ----------
+        np.array().size(...)
+            distance from each point to the nearest obstacle (0 outside the map, inf without obstacles)
+        """
+
+        points = np.asarray(points, dtype=float)
+        cells = np.floor((points[..., :2] - self.origin) / self.resolution).astype(int)
+        h, w = self.distance.shape
+        inside = (cells[..., 0] >= 0) & (cells[..., 0] < w) & (cells[..., 1] >= 0) & (cells[..., 1] < h)
+        clearance = np.zeros(cells.shape[:-1])
+        clearance[inside] = self.distance[cells[..., 1][inside], cells[..., 0][inside]]
+        return clearance
+
+    @classmethod
+    def _transform(cls, occupancy):
+        """
+        Parameters:
+        ----------
+        occupancy: np.array().size(H, W) of bool
+            obstacle map
+
+        Returns:
+        ----------
+        np.array().size(H, W)
+            euclidean distance (in cells) from each cell to the nearest obstacle cell
+        """
+
+        h, w = occupancy.shape
+        ys, xs = np.indices((h, w))
+        near_y = np.where(occupancy, ys, 0)
+        near_x = np.where(occupancy, xs, 0)
+        dist2 = np.where(occupancy, 0.0, np.inf)
+
+        steps = [2 ** k for k in reversed(range(int(np.log2(max(h, w, 1))) + 1))]
+        changed = occupancy.any()
+        while changed:
+            changed = False
+            for step in steps:
+                for dy, dx in [(-step, -step), (-step, 0), (-step, step), (0, -step),
+                               (0, step), (step, -step), (step, 0), (step, step)]:
+                    if abs(dy) >= h or abs(dx) >= w:
+                        continue
+                    dst = (slice(max(-dy, 0), h - max(dy, 0)), slice(max(-dx, 0), w - max(dx, 0)))
+                    src = (slice(max(dy, 0), h - max(-dy, 0)), slice(max(dx, 0), w - max(-dx, 0)))
+                    candidate = (ys[dst] - near_y[src]) ** 2 + (xs[dst] - near_x[src]) ** 2
+                    better = np.isfinite(dist2[src]) & (candidate < dist2[dst])
+                    if better.any():
+                        changed = True
+                        dist2[dst] = np.where(better, candidate, dist2[dst])
+                        near_y[dst] = np.where(better, near_y[src], near_y[dst])
+                        near_x[dst] = np.where(better, near_x[src], near_x[dst])
+            steps = [1]
+
+        return np.sqrt(dist2)
@@ -0,0 +1,245 @@
+"""
+MAGIC: bytes
+    magic bytes at the head of the binary header frame
+VERSION: int
+    schema version of the binary frames
+HEADER: struct.Struct
+    layout of the header frame (magic, version, robot index or -1)
+ROBOT_TOPIC: bytes
+    prefix of the topic frame of all telemetry messages (binary and JSON) to subscribe every robot
+PROFILE_TOPIC: bytes
+    prefix of the topic frame of profile summaries, which are published on the same socket as telemetry
+
+every message starts with a topic frame of its robot (see topic), so a subscriber can select robots
+by the prefix filter of ZMQ without receiving and decoding the messages of the other robots.
+the binary message is a multipart message of below frames (all numbers are little-endian float64):
+    topic: topic(robot)
+    header: HEADER
+    state: ideal (x, y, theta), actual (x, y, theta), xhat (x, y, theta), covariance (3 x 3) = 18 float64
+    kalman gain: 3 x M float64 (empty when no landmark is observed)
+    observed: N x (landmark x, landmark y, distance, angle) float64
+"""
+
+import json
+import struct
+
+import numpy as np
+
+MAGIC = b'RSIM'
+VERSION = 1
+HEADER = struct.Struct('<4sHi')
+
+BINARY = 'binary'
+JSON = 'json'
+
+ROBOT_TOPIC = b'robot/'
+PROFILE_TOPIC = b'profile/'
+
+_FLOAT = np.dtype('<f8')
+
+
+def topic(robot, prefix=ROBOT_TOPIC):
+    """
+    Parameters:
+    ----------
+    robot: int
+        index of robot (-1 when None)
+    prefix: bytes
+        ROBOT_TOPIC or PROFILE_TOPIC
+
+    Returns:
+    ----------
+    bytes
+        topic frame of the messages of robot, like b'robot/3/'
+        (it ends with '/', so the topic of robot 1 is not a prefix of robot 10)
+    """
+
+    return b'%s%d/' % (prefix, -1 if robot is None else robot)
+
+
+def encode(ideal, actual, xhat, P, K, observed_list, robot=None, format=BINARY):
+    """
+    Parameters:
+    ----------
+    ideal: np.array(x, y, theta)
+        ideal pose
+    actual: np.array(x, y, theta)
+        actual pose
+    xhat: np.array(x, y, theta)
+        estimated pose
+    P: np.array().size(3, 3)
+        covariance
+    K: np.array().size(3, M)
+        kalman gain (None when no landmark is observed)
+    observed_list: list of tuple(landmark (x, y), np.array(distance, angle))
+        list of observed landmark
+    robot: int
+        index of robot in a fleet (omitted when None)
+    format: str
+        BINARY or JSON
+
+    Returns:
+    ----------
+    list of bytes
+        frames of a multipart message (the topic frame and a single JSON frame for JSON)
+    """
+
+    if format == JSON:
+        return [topic(robot), _to_json(ideal, actual, xhat, P, K, observed_list, robot).encode('utf-8')]
+
+    header = HEADER.pack(MAGIC, VERSION, -1 if robot is None else robot)
+    state = np.concatenate([ideal, actual, xhat, np.ravel(P)]).astype(_FLOAT)
+    gain = np.empty(0, dtype=_FLOAT) if K is None else np.ravel(K).astype(_FLOAT)
+    observed = np.array([(o[0][0], o[0][1], o[1][0], o[1][1]) for o in observed_list], dtype=_FLOAT).reshape(-1)
+    return [topic(robot), header, state.tobytes(), gain.tobytes(), observed.tobytes()]
+
+
+def decode(frames):
+    """
+    Parameters:
+    ----------
+    frames: list of bytes or zmq.Frame
+        frames of a multipart message encoded by encode (BINARY or JSON)
+
+    Returns:
+    ----------
+    dict
+        'robot': int or None
+        'ideal', 'actual', 'xhat': np.array(x, y, theta)
+        'covariance': np.array().size(3, 3)
+        'kalmanGain': np.array().size(3, M) or None
+        'observed': np.array().size(N, 4) of (landmark x, landmark y, distance, angle)
+
+    Notes:
+    ----------
+    the arrays of binary frames are read-only views of the received buffers (no copy)
+    """
+
+    buffers = [f.buffer if hasattr(f, 'buffer') else f for f in frames]
+    if not bytes(buffers[0]).startswith(ROBOT_TOPIC):
+        raise ValueError(f'unsupported telemetry topic: {bytes(buffers[0])}')
+    buffers = buffers[1:]
+
+    if len(buffers) == 1:
+        return _from_json(bytes(buffers[0]))
+
+    magic, version, robot = HEADER.unpack(bytes(buffers[0]))
+    if magic != MAGIC or version != VERSION:
+        raise ValueError(f'unsupported telemetry frame: magic={magic} version={version}')
+
+    state = np.frombuffer(buffers[1], dtype=_FLOAT)
+    gain = np.frombuffer(buffers[2], dtype=_FLOAT)
+    observed = np.frombuffer(buffers[3], dtype=_FLOAT)
+    return {
+        'robot': None if robot < 0 else robot,
+        'ideal': state[0:3],
+        'actual': state[3:6],
+        'xhat': state[6:9],
+        'covariance': state[9:18].reshape(3, 3),
+        'kalmanGain': gain.reshape(3, -1) if len(gain) > 0 else None,
+        'observed': observed.reshape(-1, 4),
+    }
+
+
+def encode_profile(summary, robot=None):
+    """
+    Parameters:
+    ----------
+    summary: dict
+        summary of src.profiler.Profiler
+    robot: int
+        index of robot (-1 when None)
+
+    Returns:
+    ----------
+    list of bytes
+        frames of a multipart message (the topic of robot under PROFILE_TOPIC and the json summary)
+    """
+
+    return [topic(robot, PROFILE_TOPIC), json.dumps(summary).encode('utf-8')]
+
+
+def decode_profile(frames):
+    """
+    Parameters:
+    ----------
+    frames: list of bytes or zmq.Frame
+        frames of a multipart message encoded by encode_profile
+
+    Returns:
+    ----------
+    dict
+        summary of src.profiler.Profiler and 'robot' (int or None)
+    """
+
+    buffers = [bytes(f.buffer) if hasattr(f, 'buffer') else bytes(f) for f in frames]
+    if not buffers[0].startswith(PROFILE_TOPIC):
+        raise ValueError(f'unsupported profile frame: topic={buffers[0]}')
+    robot = int(buffers[0][len(PROFILE_TOPIC):-1])
+    return dict(json.loads(buffers[1].decode('utf-8')), robot=None if robot < 0 else robot)
+
+
+def _to_json(ideal, actual, xhat, P, K, observed_list, robot):
+    """
+    Returns:
+    ----------
+    str
+        json message (same parameters as encode)
+    """
+
+    msg = {
+        'ideal': {
+            'x': ideal[0],
+            'y': ideal[1],
+            'theta': ideal[2],
+        },
+        'actual': {
+            'x': actual[0],
+            'y': actual[1],
+            'theta': actual[2],
+        },
+        'xhat': {
+            'x': xhat[0],
+            'y': xhat[1],
+            'theta': xhat[2],
+        },
+        'observed': [{
+            'landmark': {
+                'x': o[0][0],
+                'y': o[0][1],
+            },
+            'distance': o[1][0],
+            'angle': o[1][1],
+        } for o in observed_list],
+        'covariance': np.ravel(P).tolist(),
+        'kalmanGain': None if K is None else np.ravel(K).tolist(),
+    }
+    if robot is not None:
+        msg['robot'] = robot
+    return json.dumps(msg)
+
+
+def _from_json(data):
+    """
+    Parameters:
+    ----------
+    data: bytes
+        json message
+
+    Returns:
+    ----------
+    dict
+        same as decode
+    """
+
+    msg = json.loads(data.decode('utf-8'))
+    return {
+        'robot': msg.get('robot'),
+        'ideal': np.array([msg['ideal']['x'], msg['ideal']['y'], msg['ideal']['theta']]),
+        'actual': np.array([msg['actual']['x'], msg['actual']['y'], msg['actual']['theta']]),
+        'xhat': np.array([msg['xhat']['x'], msg['xhat']['y'], msg['xhat']['theta']]),
+        'covariance': np.array(msg['covariance']).reshape(3, 3),
+        'kalmanGain': None if msg['kalmanGain'] is None else np.array(msg['kalmanGain']).reshape(3, -1),
+        'observed': np.array([(o['landmark']['x'], o['landmark']['y'], o['distance'], o['angle'])
+                              for o in msg['observed']]).reshape(-1, 4),
+    }
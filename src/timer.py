@@ -1,65 +1,321 @@
-import json
-import signal
-import time
+import asyncio
+import functools
+import itertools
 
-import zmq
+import numpy as np
+
+from src import telemetry
+from src.publisher import Publisher
 
 
 INTERVAL = 0.2
 LIFETIME = 3600
 PORT = 5556
+ENDPOINT = f'tcp://*:{PORT}'
+ROBOT = 0
+FORMAT = telemetry.BINARY
+PROFILE_TICKS = 25
+
+DROP = 'drop'
+CATCH_UP = 'catch_up'
+POLICY = DROP
+MAX_CATCH_UP = 5
 
 
-def start(ekf):
+def start(ekf, recorder=None, robot=None, endpoint=None):
     """
     Parameters:
     ----------
     ekf: src.filter.EKF
         an instance of EKF
+    recorder: src.recorder.Recorder
+        recorder to persist each tick (not recorded when None)
+    robot: int
+        robot index of the messages (ROBOT when None)
+    endpoint: str
+        endpoint to bind the PUB socket (ENDPOINT when None)
+
+    Notes:
+    ----------
+    execute EKF at specified intervals and sends estimated pose by using ZMQ (see serve)
+    """
+
+    asyncio.run(serve([ekf], [recorder], INTERVAL, LIFETIME, POLICY, [ROBOT if robot is None else robot], endpoint))
+
+
+async def serve(ekfs, recorders=None, interval=INTERVAL, lifetime=LIFETIME, policy=POLICY, robots=None, endpoint=None):
+    """
+    Parameters:
+    ----------
+    ekfs: list of src.filter.EKF
+        instances of EKF to execute concurrently
+    recorders: list of src.recorder.Recorder
+        recorder of each EKF (not recorded when None)
+    interval: float
+        seconds between ticks
+    lifetime: float
+        seconds to execute
+    policy: str
+        DROP or CATCH_UP (see Scheduler)
+    robots: list of int
+        robot index of each EKF (ROBOT, ROBOT + 1, ... when None)
+    endpoint: str
+        endpoint to bind the PUB socket (ENDPOINT when None)
+
+    Returns:
+    ----------
+    list of src.timer.Scheduler
+        scheduler of each EKF, which has the number of ticks, overruns and dropped ticks
 
     Notes:
     ----------
-    execute EKF at specified intervals and sends estimated pose by using ZMQ
+    execute each EKF by its own Scheduler in the running event loop and send its estimated pose by using ZMQ.
+    the messages of each EKF are published on the topic of its robot index (see src.telemetry.topic),
+    so the processes of some robots can publish on their own endpoints and a subscriber can select robots.
+    when an EKF has a profiler, its summary is also sent under telemetry.PROFILE_TOPIC every PROFILE_TICKS ticks.
+    the messages are encoded, sent and logged by src.publisher.Publisher on its own thread.
+    the numbers of overruns and dropped ticks of each Scheduler are reported with the sampled log of the publisher.
+    the buffered ticks of the recorders are flushed when the EKFs stop
     """
 
-    context = zmq.Context()
-    publisher = context.socket(zmq.PUB)
-    publisher.bind(f'tcp://*:{PORT}')
+    publisher = Publisher(ENDPOINT if endpoint is None else endpoint)
+    recorders = recorders if recorders is not None else [None] * len(ekfs)
+    robots = robots if robots is not None else [ROBOT + i for i in range(len(ekfs))]
 
-    def handler(signum, frame):
+    async def tick(ekf, recorder, robot, scheduler):
         ideal, xhat, P, K = ekf.step()
 
-        msg = json.dumps({
-            'ideal': {
-                'x': ideal[0],
-                'y': ideal[1],
-                'theta': ideal[2],
-            },
-            'actual': {
-                'x': ekf.agent.actual[0],
-                'y': ekf.agent.actual[1],
-                'theta': ekf.agent.actual[2],
-            },
-            'xhat': {
-                'x': xhat[0],
-                'y': xhat[1],
-                'theta': xhat[2],
-            },
-            'observed': [{
-                'landmark': {
-                    'x': o[0][0],
-                    'y': o[0][1],
-                },
-                'distance': o[1][0],
-                'angle': o[1][1],
-            } for o in ekf.agent.observed_list],
-            'covariance': P.flatten().tolist(),
-            'kalmanGain': K.flatten().tolist(),
-        })
-        publisher.send(msg.encode('utf-8'))
-        print(f'send msg: {msg}')
-
-    signal.signal(signal.SIGALRM, handler)
-    signal.setitimer(signal.ITIMER_REAL, INTERVAL, INTERVAL)
-
-    time.sleep(LIFETIME)
+        if recorder is not None:
+            recorder.record(ekf.t - ekf.start_t, ekf.input, ideal, ekf.agent.actual, xhat, P, K, ekf.agent.observed_list)
+        publisher.send(telemetry.encode, ideal, ekf.agent.actual, xhat, P, K, ekf.agent.observed_list,
+                       robot=robot, format=FORMAT)
+        if ekf.profiler is not None and ekf.profiler.ticks % PROFILE_TICKS == 0:
+            publisher.send(telemetry.encode_profile, ekf.profiler.summary(), robot)
+        publisher.log(lambda: f'send msg: robot={robot} xhat={xhat} overruns={scheduler.overruns} dropped={scheduler.dropped}')
+
+    schedulers = [Scheduler(interval, policy) for _ in ekfs]
+    try:
+        await asyncio.gather(*[scheduler.run(functools.partial(tick, ekf, recorder, robot, scheduler), lifetime)
+                               for ekf, recorder, robot, scheduler in zip(ekfs, recorders, robots, schedulers)])
+    finally:
+        publisher.close()
+        for recorder in recorders:
+            if recorder is not None:
+                recorder.flush()
+
+    return schedulers
+
+
+def run(ekf, clock, delta=INTERVAL, lifetime=LIFETIME, recorder=None):
+    """
+    Parameters:
+    ----------
+    ekf: src.filter.EKF
+        an instance of EKF which is created with clock=clock.time
+    clock: src.timer.SimulatedClock
+        the simulated clock of ekf
+    delta: float or iterable of float
+        fixed time delta of each tick, or time deltas of each tick
+        (when it is iterable, all deltas are consumed and lifetime is ignored)
+    lifetime: float
+        simulated seconds to execute when delta is fixed
+    recorder: src.recorder.Recorder
+        recorder to persist each tick (not recorded when None)
+
+    Returns:
+    ----------
+    tuple(np.array().size(T), np.array().size(T, 3), np.array().size(T, 3), np.array().size(T, 3))
+        elapsed times, ideal trajectory, actual trajectory and estimated trajectory
+
+    Notes:
+    ----------
+    execute EKF as fast as possible without waiting for the wall clock.
+    the trajectories are identical to the real-time execution (start) which has the same time deltas and random state
+    """
+
+    deltas = itertools.repeat(delta, int(round(lifetime / delta))) if np.isscalar(delta) else delta
+
+    times, ideal_list, actual_list, xhat_list = [], [], [], []
+    for d in deltas:
+        clock.advance(d)
+        ideal, xhat, P, K = ekf.step()
+        if recorder is not None:
+            recorder.record(ekf.t - ekf.start_t, ekf.input, ideal, ekf.agent.actual, xhat, P, K, ekf.agent.observed_list)
+        times.append(ekf.t - ekf.start_t)
+        ideal_list.append(ideal)
+        actual_list.append(ekf.agent.actual)
+        xhat_list.append(xhat)
+    if recorder is not None:
+        recorder.flush()
+
+    return np.array(times), np.array(ideal_list).reshape(-1, 3), np.array(actual_list).reshape(-1, 3), \
+        np.array(xhat_list).reshape(-1, 3)
+
+
+def start_fleet(fleet, endpoint=None):
+    """
+    Parameters:
+    ----------
+    fleet: src.filter.FleetEKF
+        an instance of FleetEKF
+    endpoint: str
+        endpoint to bind the PUB socket (ENDPOINT when None)
+
+    Notes:
+    ----------
+    execute FleetEKF at specified intervals and sends estimated poses of all robots by using ZMQ
+    """
+
+    asyncio.run(serve_fleet(fleet, INTERVAL, LIFETIME, POLICY, endpoint=endpoint))
+
+
+async def serve_fleet(fleet, interval=INTERVAL, lifetime=LIFETIME, policy=POLICY, robots=None, endpoint=None):
+    """
+    Parameters:
+    ----------
+    fleet: src.filter.FleetEKF
+        an instance of FleetEKF
+    interval: float
+        seconds between ticks
+    lifetime: float
+        seconds to execute
+    policy: str
+        DROP or CATCH_UP (see Scheduler)
+    robots: list of int
+        robot index of each robot of the fleet (ROBOT, ROBOT + 1, ... when None)
+    endpoint: str
+        endpoint to bind the PUB socket (ENDPOINT when None)
+
+    Returns:
+    ----------
+    src.timer.Scheduler
+        scheduler of the fleet
+
+    Notes:
+    ----------
+    execute FleetEKF by a Scheduler in the running event loop and send one message per robot on its topic by using ZMQ
+    (by src.publisher.Publisher, whose queue can hold the messages of all robots of some ticks)
+    """
+
+    publisher = Publisher(ENDPOINT if endpoint is None else endpoint, hwm=max(len(fleet.agents) * 4, 100))
+    robots = robots if robots is not None else [ROBOT + i for i in range(len(fleet.agents))]
+
+    scheduler = Scheduler(interval, policy)
+
+    async def tick():
+        ideal, xhat, P, K = fleet.step()
+
+        for i, (agent, robot) in enumerate(zip(fleet.agents, robots)):
+            publisher.send(telemetry.encode, ideal[i], agent.actual, xhat[i], P[i], K[i], agent.observed_list,
+                           robot=robot, format=FORMAT)
+        publisher.log(lambda: f'send {len(fleet.agents)} msgs overruns={scheduler.overruns} dropped={scheduler.dropped}')
+
+    try:
+        await scheduler.run(tick, lifetime)
+    finally:
+        publisher.close()
+
+    return scheduler
+
+
+class Scheduler:
+
+    def __init__(self, interval=INTERVAL, policy=POLICY, max_catch_up=MAX_CATCH_UP):
+        """
+        Parameters:
+        ----------
+        interval: float
+            seconds between ticks
+        policy: str
+            what to do with the ticks whose deadlines have passed while a tick is executed.
+            DROP skips them and waits for the next deadline, CATCH_UP executes them back to back
+        max_catch_up: int
+            max number of late ticks to catch up (older ones are dropped even if policy is CATCH_UP)
+
+        Notes:
+        ----------
+        the deadline of the n-th tick is start + n * interval of the monotonic clock of the event loop,
+        so the ticks do not drift however long each tick and each sleep take
+        """
+
+        self.interval = interval
+        self.policy = policy
+        self.max_catch_up = max_catch_up
+        self.ticks = 0
+        self.overruns = 0
+        self.dropped = 0
+
+    async def run(self, callback, lifetime=LIFETIME):
+        """
+        Parameters:
+        ----------
+        callback: coroutine function
+            function awaited at each tick without arguments
+        lifetime: float
+            seconds to execute
+
+        Notes:
+        ----------
+        a tick which ends after the deadline of the next tick is counted as an overrun.
+        when policy is CATCH_UP, the late ticks executed back to back are not counted again unless one of them
+        falls further behind, so a stall is counted once.
+        nothing is written here, the caller reports overruns and dropped ticks (see serve).
+        other tasks of the event loop are executed while this waits for the next deadline
+        """
+
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        n = 0
+        behind = 0
+        while (n + 1) * self.interval <= lifetime:
+            await asyncio.sleep(max(start + (n + 1) * self.interval - loop.time(), 0.0))
+            await callback()
+            self.ticks += 1
+            n += 1
+
+            late = int((loop.time() - start) // self.interval) - n
+            if late > 0 and late >= behind:
+                self.overruns += 1
+            dropped = max(late, 0) if self.policy == DROP else max(late - self.max_catch_up, 0)
+            self.dropped += dropped
+            n += dropped
+            behind = max(late - dropped, 0)
+
+
+class SimulatedClock:
+
+    def __init__(self, start=0.0):
+        """
+        Parameters:
+        ----------
+        start: float
+            initial time in seconds
+        """
+
+        self.t = start
+
+    def time(self):
+        """
+        Returns:
+        ----------
+        float
+            current simulated time in seconds (use this method as the clock of EKF)
+        """
+
+        return self.t
+
+    def advance(self, delta):
+        """
+        Parameters:
+        ----------
+        delta: float
+            seconds to advance
+
+        Returns:
+        ----------
+        float
+            advanced simulated time in seconds
+        """
+
+        self.t += delta
+        return self.t
@@ -38,3 +38,26 @@ def normalize_min_max(x, axis=None):
         return np.full_like(x, 1.0)
     else:
         return (x - min) / (max - min)
+
+
+def normalize_min_max_reduceat(x, indices):
+    """
+    Parameters:
+    ----------
+    x: np.array()
+        target 1-d array which is a concatenation of segments
+    indices: np.array()
+        start index of each segment (same as numpy.ufunc.reduceat)
+
+    Returns:
+    ----------
+    np.array()
+        normalized array so that the maximum value is 1 and the minimum value is 0 in each segment
+    """
+
+    counts = np.diff(np.append(indices, len(x)))
+    min = np.minimum.reduceat(x, indices)
+    range = np.maximum.reduceat(x, indices) - min
+    normalized = (x - np.repeat(min, counts)) / np.repeat(np.where(range == 0, 1.0, range), counts)
+    normalized[np.repeat(range == 0, counts)] = 1.0
+    return normalized
@@ -0,0 +1,143 @@
+#!/usr/bin/env python
+
+import itertools
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from src.environment import LANDMARKS
+from src.agent import Agent
+from src.filters import EKF
+from src.planner import DWAwoObstacle
+from src import utils, timer
+
+import circular_agent
+import square_agent
+import waypoints_agent
+
+LIFETIME = 60.0
+
+SCENARIOS = {
+    'circular': (circular_agent.CircularAgent, circular_agent.INITIAL_POSE),
+    'square': (square_agent.SquareAgent, square_agent.INITIAL_POSE),
+    'waypoints': (waypoints_agent.WaypointsAgent, waypoints_agent.INITIAL_POSE),
+}
+
+TARGETS = {
+    'EKF': EKF,
+    'DWAwoObstacle': DWAwoObstacle,
+    'Agent': Agent,
+}
+
+
+def sweep(scenario, grid, seeds, lifetime=LIFETIME, max_workers=None):
+    """
+    Parameters:
+    ----------
+    scenario: str
+        name of the scenario ('circular', 'square' or 'waypoints')
+    grid: dict of str -> list of float
+        candidate values of each parameter, like {'EKF.q': [0.001, 0.01], 'Agent.actual_xy_sd': [0.005, 0.01]}
+        (the key is '<class>.<attribute>' of EKF, DWAwoObstacle or Agent)
+    seeds: iterable of int
+        random seeds to execute for each configuration
+    lifetime: float
+        simulated seconds of each execution
+    max_workers: int
+        number of worker processes (the number of cpus by default)
+
+    Returns:
+    ----------
+    list of tuple(dict of str -> float, np.array().size(4), np.array().size(4))
+        each configuration and the mean and the standard deviation over seeds of
+        (position rmse vs actual, angle rmse vs actual, position rmse vs ideal, angle rmse vs ideal)
+
+    Notes:
+    ----------
+    execute the headless scenario of every combination of the configurations and the seeds in a process pool.
+    every execution has its own random generator seeded by its seed, so the results are reproducible
+    regardless of the number of workers and each configuration is compared with the same random numbers
+    """
+
+    names = list(grid.keys())
+    configs = [dict(zip(names, values)) for values in itertools.product(*grid.values())]
+    seeds = list(seeds)
+    tasks = [(scenario, config, seed, lifetime) for config in configs for seed in seeds]
+
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        rmses = np.array(list(executor.map(_run, *zip(*tasks)))).reshape(len(configs), len(seeds), 4)
+
+    return [(config, rmse.mean(axis=0), rmse.std(axis=0)) for config, rmse in zip(configs, rmses)]
+
+
+def _run(scenario, config, seed, lifetime):
+    """
+    Parameters:
+    ----------
+    scenario: str
+        name of the scenario
+    config: dict of str -> float
+        parameters to set
+    seed: int
+        random seed of this execution
+    lifetime: float
+        simulated seconds to execute
+
+    Returns:
+    ----------
+    np.array().size(4)
+        position rmse and angle rmse of the estimated trajectory vs the actual and the ideal trajectory
+
+    Notes:
+    ----------
+    the parameters are class attributes, so they are restored after the execution
+    because a worker process executes many tasks
+    """
+
+    defaults = {name: getattr(TARGETS[name.split('.')[0]], name.split('.')[1]) for name in config}
+    try:
+        for name, value in config.items():
+            setattr(TARGETS[name.split('.')[0]], name.split('.')[1], value)
+
+        agent_class, initial = SCENARIOS[scenario]
+        clock = timer.SimulatedClock()
+        ekf = EKF(agent_class(LANDMARKS, seed=seed), initial, clock=clock.time)
+        _, ideal_list, actual_list, xhat_list = timer.run(ekf, clock, delta=timer.INTERVAL, lifetime=lifetime)
+    finally:
+        for name, value in defaults.items():
+            setattr(TARGETS[name.split('.')[0]], name.split('.')[1], value)
+
+    return np.concatenate([_rmse(xhat_list, actual_list), _rmse(xhat_list, ideal_list)])
+
+
+def _rmse(a, b):
+    """
+    Parameters:
+    ----------
+    a: np.array().size(T, 3)
+        trajectory
+    b: np.array().size(T, 3)
+        reference trajectory
+
+    Returns:
+    ----------
+    np.array(position rmse, angle rmse)
+        root mean square errors of the position and the angle
+    """
+
+    position = np.sqrt(np.mean(np.sum((a[:, :2] - b[:, :2]) ** 2, axis=1)))
+    angle = np.sqrt(np.mean(utils.normalize_angle(a[:, 2] - b[:, 2]) ** 2))
+    return np.array([position, angle])
+
+
+if __name__ == '__main__':
+    scenario = sys.argv[1] if len(sys.argv) > 1 else 'circular'
+    grid = {
+        'EKF.q': [0.001, 0.01, 0.1],
+        'EKF.r': [0.005, 0.02, 0.08],
+    }
+
+    for config, mean, std in sweep(scenario, grid, range(8)):
+        print(f'{config}: rmse vs actual=({mean[0]:.4f}±{std[0]:.4f}, {mean[1]:.4f}±{std[1]:.4f}) '
+              f'vs ideal=({mean[2]:.4f}±{std[2]:.4f}, {mean[3]:.4f}±{std[3]:.4f})')
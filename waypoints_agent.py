@@ -1,6 +1,6 @@
 #!/usr/bin/env python
 
-import itertools
+import argparse
 
 import numpy as np
 
@@ -8,14 +8,16 @@ from src.environment import LANDMARKS
 from src.robot import Robot
 from src.agent import Agent
 from src.filters import EKF
-from src import utils, timer
+from src.recorder import Recorder
+from src.route import Route
+from src import timer
 
 INITIAL_POSE = (1.0, 0.0, np.pi / 2.0)
 WAYPOINTS = [np.array((1.0, 0.5, np.pi * 3.0/4.0)), np.array((0.5, 1.0, -np.pi)), np.array((-0.5, 1.0, -np.pi/2.0)),
              np.array((-0.5, -1.0, 0.0)), np.array((1.0, -1.0, np.pi / 2.0))]
 
 DISTANCE_THRESHOLD = 0.2
-ANGLE_THRESHOLD = np.pi/18.0
+LOOKAHEAD = 0.3
 NEAR_ACC_MAGNIFICATION = 0.5
 NEAR_LINEAR_MAGNIFICATION = 0.3
 NEAR_ANGULAR_MAGNIFICATION = 0.8
@@ -23,17 +25,29 @@ NEAR_ANGULAR_MAGNIFICATION = 0.8
 
 class WaypointsAgent(Agent):
 
-    def __init__(self, landmarks):
+    def __init__(self, landmarks, seed=None, waypoints=WAYPOINTS):
         """
         Parameters:
         ----------
         landmarks: list of tuple (x, y)
             list of the landmark coordination
+        seed: int or np.random.SeedSequence
+            seed of the random noises of this agent
+        waypoints: list of np.array(x, y, theta)
+            waypoints to go around (theta is not used because the route gives the direction)
+
+        Notes:
+        ----------
+        the waypoints are compiled once into a closed src.route.Route, and the ideal pose is the point
+        LOOKAHEAD ahead along the route of the nearest point to the current pose
         """
 
-        super().__init__(landmarks)
-        self.itr = itertools.cycle(WAYPOINTS)
+        super().__init__(landmarks, seed)
+        self.route = Route(waypoints, closed=True)
+        self.s = None
+        self.key = None
         self.target = np.array(INITIAL_POSE)
+        self.distance = np.inf
 
     def get_ideal(self, current, t):
         """
@@ -50,26 +64,21 @@ class WaypointsAgent(Agent):
             ideal pose of t
         """
 
-        if np.linalg.norm(self.target[:2] - current[:2]) < DISTANCE_THRESHOLD and \
-           np.abs(utils.normalize_angle(self.target[2] - current[2])) < ANGLE_THRESHOLD:
-
-            self.target = next(self.itr)
-
-        return self.target
+        return self._track(current)[0]
 
     def get_max_accelarations(self, current):
         """
         Parameters:
         ----------
         current: np.array(x, y, theta)
-            current pose (is not used in this default implement)
+            current pose
 
         Returns:
         ----------
         Tuple (float, float)
             tuple of the max linear accelaration and the max angular accelaration
         """
-        m = NEAR_ACC_MAGNIFICATION if np.linalg.norm(self.target[:2] - current[:2]) < DISTANCE_THRESHOLD else 1.0
+        m = NEAR_ACC_MAGNIFICATION if self._track(current)[1] < DISTANCE_THRESHOLD else 1.0
         return (Robot.MAX_LIN_ACC * m, Robot.MAX_ANG_ACC * m)
 
     def get_linear_velocities(self, current):
@@ -77,14 +86,14 @@ class WaypointsAgent(Agent):
         Parameters:
         ----------
         current: np.array(x, y, theta)
-            current pose (is not used in this default implement)
+            current pose
 
         Returns:
         ----------
         Tuple (float, float)
             tuple of the max linear velocity and the min linear velocity
         """
-        m = NEAR_LINEAR_MAGNIFICATION if np.linalg.norm(self.target[:2] - current[:2]) < DISTANCE_THRESHOLD else 1.0
+        m = NEAR_LINEAR_MAGNIFICATION if self._track(current)[1] < DISTANCE_THRESHOLD else 1.0
         return (Robot.MAX_V * m, Robot.MIN_V * m)
 
     def get_angular_velocities(self, current):
@@ -92,18 +101,50 @@ class WaypointsAgent(Agent):
         Parameters:
         ----------
         current: np.array(x, y, theta)
-            current pose (is not used in this default implement)
+            current pose
 
         Returns:
         ----------
         Tuple (float, float)
             tuple of the max angular velocity and the min angular velocity
         """
-        m = NEAR_ANGULAR_MAGNIFICATION if np.linalg.norm(self.target[:2] - current[:2]) < DISTANCE_THRESHOLD else 1.0
+        m = NEAR_ANGULAR_MAGNIFICATION if self._track(current)[1] < DISTANCE_THRESHOLD else 1.0
         return (Robot.MAX_OMEGA * m, Robot.MIN_OMEGA * m)
 
+    def _track(self, current):
+        """
+        Parameters:
+        ----------
+        current: np.array(x, y, theta)
+            current pose
+
+        Returns:
+        ----------
+        tuple(np.array(x, y, theta), float)
+            target pose and the distance along the route to the next waypoint
+
+        Notes:
+        ----------
+        get_ideal and the three hooks of the planner are called with the same pose in a tick,
+        so the route is queried once per pose and the result is shared by all of them
+        """
+
+        key = np.asarray(current, dtype=float).tobytes()
+        if key != self.key:
+            self.s = self.route.nearest(current, self.s)
+            self.target = self.route.pose(self.s + LOOKAHEAD)
+            self.distance = self.route.next_waypoint(self.s)[1]
+            self.key = key
+        return self.target, self.distance
+
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='publish the telemetry of a robot which traces the waypoints')
+    parser.add_argument('--robot', type=int, help=f'robot index of the published messages ({timer.ROBOT} by default)')
+    parser.add_argument('--endpoint', help=f'endpoint to bind ({timer.ENDPOINT} by default)')
+    parser.add_argument('--record', help='directory to record the ticks by src.recorder.Recorder')
+    args = parser.parse_args()
+
     agent = WaypointsAgent(LANDMARKS)
     ekf = EKF(agent, INITIAL_POSE)
-    timer.start(ekf)
+    timer.start(ekf, recorder=Recorder(args.record) if args.record else None, robot=args.robot, endpoint=args.endpoint)